@@ -10,9 +10,9 @@ from PyQt5.QtGui import QPixmap
 
 from Utilities.Logging import logger
 from Utilities.telegram_bot import send_message_to_bot
-from Utilities.Utilities import get_library_path, rename_path_list
+from Utilities.Utilities import get_library_path, rename_path_list, get_image_size
 from settings import INFO_FOLDER, CONTENT_FOLDER, GALLERY_FOLDER, ICON_WIDTH, DELETED_ASSET_FOLDER, SFX, \
-    IMAGE_PREVIEW_SUFFIX, DROP_MENU_WIDTH
+    IMAGE_PREVIEW_SUFFIX, DROP_MENU_WIDTH, CLIENT_MODE
 
 
 class Asset:
@@ -51,7 +51,10 @@ class Asset:
         Create asset file structure and write it to the database
         """
         try:
-            if not self.Controller.Models.find_asset(name=self.name):
+            # the files are written outside of the transaction below, its check decides
+            exists = self.Controller.Models.find_asset(name=self.name)
+            if not exists:
+                new_folder = not os.path.exists(self.path)
 
                 # making folders
                 for each_path in [self.path, self.asset_info_folder, self.content_folder, self.gallery_folder]:
@@ -61,8 +64,20 @@ class Asset:
                 # set asset icon
                 self.icon = self.create_icon("icon.png", self.icon, ICON_WIDTH)
 
-                # add to database and record info file
-                self.asset_id = self.Controller.Models.add_asset_to_db(**self.asset_data())
+                # the name check and the database record are one transaction,
+                # the write lock is taken at once so that nobody adds an asset with the same name in between
+                with self.Controller.Models.atomic(lock_type="IMMEDIATE"):
+                    exists = self.Controller.Models.find_asset(name=self.name)
+                    if not exists:
+                        self.asset_id = self.Controller.Models.add_asset_to_db(**self.asset_data())
+                        self.store_icon_size()
+
+                if exists and new_folder:
+                    # the asset was added by somebody else in the meantime
+                    shutil.rmtree(self.path, ignore_errors=True)
+
+            if not exists:
+                # record info file
                 self.write_info_file(self.asset_json, self.asset_data())
 
                 # copy files
@@ -71,6 +86,9 @@ class Asset:
                 # edit content names
                 self.Controller.ui.add_task(self.rename_scenes)
 
+                # file list for the asset overview
+                self.Controller.ui.add_task(self.store_details)
+
                 self.refresh_ui_after_edit()
 
                 if self.Controller.ui.message_to_bot.isChecked():
@@ -91,12 +109,22 @@ class Asset:
                 logger.error(" path : " + self.path + " exists")
                 self.Controller.ui.status_message("Asset with " + self.name + " name already exists!", state="ERROR")
             else:
-                self.edit_name()
-                self.edit_path()
-                self.edit_icon()
-
-                self.write_info_file(self.asset_json, self.asset_data())
-                self.Controller.Models.edit_db_asset(**self.asset_data())
+                old_path = self.old_asset_data["path"]
+                old_info = self.get_info_file(self.dir_names(old_path)["asset_json"])
+                try:
+                    # all database changes of the edit are committed once
+                    with self.Controller.Models.atomic():
+                        self.edit_name()
+                        self.edit_path()
+                        self.edit_icon()
+
+                        self.write_info_file(self.asset_json, self.asset_data())
+                        self.Controller.Models.edit_db_asset(**self.asset_data())
+                        self.store_icon_size()
+                except Exception:
+                    # the database keeps the old path, the folder is moved back to it
+                    self.restore_folder(old_path, old_info)
+                    raise
 
                 # copy files
                 self.Controller.ui.add_task(self.copy_files)
@@ -104,6 +132,9 @@ class Asset:
                 # edit content names
                 self.Controller.ui.add_task(self.rename_scenes)
 
+                # file list for the asset overview
+                self.Controller.ui.add_task(self.store_details)
+
                 self.refresh_ui_after_edit(mode=" edited")
                 logger.debug(" executed")
         except Exception as message:
@@ -125,6 +156,13 @@ class Asset:
         except Exception as message:
             logger.error(message)
 
+    def store_icon_size(self):
+        """
+        Writes the size of the asset icon to the database for the gallery layout
+        """
+        width, height = get_image_size(self.icon) if self.icon else (0, 0)
+        self.Controller.Models.set_icon_sizes([(self.asset_id, width, height)])
+
     def edit_name(self):
         """
         When editing the name of an asset, it changes the name of the folders,
@@ -152,6 +190,16 @@ class Asset:
             logger.error(message)
             return None
 
+    def restore_folder(self, old_path, old_info):
+        """
+        Moves the asset folder renamed or moved by a failed edit back to its old path
+        """
+        for path in [self.old_asset_data["path"], self.path]:
+            if path != old_path and os.path.exists(path) and not os.path.exists(old_path):
+                shutil.move(path, old_path)
+        if old_info:
+            self.write_info_file(self.dir_names(old_path)["asset_json"], old_info)
+
     def edit_path(self):
         """
         Move asset to another directory
@@ -198,10 +246,12 @@ class Asset:
             copy_list = self.prepare_files_for_copy()
             if copy_list:
                 self.Controller.ui.copy_progress_bar.show()
-                for source_files, destination_files in copy_list:
-                    self.Controller.ui.copy_function.copy(source_files, destination_files)
+                failed = self.Controller.ui.copy_function.copy_files(copy_list)
                 self.create_preview_images()
                 self.Controller.ui.copy_progress_bar.hide()
+                if failed:
+                    self.Controller.ui.status_message_signal.emit(
+                        f"{len(failed)} of {len(copy_list)} files of {self.name} are not copied!", "ERROR")
                 logger.debug(" executed")
         except Exception as message:
             logger.error(message)
@@ -276,30 +326,90 @@ class Asset:
             return False
 
     @staticmethod
-    def recognize_asset(path, db_model):
+    def recognize_asset(path, db_model, asset_id=None):
         """
-        gets information about an existing asset, paths from info and files from folders
+        gets information about an existing asset from the database,
+        or from the info file and the folders if the database has no file list of the asset
+        or the files were changed by hand since it was stored
         """
         try:
-            asset_json = Asset.dir_names(path)["asset_json"]
-            asset_data = Asset.get_info_file(asset_json)
+            folders = Asset.dir_names(path)
+            details = db_model.get_asset_details(asset_id) if asset_id else None
+            files_mtime = Asset.files_mtime(path)
+            if details and details.get("files_mtime") == files_mtime:
+                asset_data = {"name": details["name"], "asset_id": asset_id, "tags": details["tags"],
+                              "description": details["description"], "path": path}
+                has_icon = details["has_icon"] if details["has_icon"] is not None else os.path.exists(folders["icon"])
+                asset_data["icon"] = folders["icon"] if has_icon else ""
+                files = details["files"]
+                asset_data["scenes"] = [folders["content_folder"] + "/" + x for x in files.get(CONTENT_FOLDER, [])]
+                asset_data["gallery"] = [folders["gallery_folder"] + "/" + x for x in files.get(GALLERY_FOLDER, [])]
+                logger.debug(json.dumps(asset_data))
+                return asset_data
+
+            asset_data = Asset.get_info_file(folders["asset_json"])
             asset_data["path"] = path
 
             asset_data['icon'] = ""
-            if os.path.exists(Asset.dir_names(path)["icon"]):
-                asset_data['icon'] = Asset.dir_names(path)["icon"]
-
-            asset_data["asset_id"] = db_model.find_asset(path=path)[0]
-            asset_content = os.listdir(Asset.dir_names(path)["content_folder"])
-            asset_data["scenes"] = [Asset.dir_names(path)["content_folder"] + "/" + x for x in asset_content]
-            gallery_content = os.listdir(Asset.dir_names(path)["gallery_folder"])
-            asset_data["gallery"] = [Asset.dir_names(path)["gallery_folder"] + "/" + x for x in gallery_content]
+            if os.path.exists(folders["icon"]):
+                asset_data['icon'] = folders["icon"]
+
+            # assets of other libraries are not in the database of the current one
+            db_asset = db_model.find_asset(id=asset_id) if asset_id else db_model.find_asset(path=path)
+            asset_data["asset_id"] = db_asset[0] if db_asset else None
+            files = Asset.list_files(path)
+            asset_data["scenes"] = [folders["content_folder"] + "/" + name
+                                    for kind, name, size, mtime in files if kind == CONTENT_FOLDER]
+            asset_data["gallery"] = [folders["gallery_folder"] + "/" + name
+                                     for kind, name, size, mtime in files if kind == GALLERY_FOLDER]
+            if db_asset and not CLIENT_MODE:
+                # the next time the asset is opened from the database, clients do not write to the library
+                db_model.set_asset_details(db_asset[0], asset_data.get("description"), files, files_mtime)
             logger.debug(json.dumps(asset_data))
             return asset_data
         except Exception as message:
             logger.error(message)
             return False
 
+    @staticmethod
+    def files_mtime(path):
+        """
+        Time of the newer of the content and gallery folders, it changes when a file is added to them or removed
+        """
+        mtimes = [0.0]
+        for kind in (CONTENT_FOLDER, GALLERY_FOLDER):
+            try:
+                mtimes.append(os.stat(path + "/" + kind).st_mtime)
+            except OSError:
+                pass
+        return max(mtimes)
+
+    @staticmethod
+    def list_files(path):
+        """
+        (folder, name, size, mtime) of the files in the content and gallery folders of the asset
+        """
+        files = []
+        for kind in (CONTENT_FOLDER, GALLERY_FOLDER):
+            with os.scandir(path + "/" + kind) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files.append((kind, entry.name, stat.st_size, stat.st_mtime))
+        return sorted(files)
+
+    def store_details(self):
+        """
+        Writes the description and the files of the asset to the database after the files are copied
+        """
+        try:
+            # the time is taken before the listing, a change during the listing is found the next time
+            files_mtime = Asset.files_mtime(self.path)
+            self.Controller.Models.set_asset_details(self.asset_id, self.description, Asset.list_files(self.path),
+                                                     files_mtime)
+        except Exception as message:
+            logger.error(message)
+
     def refresh_ui_after_edit(self, mode=" created"):
         """
         Open the folder with the asset in the ui
@@ -308,6 +418,8 @@ class Asset:
         self.Controller.ui.search_lineEdit.setText("")
         self.Controller.ui.clear_form()
         self.Controller.ui.status_message("Asset " + self.name + mode + " successfully!", )
+        # after the tasks of the edit
+        self.Controller.update_library_index()
 
     @staticmethod
     def delete_asset(name, path):
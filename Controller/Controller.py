@@ -1,6 +1,12 @@
-import re
-from PyQt5.QtWidgets import QMainWindow
+import os
+from PyQt5.QtWidgets import QMainWindow, QApplication
 from Asset import Asset
+from Controller.QueryCache import QueryCache
+from Controller.QueryService import QueryService
+from Utilities.IconSizes import backfill_icon_sizes
+from Utilities.Sync import sync_library
+from settings import QUERY_CACHE_SIZE, FUZZY_SEARCH, MULTI_LIBRARY_SEARCH, SEARCH_LIBRARIES, POPULAR_TAGS_COUNT, \
+    CLIENT_MODE, LIBRARY_INDEX, SIMILAR_ASSETS_COUNT
 from UI.MainWindow import MainWindow
 from Utilities.Logging import logger
 from Utilities.Utilities import get_library_path
@@ -14,29 +20,47 @@ class Controller(QMainWindow):
     def __init__(self, in_model, parent=None):
         super(QMainWindow, self).__init__(parent)
 
-        # tags received from the interface
+        # search text, its expression tree and the tags it looks for, received from the interface
+        self.search_text = ""
+        self.current_query = None
         self.current_tags = []
 
         # tags and assets received from the database based on the current tags
+        # found_tags is a list of (tag, number of found assets with this tag) pairs
         self.found_tags = []
         self.found_assets = []
 
+        # existing tags similar to the tags of the search that no asset has, {typed tag: similar tag}
+        self.suggestions = {}
+
+        # results of recent searches, the key is the normalized query
+        self.query_cache = QueryCache(QUERY_CACHE_SIZE)
+
         # The constructor get model references.
         self.Models = in_model
 
         # get path to asset library
         self.lib_path = get_library_path()
-        self.connect_db = self.Models.initialize(self.lib_path)
+        # clients search the index file of the library, the database is written only by the publishing side
+        self.connect_db = self.Models.initialize(self.lib_path, use_index=CLIENT_MODE and LIBRARY_INDEX)
+
+        # searches run in their own thread, the results come back to show_results
+        self.query_service = QueryService(self.Models.data_base)
+        self.query_service.result_ready.connect(self.show_results)
+        self.query_service.start()
+        QApplication.instance().aboutToQuit.connect(self.query_service.stop)
 
         # create Ui
         self.ui = MainWindow(self)
 
-        # list of observers reacting to changes in current tags
-        self._observers = [self, self.ui]
+        # list of observers reacting to changes in found assets and tags
+        self._observers = [self.ui]
 
-        # if we have old data we use it
-        if self.ui.search_lineEdit.text() and self.connect_db:
+        # if we have old data we use it, otherwise the most used tags are shown
+        if self.connect_db:
             self.refresh_ui()
+            # the similar assets of the first opened asset are found without waiting
+            self.ui.add_task(self.Models.build_similarity_index)
 
     def create_asset(self):
         """
@@ -62,32 +86,200 @@ class Controller(QMainWindow):
 
     def refresh_ui(self):
         """
-        Getting tags from linEdit and refresh_ui
+        Getting the search query from lineEdit and refresh_ui
         """
-        self.current_tags = re.findall(r'[0-9A-z_&\+]+', self.ui.search_lineEdit.text())
-        self.current_tags = [x.lower() for x in self.current_tags]
-        logger.debug(self.current_tags)
+        self.search_text = self.ui.search_lineEdit.text()
+        try:
+            self.current_query = self.Models.parse_query(self.search_text)
+        except ValueError as message:
+            self.ui.status_message(str(message), state="ERROR")
+            return
+        self.current_tags = self.Models.query_tags(self.current_query)
+        logger.debug(self.current_query)
         if self.connect_db:
-            self.notify_observers()
+            query, text, tags = self.current_query, self.search_text, self.current_tags
+            self.start_search(lambda: self.find(query, text, tags))
             logger.debug(" executed")
         else:
             logger.error("Database path required for initialization\n")
 
-    def current_state_changed(self):
+    def start_search(self, search):
+        """
+        Sends the search to the query service, the previous search is cancelled
+        """
+        self.query_service.submit(search)
+        self.ui.status_message("Searching...")
+
+    def show_results(self, request_id, result):
+        """
+        Takes (assets, tags, suggestions) found by the query service and updates the interface
+        """
+        if not self.query_service.is_latest(request_id):
+            # a newer search was started while the result was on its way
+            return
+        if result is None:
+            self.ui.status_message("Search failed", state="ERROR")
+            return
+        self.found_assets, self.found_tags, self.suggestions = result
+        self.notify_observers()
+
+    def find(self, query, text, tags):
+        """
+        Finds assets and tags of the search, runs in the thread of the query service.
+        Returns (assets, tags, suggestions)
+        """
+        if not query:
+            # an empty search shows the tag cloud of the library
+            return [], self.Models.get_popular_tags(POPULAR_TAGS_COUNT), {}
+
+        logger.debug(f"Started searching by query {text}")
+        # the parsed query does not depend on spaces and synonyms of operators
+        key = ("query", query)
+        other_libraries = self.other_libraries()
+        if other_libraries:
+            # other libraries can be changed by other users at any time
+            key += (self.Models.library_versions(other_libraries),)
+            assets, found_tags = self.cached_query(key, lambda: self.Models.search_libraries(
+                text, other_libraries, FUZZY_SEARCH))
+        else:
+            assets, found_tags = self.cached_query(key, lambda: self.search_by_query(text))
+            if not assets and tags and not self.query_service.cancelled():
+                # no exact tags, search for partial words in names, tags and descriptions
+                words = " ".join(tags)
+                key = ("text", frozenset(tags))
+                assets, found_tags = self.cached_query(key, lambda: self.search_by_text(words))
+        if self.query_service.cancelled():
+            return None
+
+        suggestions = {}
+        for tag in self.Models.unknown_tags(tags):
+            similar = self.Models.similar_tags(tag, limit=1)
+            if similar:
+                suggestions[tag] = similar[0]
+        self.prefetch(assets)
+        return assets, found_tags, suggestions
+
+    @staticmethod
+    def prefetch(assets, index=0):
+        """
+        Reads the page of found assets with the index, so the gallery does not wait for the database
+        """
+        if index < len(assets):
+            assets[index]
+
+    def prefetch_ahead(self, index):
+        """
+        Reads the page of the found assets with the index in the background, before the gallery reaches it
+        """
+        assets = self.found_assets
+        # lists of assets are read at once
+        if index < len(assets) and hasattr(assets, "loaded") and not assets.loaded(index):
+            self.ui.add_task(lambda: self.prefetch(assets, index))
+
+    def other_libraries(self):
+        """
+        Libraries searched together with the current one
+        """
+        if not MULTI_LIBRARY_SEARCH:
+            return []
+        current = os.path.normpath(self.lib_path)
+        return [x for x in SEARCH_LIBRARIES if os.path.normpath(x) != current]
+
+    def search_by_query(self, text):
+        assets = self.Models.find_assets_by_query(text, FUZZY_SEARCH)
+        if not assets or self.query_service.cancelled():
+            return assets, []
+        tags = self.Models.find_tags_by_query(text, FUZZY_SEARCH)
+        return assets, tags
+
+    def search_by_text(self, text):
+        assets = self.Models.search_assets(text)
+        tags = self.Models.find_tags_by_asset_list(assets) if assets else []
+        return assets, tags
+
+    def cached_query(self, key, search):
         """
-        When entering new tags, we find the corresponding tags and assets
+        Returns (assets, tags) of the search from the cache or runs it.
+        Results are cached until the next change of the database, by this or another user
         """
-        if self.current_tags:
-            logger.debug(f"Started searching by tags {' '.join(self.current_tags)}")
-            self.found_assets = self.Models.find_assets_by_tag_list(self.current_tags)
-            if self.found_assets:
-                self.found_tags = self.Models.find_tags_by_asset_list(self.found_assets)
+        generation = self.Models.data_version()
+        result = self.query_cache.get(key, generation)
+        if result is None:
+            result = search()
+            # the result of an interrupted search is incomplete
+            if not self.query_service.cancelled():
+                self.query_cache.put(key, generation, result)
+        return result
 
     def get_from_folder(self, path):
-        self.found_assets = self.Models.get_all_from_folder(path)
-        if self.found_assets:
-            self.found_tags = self.Models.find_tags_by_asset_list(self.found_assets)
-        self.ui.current_state_changed()
+        self.start_search(lambda: self.find_in_folder(path))
+
+    def find_in_folder(self, path):
+        """
+        Assets and tags of the folder, runs in the thread of the query service
+        """
+        assets, tags = self.cached_query(("folder", path), lambda: self.search_by_folder(path))
+        self.prefetch(assets)
+        return assets, tags, {}
+
+    def search_by_folder(self, path):
+        assets = self.Models.get_all_from_folder(path) or []
+        tags = self.Models.find_tags_by_folder(path) if assets and not self.query_service.cancelled() else []
+        return assets, tags
+
+    def show_similar(self, asset_id):
+        """
+        Shows the asset and the assets with the most similar tags in the gallery
+        """
+        self.start_search(lambda: self.find_similar(asset_id))
+
+    def find_similar(self, asset_id):
+        """
+        The asset, its similar assets and their tags, runs in the thread of the query service
+        """
+        if not self.Models.similarity_index_ready():
+            self.Models.build_similarity_index()
+        assets, scores = self.Models.get_similar_assets(asset_id, SIMILAR_ASSETS_COUNT, with_asset=True)
+        tags = self.Models.find_tags_by_asset_list(assets) if assets else []
+        self.prefetch(assets)
+        return assets, tags, {}
+
+    def check_replica(self):
+        """
+        Refreshes the local copy of the database in the background and shows its state after the refresh
+        """
+        def refresh():
+            self.Models.refresh_replica()
+            self.ui.replica_status_signal.emit(*self.Models.replica_status())
+
+        self.ui.add_task(refresh)
+        self.update_library_index()
+
+    def sync_library(self):
+        """
+        Updates the database with assets copied, moved or deleted by hand, in the background
+        """
+        if self.connect_db:
+            lib_path = self.lib_path
+            self.ui.add_task(lambda: sync_library(lib_path))
+            # icons of the assets found by the sync
+            self.ui.add_task(backfill_icon_sizes)
+            self.update_library_index()
+
+    def update_library_index(self):
+        """
+        Writes the index file of the library again after changes of its data, in the background.
+        The tasks queued before it are finished first. Clients only read the index
+        """
+        if self.connect_db and not CLIENT_MODE:
+            self.ui.add_task(self.Models.update_library_index)
+
+    def measure_icons(self):
+        """
+        Stores the icon sizes of assets added without them, in the background
+        """
+        if self.connect_db:
+            self.ui.add_task(backfill_icon_sizes)
 
     def notify_observers(self):
         for x in self._observers:
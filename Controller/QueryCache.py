@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+
+from Utilities.Logging import logger
+
+"""
+The module QueryCache.py keeps the results of recent searches, so going back
+to a previous set of tags does not query the database again
+"""
+
+
+class QueryCache:
+    """
+    Least recently used cache of search results.
+    All entries are dropped when the generation of the database data changes.
+    Used by the thread of the interface and by the query service
+    """
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        """
+        Returns the cached result or None
+        """
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                logger.debug(f"Query cache hit {self.stats()}")
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, generation, value):
+        with self.lock:
+            if generation != self.generation or self.size <= 0:
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        return f"hits: {self.hits}, misses: {self.misses}, ratio: {ratio:.0%}, entries: {len(self.entries)}"
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from PyQt5 import QtCore
+
+from Utilities.Logging import logger
+
+"""
+The module QueryService.py runs the searches of the interface in a separate thread,
+so the window does not freeze while SQLite waits for the network share.
+Only the latest search matters: a new request replaces the waiting one and interrupts the running one,
+the result of a superseded request is never delivered
+"""
+
+
+class QueryService(QtCore.QThread):
+    """
+    Thread with its own connections to the database. Requests are functions without arguments,
+    their results are sent by result_ready to the thread of the interface
+    """
+    result_ready = QtCore.pyqtSignal(int, object)  # request id, result of the function
+
+    def __init__(self, database, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.database = database
+        self.condition = threading.Condition()
+        self.pending = None  # (request id, function) waiting for the thread
+        self.request_id = 0  # id of the latest request
+        self.running_id = None  # id of the request running now
+        self.connections = []  # connections of the thread, interrupted when the running request is superseded
+        self.stopped = False
+
+    def submit(self, function):
+        """
+        Queues the function instead of all previous requests. Returns the request id
+        """
+        with self.condition:
+            self.request_id += 1
+            self.pending = self.request_id, function
+            self.interrupt()
+            self.condition.notify()
+            return self.request_id
+
+    def cancel(self):
+        """
+        Drops the waiting request and interrupts the running one
+        """
+        with self.condition:
+            self.request_id += 1
+            self.pending = None
+            self.interrupt()
+
+    def cancelled(self):
+        """
+        True if the running request is superseded, long requests check it between queries
+        """
+        return self.running_id != self.request_id
+
+    def is_latest(self, request_id):
+        return request_id == self.request_id
+
+    def busy(self):
+        with self.condition:
+            return self.pending is not None or self.running_id is not None
+
+    def interrupt(self):
+        if self.running_id is None:
+            return
+        for connection in self.connections:
+            # the only method of a SQLite connection that may be called from another thread
+            connection.interrupt()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                request_id, function = self.pending
+                self.pending = None
+                self.running_id = request_id
+                try:
+                    self.connections = self.database.thread_connections()
+                except Exception as message:
+                    logger.error(message)
+                    self.connections = []
+            try:
+                result = function()
+            except Exception as message:
+                logger.error(message)
+                result = None
+            with self.condition:
+                self.running_id = None
+                # the signal is queued to the thread of the interface, emitting does not wait for it
+                if request_id == self.request_id:
+                    self.result_ready.emit(request_id, result)
+                else:
+                    logger.debug(f"Request {request_id} superseded")
+        if not self.database.deferred:
+            self.database.close()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.pending = None
+            self.interrupt()
+            self.condition.notify()
+        self.wait()
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+if __name__ == '__main__':
+    # run as a script, the modules are imported from the root of the project
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from Models import Models
+from Utilities.Logging import logger
+from settings import DATABASE_NAME, SFX
+
+"""
+The module Benchmark.py measures the functions of Models on a synthetic library.
+The library is generated into a temporary folder: assets are spread over a tree of folders,
+tags are drawn from a Zipfian distribution, so a few tags are on most assets and most tags are rare,
+as in a real library. The report is written as JSON, two reports can be compared:
+
+    python Models/Benchmark.py --assets 50000 --output new.json --compare old.json
+"""
+
+
+class LibraryParams:
+    """
+    Shape of the synthetic library
+    """
+    def __init__(self, assets=10000, tags=2000, tags_per_asset=5, zipf=1.1, depth=3, fanout=4, seed=1):
+        self.assets = assets
+        self.tags = tags  # number of different tag names
+        self.tags_per_asset = tags_per_asset
+        self.zipf = zipf  # exponent of the tag distribution, the tag of rank r is used in proportion to 1 / r ** zipf
+        self.depth = depth  # folder levels above the assets
+        self.fanout = fanout  # subfolders of every folder
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def tag_names(count):
+    return ["tag%d" % x for x in range(count)]
+
+
+def folder_names(lib_path, depth, fanout):
+    """
+    Paths of the deepest folders of the tree, with "/" at the end like Asset.folder
+    """
+    levels = itertools.product(*[["f%d" % x for x in range(fanout)]] * depth)
+    return [lib_path + "/" + "/".join(x) + "/" for x in levels]
+
+
+def generate_assets(lib_path, params):
+    """
+    Asset dicts for Models.rebuild_database
+    """
+    generator = random.Random(params.seed)
+    names = tag_names(params.tags)
+    weights = list(itertools.accumulate(1 / (rank ** params.zipf) for rank in range(1, params.tags + 1)))
+    folders = folder_names(lib_path, params.depth, params.fanout)
+    assets = []
+    for number in range(1, params.assets + 1):
+        tags = set()
+        # popular tags are drawn again and again, the number of attempts is limited
+        for attempt in range(params.tags_per_asset * 10):
+            tags.add(generator.choices(names, cum_weights=weights)[0])
+            if len(tags) == min(params.tags_per_asset, params.tags):
+                break
+        assets.append({"id": number, "name": "asset%d" % number,
+                       "path": generator.choice(folders) + "asset%d" % number + SFX,
+                       "tags": sorted(tags), "description": "synthetic asset %d" % number})
+    return assets
+
+
+def generate_library(lib_path, params):
+    """
+    Writes the synthetic library database and opens it with Models. Returns the generated assets
+    """
+    assets = generate_assets(lib_path, params)
+    Models.full_text_search = Models.AssetSearch.fts5_installed()
+    if not Models.rebuild_database(lib_path + "/" + DATABASE_NAME, assets):
+        raise RuntimeError("The synthetic library was not written")
+    if not Models.initialize(lib_path, replica=False):
+        raise RuntimeError("The synthetic library was not opened")
+    return assets
+
+
+def measure(function, repeat):
+    """
+    Runs the function repeat times, returns the timings in milliseconds and the last result
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def summary(timings, rows=None):
+    out = {"runs": len(timings),
+           "min_ms": round(min(timings), 3),
+           "median_ms": round(statistics.median(timings), 3),
+           "mean_ms": round(statistics.mean(timings), 3),
+           "max_ms": round(max(timings), 3)}
+    if rows is not None:
+        out["rows"] = rows
+    return out
+
+
+def first_page(assets):
+    """
+    Search results are read lazily, the gallery reads the first page at once
+    """
+    return len(assets), assets[:100]
+
+
+def read_benchmarks(lib_path, params):
+    """
+    (name, function) of the read benchmarks, the function returns the number of found rows
+    """
+    names = tag_names(params.tags)
+    popular, second, rare = names[0], names[1], names[params.tags // 2]
+    top_folder = lib_path + "/f0/"
+    deep_folder = folder_names(lib_path, params.depth, params.fanout)[0]
+    return [
+        ("find_assets popular tag", lambda: first_page(Models.find_assets_by_query(popular))[0]),
+        ("find_assets rare tag", lambda: first_page(Models.find_assets_by_query(rare))[0]),
+        ("find_assets and", lambda: first_page(Models.find_assets_by_query(popular + " & " + second))[0]),
+        ("find_assets expression", lambda: first_page(Models.find_assets_by_query(
+            "(%s | %s) -%s" % (second, rare, popular)))[0]),
+        ("find_tags_by_query popular tag", lambda: len(Models.find_tags_by_query(popular))),
+        ("find_tags_by_asset_list popular tag",
+         lambda: len(Models.find_tags_by_asset_list(Models.find_assets_by_query(popular)))),
+        ("search_assets text", lambda: first_page(Models.search_assets("synthetic"))[0]),
+        ("get_all_from_folder top", lambda: first_page(Models.get_all_from_folder(top_folder))[0]),
+        ("get_all_from_folder deep", lambda: first_page(Models.get_all_from_folder(deep_folder))[0]),
+        ("find_tags_by_folder top", lambda: len(Models.find_tags_by_folder(top_folder))),
+        ("complete_tags", lambda: len(Models.complete_tags("tag1"))),
+        ("get_popular_tags", lambda: len(Models.get_popular_tags())),
+    ]
+
+
+def write_benchmarks(lib_path, params, repeat):
+    """
+    Timings of create, edit, delete and folder rename, every run changes the library and is undone
+    """
+    generator = random.Random(params.seed + 1)
+    names = tag_names(params.tags)
+    results = {}
+
+    new_assets = ["bench%d" % x for x in range(repeat)]
+    timings = []
+    for name in new_assets:
+        tags = generator.sample(names, min(params.tags_per_asset, params.tags))
+        start = time.perf_counter()
+        Models.add_asset_to_db(name=name, path=lib_path + "/bench/" + name + SFX, tags=tags, description=name)
+        timings.append((time.perf_counter() - start) * 1000)
+    results["add_asset_to_db"] = summary(timings)
+
+    timings = []
+    for name in new_assets:
+        asset_id = Models.find_asset(name=name)[0]
+        tags = generator.sample(names, min(params.tags_per_asset, params.tags))
+        start = time.perf_counter()
+        Models.edit_db_asset(asset_id=asset_id, name=name, path=lib_path + "/bench/" + name + SFX, tags=tags,
+                             description=name + " edited")
+        timings.append((time.perf_counter() - start) * 1000)
+    results["edit_db_asset"] = summary(timings)
+
+    timings = []
+    for name in new_assets:
+        start = time.perf_counter()
+        Models.delete_asset(name)
+        timings.append((time.perf_counter() - start) * 1000)
+    results["delete_asset"] = summary(timings)
+
+    # the folder with a quarter of the library is renamed and renamed back
+    old_path, new_path = lib_path + "/f0", lib_path + "/renamed"
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Models.rename_directory(old_path, new_path, "f0", "renamed")
+        timings.append((time.perf_counter() - start) * 1000)
+        Models.rename_directory(new_path, old_path, "renamed", "f0")
+    results["rename_directory top"] = summary(timings, len(Models.get_all_from_folder(old_path + "/").ids))
+    return results
+
+
+def run_benchmark(params, repeat=5):
+    """
+    Generates the library into a temporary folder, measures and returns the report as a dict
+    """
+    report = {"created": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "schema_version": Models.SCHEMA_VERSION,
+              "python": platform.python_version(),
+              "sqlite": sqlite3.sqlite_version,
+              "platform": platform.platform(),
+              "params": params.as_dict(),
+              "repeat": repeat,
+              "results": {}}
+    with tempfile.TemporaryDirectory() as lib_path:
+        lib_path = lib_path.replace("\\", "/")
+        try:
+            start = time.perf_counter()
+            generate_library(lib_path, params)
+            report["generate_s"] = round(time.perf_counter() - start, 3)
+
+            start = time.perf_counter()
+            Models.build_tag_index()
+            report["results"]["build_tag_index"] = summary([(time.perf_counter() - start) * 1000])
+
+            for name, function in read_benchmarks(lib_path, params):
+                # the first run warms up the page cache of SQLite
+                function()
+                timings, rows = measure(function, repeat)
+                report["results"][name] = summary(timings, rows)
+            report["results"].update(write_benchmarks(lib_path, params, repeat))
+        finally:
+            # the database file must be closed before the folder is removed
+            Models.data_base.close()
+    return report
+
+
+def compare_reports(old, new):
+    """
+    Lines with the median times of both reports and their ratio, new / old
+    """
+    lines = [f"{'benchmark':40} {'old ms':>10} {'new ms':>10} {'ratio':>7}"]
+    for name, result in new["results"].items():
+        old_result = old["results"].get(name)
+        if not old_result:
+            lines.append(f"{name:40} {'-':>10} {result['median_ms']:>10.3f} {'-':>7}")
+            continue
+        ratio = result["median_ms"] / old_result["median_ms"] if old_result["median_ms"] else float("inf")
+        lines.append(f"{name:40} {old_result['median_ms']:>10.3f} {result['median_ms']:>10.3f} {ratio:>7.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the Models functions on a synthetic library")
+    parser.add_argument("--assets", type=int, default=10000)
+    parser.add_argument("--tags", type=int, default=2000, help="number of different tags")
+    parser.add_argument("--tags-per-asset", type=int, default=5)
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of the tag distribution")
+    parser.add_argument("--depth", type=int, default=3, help="folder levels above the assets")
+    parser.add_argument("--fanout", type=int, default=4, help="subfolders of every folder")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every benchmark")
+    parser.add_argument("--output", help="file for the JSON report, printed if not given")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare with")
+    args = parser.parse_args()
+
+    # the debug messages of Models would be measured too
+    logger.setLevel(logging.WARNING)
+    result = run_benchmark(LibraryParams(args.assets, args.tags, args.tags_per_asset, args.zipf, args.depth,
+                                         args.fanout, args.seed), args.repeat)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(result, outfile, indent=4)
+    else:
+        print(json.dumps(result, indent=4))
+    if args.compare:
+        with open(args.compare) as infile:
+            print(compare_reports(json.load(infile), result))
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+import atexit
+import bisect
+import functools
+import inspect
+import json
+import threading
+import time
+
+from peewee import SqliteDatabase
+
+from Models.Replica import ReplicatedSqliteDatabase
+from Utilities.Logging import logger
+
+"""
+The module Instrumentation.py measures the functions of Models and every SQL statement they run.
+It is switched on by INSTRUMENTATION in settings.py. For every function it keeps the number of calls,
+the time and the number of returned rows, for every statement the time of its execution,
+the time spent reading its rows and the number of rows. The plan of statements slower than
+SLOW_QUERY_MS is written to the log. Histograms of the times are written to a JSON file on exit
+"""
+
+# upper bounds of the histogram buckets in milliseconds, the last bucket has no bound
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class Timing:
+    """
+    Calls, times and rows of one function or one SQL statement
+    """
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.fetch_ms = 0.0  # time of reading the rows, SQL statements only
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, ms, rows=None):
+        self.calls += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.histogram[bisect.bisect_left(BUCKETS, ms)] += 1
+        if rows:
+            self.rows += rows
+
+    def as_dict(self):
+        return {"calls": self.calls,
+                "total_ms": round(self.total_ms, 3),
+                "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0,
+                "max_ms": round(self.max_ms, 3),
+                "fetch_ms": round(self.fetch_ms, 3),
+                "rows": self.rows,
+                "histogram": {("<=%d" % bound if index < len(BUCKETS) else ">%d" % BUCKETS[-1]): count
+                              for index, (bound, count) in enumerate(zip(BUCKETS + [None], self.histogram))
+                              if count}}
+
+
+class Recorder:
+    """
+    Timings collected from all threads
+    """
+    def __init__(self, slow_query_ms=100, explain=True):
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self.lock = threading.Lock()
+        self.functions = {}  # function name: Timing
+        self.queries = {}  # SQL text: Timing
+        self.plans = {}  # SQL text of slow statements: query plan
+        self.local = threading.local()  # depth of execute_sql calls of the thread
+        self.started = time.time()
+
+    def timing(self, table, key):
+        timing = table.get(key)
+        if timing is None:
+            timing = table[key] = Timing()
+        return timing
+
+    def function_done(self, name, ms, rows):
+        with self.lock:
+            self.timing(self.functions, name).add(ms, rows)
+
+    def query_done(self, sql, ms, rows=None):
+        with self.lock:
+            self.timing(self.queries, sql).add(ms, rows)
+
+    def rows_read(self, sql, ms, rows):
+        with self.lock:
+            timing = self.timing(self.queries, sql)
+            timing.fetch_ms += ms
+            timing.rows += rows
+
+    def slow_query(self, cursor, sql, params, ms):
+        """
+        Writes the plan of a slow statement to the log, once for every statement
+        """
+        if not self.explain or sql in self.plans or not sql.lstrip()[:6].upper() in ("SELECT", "WITH"):
+            return
+        try:
+            # the connection of the cursor, so the plan is made by the same database file
+            plan = [row[-1] for row in cursor.connection.execute("EXPLAIN QUERY PLAN " + sql, params or ())]
+        except Exception as message:
+            plan = ["plan is not available: %s" % message]
+        with self.lock:
+            self.plans[sql] = plan
+        logger.warning(f"Slow query {ms:.1f} ms: {sql}\n    " + "\n    ".join(plan))
+
+    def report(self):
+        with self.lock:
+            return {"started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                    "duration_s": round(time.time() - self.started, 3),
+                    "buckets_ms": BUCKETS,
+                    "functions": {name: x.as_dict() for name, x in
+                                  sorted(self.functions.items(), key=lambda x: -x[1].total_ms)},
+                    "queries": [dict(sql=sql, plan=self.plans.get(sql), **x.as_dict()) for sql, x in
+                                sorted(self.queries.items(), key=lambda x: -(x[1].total_ms + x[1].fetch_ms))]}
+
+    def write(self, path):
+        try:
+            with open(path, "w") as outfile:
+                json.dump(self.report(), outfile, indent=4)
+            logger.info("Timings written to " + path)
+        except Exception as message:
+            logger.error(message)
+
+
+class TimedCursor:
+    """
+    sqlite3 cursor that counts the rows read from it and the time spent reading them
+    """
+    def __init__(self, cursor, sql, recorder):
+        self._cursor = cursor
+        self._sql = sql
+        self._recorder = recorder
+
+    def _read(self, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        rows = (1 if result is not None else 0) if function == self._cursor.fetchone else len(result)
+        self._recorder.rows_read(self._sql, (time.perf_counter() - start) * 1000, rows)
+        return result
+
+    def fetchone(self):
+        return self._read(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._read(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._read(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def row_count(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def timed(function, recorder):
+    """
+    Decorator recording the time of the function and the length of its result
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            recorder.function_done(function.__name__, (time.perf_counter() - start) * 1000, None)
+            raise
+        recorder.function_done(function.__name__, (time.perf_counter() - start) * 1000, row_count(result))
+        return result
+    wrapper.instrumented = True
+    return wrapper
+
+
+def timed_execute_sql(execute_sql, recorder):
+    """
+    Wraps execute_sql of a database class. ReplicatedSqliteDatabase passes writes to SqliteDatabase,
+    only the outer call of the thread is recorded
+    """
+    @functools.wraps(execute_sql)
+    def wrapper(self, sql, params=None, *args, **kwargs):
+        local = recorder.local
+        depth = getattr(local, "depth", 0)
+        if depth:
+            return execute_sql(self, sql, params, *args, **kwargs)
+        local.depth = 1
+        start = time.perf_counter()
+        try:
+            cursor = execute_sql(self, sql, params, *args, **kwargs)
+        finally:
+            local.depth = 0
+        ms = (time.perf_counter() - start) * 1000
+        # the number of changed rows of a write is known at once, the rows of a read are counted by TimedCursor
+        recorder.query_done(sql, ms, cursor.rowcount if cursor.rowcount > 0 else None)
+        if ms >= recorder.slow_query_ms:
+            recorder.slow_query(cursor, sql, params, ms)
+        return TimedCursor(cursor, sql, recorder)
+    wrapper.instrumented = True
+    return wrapper
+
+
+recorder = None
+
+
+def install(models, path, slow_query_ms=100, explain=True):
+    """
+    Wraps the public functions of the models module and the execute_sql of the database classes,
+    the report is written to path when the program exits. Returns the Recorder
+    """
+    global recorder
+    if recorder is not None:
+        return recorder
+    recorder = Recorder(slow_query_ms, explain)
+    for name, function in inspect.getmembers(models, inspect.isfunction):
+        # only the functions defined in the module, not the imported ones
+        if function.__module__ == models.__name__ and not name.startswith("_"):
+            setattr(models, name, timed(function, recorder))
+    for database_class in (ReplicatedSqliteDatabase, SqliteDatabase):
+        if not getattr(database_class.execute_sql, "instrumented", False):
+            database_class.execute_sql = timed_execute_sql(database_class.execute_sql, recorder)
+    atexit.register(recorder.write, path)
+    logger.info("Instrumentation of Models is on, the report will be written to " + path)
+    return recorder
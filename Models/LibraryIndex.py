@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+import argparse
+import array
+import bisect
+import hashlib
+import heapq
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import time
+from collections import Counter
+
+if __name__ == '__main__':
+    # run as a script, the modules are imported from the root of the project
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from Models.ResultSet import AssetResultSet
+from Models.SimilarityIndex import rank_similar
+
+"""
+The module LibraryIndex.py packs the assets, tags and folders of a library into one immutable file
+that clients of CLIENT_MODE map into memory and search without opening the database on the share.
+The file is written by the publishing side after the library changes and is never modified, a new
+version replaces it. All lists are sorted arrays of 32-bit numbers and tables of UTF-8 strings:
+assets are stored in the order of their ids, every tag, folder and word of the text search has
+the sorted list of the numbers of its assets (postings), so a search is a few set operations
+
+    python Models/LibraryIndex.py U:/Asset_Library
+"""
+
+MAGIC = b"ABINDEX3"
+# sections of the file in the order of the header, every section is (offset, length in bytes)
+SECTIONS = ["asset_ids", "asset_flags", "icon_widths", "icon_heights", "asset_folders", "files_mtimes",
+            "names", "name_offsets", "paths", "path_offsets", "descriptions", "description_offsets",
+            "asset_tag_offsets", "asset_tags", "file_offsets", "files", "file_name_offsets",
+            "tags", "tag_offsets", "tag_counts", "tag_posting_offsets", "tag_postings",
+            "folders", "folder_offsets", "folder_posting_offsets", "folder_postings",
+            "words", "word_offsets", "word_posting_offsets", "word_postings"]
+# magic, number of sections, number of assets, modification time and content version of the database
+HEADER = struct.Struct("<8sIIdQ")
+SECTION = struct.Struct("<QQ")
+
+# bits of asset_flags
+MISSING, HAS_ICON, ICON_MEASURED, DETAILS_STORED = 1, 2, 4, 8
+# bits of the word postings telling where the word is found, with the weights of the full-text search
+NAME_WORD, TAG_WORD, DESCRIPTION_WORD = 1, 2, 4
+WORD_WEIGHTS = {NAME_WORD: 10.0, TAG_WORD: 5.0, DESCRIPTION_WORD: 1.0}
+
+
+def words(text):
+    """
+    Words of the text for the text search, like the unicode61 tokenizer of the full-text index
+    """
+    return re.findall(r"[^\W_]+", (text or "").lower())
+
+
+def string_table(strings):
+    """
+    UTF-8 bytes of the strings and the offsets of their starts, the string i is blob[offsets[i]:offsets[i + 1]]
+    """
+    blob = bytearray()
+    offsets = array.array("I", [0])
+    for x in strings:
+        blob += x.encode("utf-8")
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+
+def postings(lists):
+    """
+    Lists of numbers packed into one array with the offsets of their starts, like string_table
+    """
+    offsets = array.array("I", [0])
+    values = array.array("I")
+    for x in lists:
+        values.extend(x)
+        offsets.append(len(values))
+    return values, offsets
+
+
+def write_index(path, assets, tags, links, files, folders, database_mtime, content_version=0):
+    """
+    Writes the index file. assets - (id, name, path, folder, missing, icon width, icon height, has icon,
+    description, details stored, files mtime) sorted by id, tags - {name: usage count}, links - (asset id, tag name),
+    files - (asset id, kind, name), folders - folder paths with "/" at the end, folders of assets are added,
+    content_version - version of the library data the rows were read at.
+    The file is written next to path and renamed, readers never see it half written
+    """
+    number = {x[0]: n for n, x in enumerate(assets)}
+    tag_names = sorted(tags)
+    tag_number = {x: n for n, x in enumerate(tag_names)}
+    folder_names = sorted(set(folders) | {x[3] for x in assets})
+    folder_number = {x: n for n, x in enumerate(folder_names)}
+
+    asset_tags = [[] for _ in assets]
+    tag_assets = [[] for _ in tag_names]
+    for asset_id, name in links:
+        if asset_id in number and name in tag_number:
+            asset_tags[number[asset_id]].append(tag_number[name])
+            tag_assets[tag_number[name]].append(number[asset_id])
+    asset_files = [[] for _ in assets]
+    for asset_id, kind, name in files:
+        if asset_id in number:
+            asset_files[number[asset_id]].append(kind + "/" + name)
+    folder_assets = [[] for _ in folder_names]
+    word_assets = {}
+    for n, x in enumerate(assets):
+        folder_assets[folder_number[x[3]]].append(n)
+        places = {}
+        for kind, text in ((NAME_WORD, x[1]), (TAG_WORD, " ".join(tag_names[t] for t in asset_tags[n])),
+                           (DESCRIPTION_WORD, x[8])):
+            for word in words(text):
+                places[word] = places.get(word, 0) | kind
+        for word, kind in places.items():
+            # the number of the asset and the places of the word in one value
+            word_assets.setdefault(word, []).append(n << 3 | kind)
+    word_names = sorted(word_assets)
+
+    sections = {
+        "asset_ids": array.array("I", [x[0] for x in assets]),
+        "asset_flags": bytes((MISSING if x[4] else 0) |
+                             (HAS_ICON if x[7] else 0) |
+                             (ICON_MEASURED if x[7] is not None else 0) |
+                             (DETAILS_STORED if x[9] else 0) for x in assets),
+        "icon_widths": array.array("I", [x[5] or 0 for x in assets]),
+        "icon_heights": array.array("I", [x[6] or 0 for x in assets]),
+        "asset_folders": array.array("I", [folder_number[x[3]] for x in assets]),
+        # 0 if the files were listed without the time of their folders
+        "files_mtimes": array.array("d", [x[10] or 0 for x in assets]),
+        "tag_counts": array.array("I", [tags[x] for x in tag_names]),
+    }
+    sections["names"], sections["name_offsets"] = string_table(x[1] for x in assets)
+    sections["paths"], sections["path_offsets"] = string_table(x[2] for x in assets)
+    sections["descriptions"], sections["description_offsets"] = string_table(x[8] or "" for x in assets)
+    sections["asset_tags"], sections["asset_tag_offsets"] = postings(sorted(x) for x in asset_tags)
+    file_names, file_offsets = [], array.array("I", [0])
+    for x in asset_files:
+        file_names += sorted(x)
+        file_offsets.append(len(file_names))
+    sections["file_offsets"] = file_offsets
+    sections["files"], sections["file_name_offsets"] = string_table(file_names)
+    sections["tags"], sections["tag_offsets"] = string_table(tag_names)
+    sections["tag_postings"], sections["tag_posting_offsets"] = postings(tag_assets)
+    sections["folders"], sections["folder_offsets"] = string_table(folder_names)
+    sections["folder_postings"], sections["folder_posting_offsets"] = postings(folder_assets)
+    sections["words"], sections["word_offsets"] = string_table(word_names)
+    sections["word_postings"], sections["word_posting_offsets"] = postings(word_assets[x] for x in word_names)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as outfile:
+        table_size = HEADER.size + SECTION.size * len(SECTIONS)
+        outfile.write(b"\0" * table_size)
+        table = []
+        for name in SECTIONS:
+            data = sections[name]
+            data = data.tobytes() if isinstance(data, array.array) else data
+            # arrays are aligned to 8 bytes, so they are cast without copying
+            outfile.write(b"\0" * (-outfile.tell() % 8))
+            table.append((outfile.tell(), len(data)))
+            outfile.write(data)
+        outfile.seek(0)
+        outfile.write(HEADER.pack(MAGIC, len(SECTIONS), len(assets), database_mtime, content_version))
+        for offset, length in table:
+            outfile.write(SECTION.pack(offset, length))
+    os.replace(temp_path, path)
+
+
+def read_content_version(path):
+    """
+    Content version of the database the index file was written from, None if it is not an index of this version
+    """
+    with open(path, "rb") as infile:
+        header = infile.read(HEADER.size)
+    if len(header) != HEADER.size:
+        return None
+    magic, count, size, database_mtime, content_version = HEADER.unpack(header)
+    return content_version if magic == MAGIC and count == len(SECTIONS) else None
+
+
+def load_index(path, cache_dir):
+    """
+    Maps the index file into memory. The file is read from the share once and mapped from its local copy,
+    the copy is named by the time of the file, so a new version never overwrites a mapped one
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    stat = os.stat(path)
+    prefix = hashlib.md5(os.path.abspath(path).encode("utf-8")).hexdigest()
+    local_path = os.path.join(cache_dir, f"{prefix}_{stat.st_mtime_ns}.index")
+    if not os.path.exists(local_path) or os.path.getsize(local_path) != stat.st_size:
+        shutil.copyfile(path, local_path + ".tmp")
+        os.replace(local_path + ".tmp", local_path)
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name != os.path.basename(local_path):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                # still mapped by another window of the program
+                pass
+    index = LibraryIndex(local_path)
+    index.source, index.version = path, stat.st_mtime_ns
+    return index
+
+
+class StringTable:
+    """
+    Sequence of the strings of a string table, read from the mapped file when accessed
+    """
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __getitem__(self, index):
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def range(self, low, high):
+        """
+        Numbers of the strings from low (inclusive) to high (exclusive), the table must be sorted
+        """
+        return range(bisect.bisect_left(self, low), bisect.bisect_left(self, high))
+
+    def find(self, value):
+        """
+        Number of the string in the sorted table, None if it is not there
+        """
+        index = bisect.bisect_left(self, value)
+        return index if index < len(self) and self[index] == value else None
+
+
+class Postings:
+    """
+    Lists of numbers packed by postings()
+    """
+    def __init__(self, values, offsets):
+        self.values = values
+        self.offsets = offsets
+
+    def __getitem__(self, index):
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+
+class IndexAsset:
+    """
+    Asset read from the index, has the attributes of Models.Asset used by the interface
+    """
+    icon = ""
+
+    def __init__(self, index, number):
+        self.index = index
+        self.number = number
+        self.id = index.asset_ids[number]
+        self.name = index.names[number]
+        self.path = index.paths[number]
+        self.folder = index.folders[index.asset_folders[number]]
+        flags = index.asset_flags[number]
+        self.missing = bool(flags & MISSING)
+        self.icon_width = index.icon_widths[number]
+        self.icon_height = index.icon_heights[number]
+        self.has_icon = bool(flags & HAS_ICON) if flags & ICON_MEASURED else None
+        self.details_stored = bool(flags & DETAILS_STORED)
+        self.library = None
+
+    @property
+    def description(self):
+        return self.index.descriptions[self.number]
+
+    def __repr__(self):
+        return f"<IndexAsset {self.id} {self.name}>"
+
+
+class IndexResultSet(AssetResultSet):
+    """
+    Found assets of the index, kept as the numbers of the assets in the index
+    """
+    def __init__(self, index, numbers, page_size=100):
+        self.index = index
+        self.numbers = numbers
+        super(IndexResultSet, self).__init__(None, [index.asset_ids[x] for x in numbers], page_size)
+
+    def page(self, number):
+        if number not in self.pages:
+            numbers = self.numbers[number * self.page_size:(number + 1) * self.page_size]
+            self.pages[number] = [self.index.asset(x) for x in numbers]
+        return self.pages[number]
+
+    def __repr__(self):
+        return f"<IndexResultSet {len(self)} assets>"
+
+
+class LibraryIndex:
+    """
+    Index file mapped into memory, read by any number of threads
+    """
+    def __init__(self, path):
+        self.path = path
+        self.source = path  # the published file the mapped file is copied from
+        self.version = None  # modification time of the published file in nanoseconds
+        with open(path, "rb") as infile:
+            # the mapping stays valid after the file is closed
+            self.map = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, self.size, self.database_mtime, self.content_version = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or count != len(SECTIONS):
+            raise ValueError(f"{path} is not an index file of this version")
+        if sys.byteorder != "little":
+            raise ValueError("The index file is written in the little-endian byte order")
+        view = memoryview(self.map)
+        sections = {}
+        for number, name in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self.map, HEADER.size + SECTION.size * number)
+            sections[name] = view[offset:offset + length]
+        for name in SECTIONS:
+            if name in ("asset_flags", "names", "paths", "descriptions", "files", "tags", "folders", "words"):
+                continue
+            sections[name] = sections[name].cast("d" if name == "files_mtimes" else "I")
+
+        self.asset_ids = sections["asset_ids"]
+        self.asset_flags = sections["asset_flags"]
+        self.icon_widths = sections["icon_widths"]
+        self.icon_heights = sections["icon_heights"]
+        self.asset_folders = sections["asset_folders"]
+        self.files_mtimes = sections["files_mtimes"]
+        self.names = StringTable(sections["names"], sections["name_offsets"])
+        self.paths = StringTable(sections["paths"], sections["path_offsets"])
+        self.descriptions = StringTable(sections["descriptions"], sections["description_offsets"])
+        self.asset_tags = Postings(sections["asset_tags"], sections["asset_tag_offsets"])
+        self.file_offsets = sections["file_offsets"]
+        self.files = StringTable(sections["files"], sections["file_name_offsets"])
+        self.tags = StringTable(sections["tags"], sections["tag_offsets"])
+        self.tag_counts = sections["tag_counts"]
+        self.tag_postings = Postings(sections["tag_postings"], sections["tag_posting_offsets"])
+        self.folders = StringTable(sections["folders"], sections["folder_offsets"])
+        self.folder_postings = Postings(sections["folder_postings"], sections["folder_posting_offsets"])
+        self.words = StringTable(sections["words"], sections["word_offsets"])
+        self.word_postings = Postings(sections["word_postings"], sections["word_posting_offsets"])
+        # {name: asset number} and {path: asset number}, made on the first lookup
+        self.by_name = None
+        self.by_path = None
+
+    def __len__(self):
+        return self.size
+
+    def asset(self, number):
+        return IndexAsset(self, number)
+
+    def result(self, numbers):
+        return IndexResultSet(self, numbers)
+
+    def number_of(self, asset_id):
+        """
+        Number of the asset with the id, None if it is not in the index
+        """
+        index = bisect.bisect_left(self.asset_ids, asset_id)
+        return index if index < self.size and self.asset_ids[index] == asset_id else None
+
+    def tag_usage(self):
+        """
+        (name, usage count) of all tags
+        """
+        return [(self.tags[x], self.tag_counts[x]) for x in range(len(self.tags))]
+
+    def popular_tags(self, limit=50):
+        # tag numbers are in the alphabetical order, equally used tags stay sorted by name
+        numbers = heapq.nsmallest(limit, (x for x in range(len(self.tags)) if self.tag_counts[x] > 0),
+                                  key=lambda x: -self.tag_counts[x])
+        return [(self.tags[x], self.tag_counts[x]) for x in numbers]
+
+    def evaluate(self, node):
+        """
+        Set of the asset numbers matching the expression tree of QueryParser
+        """
+        kind = node[0]
+        if kind == "tag":
+            number = self.tags.find(node[1])
+            return set(self.tag_postings[number]) if number is not None else set()
+        if kind == "not":
+            return set(range(self.size)) - self.evaluate(node[1])
+        if kind == "and":
+            # a negated side is subtracted, the set of all assets is not made
+            left, right = node[1], node[2]
+            if right[0] == "not":
+                return self.evaluate(left) - self.evaluate(right[1])
+            if left[0] == "not":
+                return self.evaluate(right) - self.evaluate(left[1])
+            return self.evaluate(left) & self.evaluate(right)
+        return self.evaluate(node[1]) | self.evaluate(node[2])
+
+    def find(self, node):
+        """
+        Assets matching the expression tree in the order of their ids
+        """
+        return self.result(sorted(self.evaluate(node)))
+
+    def text_search(self, text):
+        """
+        Assets having every word of the text as a prefix of a word of their name, tags or description,
+        ranked by the places of the words like the full-text search
+        """
+        scores = None
+        for word in words(text):
+            found = {}
+            for number in self.words.range(word, word + "\uffff"):
+                for value in self.word_postings[number]:
+                    asset, places = value >> 3, value & 7
+                    weight = max(WORD_WEIGHTS[x] for x in WORD_WEIGHTS if places & x)
+                    found[asset] = max(found.get(asset, 0), weight)
+            if scores is None:
+                scores = found
+            else:
+                scores = {x: scores[x] + found[x] for x in scores if x in found}
+            if not scores:
+                break
+        if not scores:
+            return self.result([])
+        return self.result(sorted(scores, key=lambda x: (-scores[x], x)))
+
+    def in_folder(self, path):
+        """
+        Assets inside the folder and its subfolders in the order of their ids
+        """
+        path = path.replace("\\", "/")
+        path = path if path.endswith("/") else path + "/"
+        numbers = []
+        for number in self.folders.range(path, path[:-1] + "0"):
+            numbers.extend(self.folder_postings[number])
+        return self.result(sorted(numbers))
+
+    def facets(self, numbers):
+        """
+        Tags of the assets with the number of assets for each tag in the order of Models.get_tag_facets
+        """
+        counts = Counter()
+        for number in numbers:
+            counts.update(self.asset_tags[number])
+        order = sorted(counts, key=lambda x: (-counts[x], -self.tag_counts[x], x))
+        return [(self.tags[x], counts[x]) for x in order]
+
+    def similar(self, number, limit=10):
+        """
+        (asset number, similarity) of the assets with tags most similar to the asset
+        """
+        offsets = self.asset_tags.offsets
+        return rank_similar(self.asset_tags[number], lambda x: self.tag_postings[x],
+                            lambda x: offsets[x + 1] - offsets[x], number, limit)
+
+    def find_asset(self, id=None, name=None, path=None):
+        """
+        Number of the asset with the id, name or path like Models.find_asset, None if there is no such asset
+        """
+        number = None
+        if id:
+            number = self.number_of(id)
+        if name:
+            if self.by_name is None:
+                self.by_name = {self.names[x]: x for x in range(self.size)}
+            number = self.by_name.get(name)
+        if path:
+            if self.by_path is None:
+                self.by_path = {self.paths[x]: x for x in range(self.size)}
+            number = self.by_path.get(path)
+        return number
+
+    def details(self, number):
+        """
+        Details of the asset like Models.get_asset_details, None if its files were not stored
+        """
+        asset = self.asset(number)
+        if not asset.details_stored:
+            return None
+        files = {}
+        for x in range(self.file_offsets[number], self.file_offsets[number + 1]):
+            kind, name = self.files[x].split("/", 1)
+            files.setdefault(kind, []).append(name)
+        return {"asset_id": asset.id, "name": asset.name, "path": asset.path, "description": asset.description,
+                "tags": [self.tags[x] for x in self.asset_tags[number]], "has_icon": asset.has_icon,
+                "files": files, "files_mtime": self.files_mtimes[number] or None}
+
+    def folder_tree(self):
+        """
+        All folders of the library with "/" at the end, sorted
+        """
+        return [self.folders[x] for x in range(len(self.folders))]
+
+
+if __name__ == '__main__':
+    from Models import Models
+
+    parser = argparse.ArgumentParser(description="Write the index file of a library for the clients")
+    parser.add_argument("library", help="library folder containing the database")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = Models.write_library_index(args.library.replace("\\", "/").rstrip("/"))
+    if not path:
+        sys.exit(1)
+    print(f"{path} written in {time.perf_counter() - start:.2f} s, {os.path.getsize(path)} bytes")
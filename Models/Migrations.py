@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import os
+
+from Utilities.Logging import logger
+
+"""
+The module Migrations.py upgrades databases of existing libraries to the current schema.
+The schema version is stored in PRAGMA user_version. Every migration is written in plain SQL
+and must not use the models, because the models always describe the latest schema
+"""
+
+
+def add_folder_column(db):
+    """
+    Version 1: indexed parent folder of every asset
+    """
+    if "folder" in [x.name for x in db.get_columns("asset")]:
+        return
+    db.execute_sql('ALTER TABLE "asset" ADD COLUMN "folder" VARCHAR(255) NOT NULL DEFAULT \'\'')
+    for asset_id, path in db.execute_sql('SELECT "id", "path" FROM "asset"').fetchall():
+        # the same value as Models.folder_of
+        folder = os.path.dirname(path.replace("\\", "/").rstrip("/")) + "/"
+        db.execute_sql('UPDATE "asset" SET "folder" = ? WHERE "id" = ?', (folder, asset_id))
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "asset_folder" ON "asset" ("folder")')
+
+
+def normalize_tags(db):
+    """
+    Version 2: tag names are stored once in the tag table and linked to assets through asset_tag
+    """
+    db.execute_sql('DROP INDEX IF EXISTS "tag_name"')
+    db.execute_sql('DROP INDEX IF EXISTS "tag_asset_id"')
+    db.execute_sql('ALTER TABLE "tag" RENAME TO "tag_old"')
+    db.execute_sql('CREATE TABLE "tag" ("id" INTEGER NOT NULL PRIMARY KEY, "name" VARCHAR(255) NOT NULL)')
+    db.execute_sql('CREATE UNIQUE INDEX "tag_name" ON "tag" ("name")')
+    db.execute_sql('CREATE TABLE "asset_tag" ('
+                   '"id" INTEGER NOT NULL PRIMARY KEY, '
+                   '"asset_id" INTEGER NOT NULL, '
+                   '"tag_id" INTEGER NOT NULL, '
+                   'FOREIGN KEY ("asset_id") REFERENCES "asset" ("id") ON DELETE CASCADE, '
+                   'FOREIGN KEY ("tag_id") REFERENCES "tag" ("id"))')
+    db.execute_sql('CREATE UNIQUE INDEX "assettag_asset_id_tag_id" ON "asset_tag" ("asset_id", "tag_id")')
+    db.execute_sql('CREATE INDEX "assettag_tag_id" ON "asset_tag" ("tag_id")')
+    db.execute_sql('INSERT OR IGNORE INTO "tag" ("name") SELECT DISTINCT "name" FROM "tag_old"')
+    db.execute_sql('INSERT OR IGNORE INTO "asset_tag" ("asset_id", "tag_id") '
+                   'SELECT "tag_old"."asset_id", "tag"."id" FROM "tag_old" '
+                   'JOIN "tag" ON "tag"."name" = "tag_old"."name" '
+                   'WHERE "tag_old"."asset_id" IN (SELECT "id" FROM "asset")')
+    db.execute_sql('DROP TABLE "tag_old"')
+
+
+def add_asset_name_index(db):
+    """
+    Version 3: index for checking that an asset name is not taken
+    """
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "asset_name" ON "asset" ("name")')
+
+
+def add_sync_tables(db):
+    """
+    Version 4: flag of assets whose folder is not on disk and the journal of scanned folders
+    """
+    if "missing" not in [x.name for x in db.get_columns("asset")]:
+        db.execute_sql('ALTER TABLE "asset" ADD COLUMN "missing" INTEGER NOT NULL DEFAULT 0')
+    db.execute_sql('CREATE TABLE IF NOT EXISTS "folder_state" ('
+                   '"id" INTEGER NOT NULL PRIMARY KEY, "path" VARCHAR(255) NOT NULL, "mtime" REAL NOT NULL)')
+    db.execute_sql('CREATE UNIQUE INDEX IF NOT EXISTS "folderstate_path" ON "folder_state" ("path")')
+
+
+def add_icon_columns(db):
+    """
+    Version 5: size of the asset icon for the gallery layout, has_icon is NULL until the icon is measured
+    """
+    columns = [x.name for x in db.get_columns("asset")]
+    for name, definition in (("icon_width", "INTEGER NOT NULL DEFAULT 0"), ("icon_height", "INTEGER NOT NULL DEFAULT 0"),
+                             ("has_icon", "INTEGER")):
+        if name not in columns:
+            db.execute_sql(f'ALTER TABLE "asset" ADD COLUMN "{name}" {definition}')
+
+
+def add_asset_files(db):
+    """
+    Version 6: descriptions and file listings of assets, the asset overview does not read the asset folder.
+    The descriptions are copied from the full-text index, the files are listed when an asset is opened
+    """
+    columns = [x.name for x in db.get_columns("asset")]
+    if "description" not in columns:
+        db.execute_sql('ALTER TABLE "asset" ADD COLUMN "description" TEXT NOT NULL DEFAULT \'\'')
+        if db.table_exists("asset_search"):
+            db.execute_sql('UPDATE "asset" SET "description" = COALESCE((SELECT "description" FROM "asset_search" '
+                           'WHERE "asset_search"."rowid" = "asset"."id"), \'\')')
+    if "details_stored" not in columns:
+        db.execute_sql('ALTER TABLE "asset" ADD COLUMN "details_stored" INTEGER NOT NULL DEFAULT 0')
+    db.execute_sql('CREATE TABLE IF NOT EXISTS "asset_file" ('
+                   '"id" INTEGER NOT NULL PRIMARY KEY, '
+                   '"asset_id" INTEGER NOT NULL, '
+                   '"kind" VARCHAR(255) NOT NULL, '
+                   '"name" VARCHAR(255) NOT NULL, '
+                   '"size" INTEGER NOT NULL, '
+                   '"mtime" REAL NOT NULL, '
+                   'FOREIGN KEY ("asset_id") REFERENCES "asset" ("id") ON DELETE CASCADE)')
+    db.execute_sql('CREATE UNIQUE INDEX IF NOT EXISTS "assetfile_asset_id_kind_name" '
+                   'ON "asset_file" ("asset_id", "kind", "name")')
+
+
+# usage counters of tags follow the links between assets and tags
+TAG_USAGE_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS "asset_tag_insert" AFTER INSERT ON "asset_tag" BEGIN '
+    'UPDATE "tag" SET "usage_count" = "usage_count" + 1 WHERE "id" = NEW."tag_id"; END',
+    'CREATE TRIGGER IF NOT EXISTS "asset_tag_delete" AFTER DELETE ON "asset_tag" BEGIN '
+    'UPDATE "tag" SET "usage_count" = "usage_count" - 1 WHERE "id" = OLD."tag_id"; END',
+    'CREATE TRIGGER IF NOT EXISTS "asset_tag_update" AFTER UPDATE OF "tag_id" ON "asset_tag" BEGIN '
+    'UPDATE "tag" SET "usage_count" = "usage_count" - 1 WHERE "id" = OLD."tag_id"; '
+    'UPDATE "tag" SET "usage_count" = "usage_count" + 1 WHERE "id" = NEW."tag_id"; END',
+]
+
+
+# tables of the data written to the index file of the library, every change of them increments library_version
+VERSIONED_TABLES = ["asset", "tag", "asset_tag", "asset_file", "folder_state"]
+VERSION_TRIGGERS = [
+    f'CREATE TRIGGER IF NOT EXISTS "{table}_version_{event.lower()}" AFTER {event} ON "{table}" BEGIN '
+    f'UPDATE "library_version" SET "version" = "version" + 1; END'
+    for table in VERSIONED_TABLES for event in ("INSERT", "UPDATE", "DELETE")]
+
+
+def create_triggers(db):
+    """
+    Triggers and the version of the data are not described by the models,
+    new databases get them after the tables are created
+    """
+    for sql in TAG_USAGE_TRIGGERS:
+        db.execute_sql(sql)
+    db.execute_sql('CREATE TABLE IF NOT EXISTS "library_version" ('
+                   '"id" INTEGER NOT NULL PRIMARY KEY CHECK ("id" = 1), "version" INTEGER NOT NULL)')
+    db.execute_sql('INSERT OR IGNORE INTO "library_version" ("id", "version") VALUES (1, 0)')
+    for sql in VERSION_TRIGGERS:
+        db.execute_sql(sql)
+
+
+def content_version(db):
+    """
+    Number of changes of the data of the library, None for a database without the counter
+    """
+    if not db.table_exists("library_version"):
+        return None
+    row = db.execute_sql('SELECT "version" FROM "library_version"').fetchone()
+    return row[0] if row else None
+
+
+def add_tag_usage_count(db):
+    """
+    Version 7: number of assets of every tag, kept by triggers
+    """
+    if "usage_count" not in [x.name for x in db.get_columns("tag")]:
+        db.execute_sql('ALTER TABLE "tag" ADD COLUMN "usage_count" INTEGER NOT NULL DEFAULT 0')
+    db.execute_sql('UPDATE "tag" SET "usage_count" = '
+                   '(SELECT COUNT(*) FROM "asset_tag" WHERE "asset_tag"."tag_id" = "tag"."id")')
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "tag_usage_count" ON "tag" ("usage_count")')
+    create_triggers(db)
+
+
+def add_files_mtime(db):
+    """
+    Version 8: time of the content and gallery folders when the files of the asset were listed,
+    a newer folder means files were added or removed by hand since
+    """
+    if "files_mtime" not in [x.name for x in db.get_columns("asset")]:
+        db.execute_sql('ALTER TABLE "asset" ADD COLUMN "files_mtime" REAL')
+
+
+def add_library_version(db):
+    """
+    Version 9: counter of the changes of the library data, the index file of the library is up to date
+    while it has the same version
+    """
+    create_triggers(db)
+
+
+# migrations in order, the index + 1 is the schema version after the migration
+MIGRATIONS = [add_folder_column, normalize_tags, add_asset_name_index, add_sync_tables,
+              add_icon_columns, add_asset_files, add_tag_usage_count, add_files_mtime, add_library_version]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate_database(db):
+    """
+    Brings the database to SCHEMA_VERSION. Each migration runs in its own transaction.
+    A new database gets the current version, its tables are created by the models
+    """
+    version = db.execute_sql("PRAGMA user_version").fetchone()[0]
+    if not db.table_exists("asset"):
+        db.execute_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with db.atomic():
+            migration(db)
+            db.execute_sql(f"PRAGMA user_version = {number}")
+        logger.info(f"Database migrated to version {number}: {migration.__name__}")
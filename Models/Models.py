@@ -1,16 +1,30 @@
 # -*- coding: utf-8 -*-
 import os
-from settings import COMPLEX_SEARCH_SIGNS
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from settings import LOCAL_REPLICA
 from peewee import *
+from playhouse.sqlite_ext import FTS5Model, SearchField
+from Models.Migrations import migrate_database, create_triggers, content_version, SCHEMA_VERSION
+from Models.QueryParser import parse_query, query_tags
+from Models.LibraryIndex import IndexResultSet, load_index, read_content_version, write_index
+from Models.Replica import ReplicatedSqliteDatabase
+from Models.ResultSet import AssetResultSet, MergedResultSet
+from Models.SimilarityIndex import SimilarityIndex
+from Models.TagIndex import TagIndex
 from Utilities.Logging import logger
-from Utilities.Utilities import get_library_path
 
 """
 The module Models.py defines the structure of the database and contains 
 functions for finding assets by tags and getting a tag cloud
 """
 
-data_base = SqliteDatabase(None)
+data_base = ReplicatedSqliteDatabase(None)
+REPLICA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'asset_browser_cache')
+
+SQLITE_MAX_VARIABLES = 900  # the default limit of old SQLite builds is 999
 
 
 class BaseModel(Model):
@@ -21,26 +35,155 @@ class BaseModel(Model):
 
 
 class Asset(BaseModel):
-    name = CharField()
+    name = CharField(index=True)
     path = CharField()
     icon = TextField()
+    folder = CharField(index=True, default="")  # parent folder of the asset with "/" at the end
+    missing = BooleanField(default=False)  # the folder of the asset was not found by the last sync
+    # size of info/icon.png, the gallery lays out the cards without reading the images
+    icon_width = IntegerField(default=0)
+    icon_height = IntegerField(default=0)
+    has_icon = BooleanField(null=True)  # None until the icon is measured
+    description = TextField(default="")
+    details_stored = BooleanField(default=False)  # the files of the asset are listed in asset_file
+    files_mtime = FloatField(null=True)  # time of the newer of the content and gallery folders when listed
+
 
 class Tag(BaseModel):
+    name = CharField(unique=True)
+    usage_count = IntegerField(default=0, index=True)  # number of assets with the tag, kept by triggers
+
+
+class AssetTag(BaseModel):
+    """
+    Links assets with their tags
+    """
+    asset_id = ForeignKeyField(Asset, on_delete="CASCADE", index=False)  # covered by the unique index
+    tag_id = ForeignKeyField(Tag)
+
+    class Meta:
+        table_name = "asset_tag"
+        indexes = ((("asset_id", "tag_id"), True),)
+
+
+class AssetFile(BaseModel):
+    """
+    Files of the content and gallery folders of assets, the asset overview is shown without listing the folders
+    """
+    asset_id = ForeignKeyField(Asset, on_delete="CASCADE", index=False)  # covered by the unique index
+    kind = CharField()  # CONTENT_FOLDER or GALLERY_FOLDER
     name = CharField()
-    asset_id = ForeignKeyField(Asset)
+    size = IntegerField()
+    mtime = FloatField()
+
+    class Meta:
+        table_name = "asset_file"
+        indexes = ((("asset_id", "kind", "name"), True),)
+
+
+class FolderState(BaseModel):
+    """
+    Modification times of the library folders at the last sync, a folder is scanned again only if it changes
+    """
+    path = CharField(unique=True)  # with "/" at the end like Asset.folder
+    mtime = FloatField()
+
+    class Meta:
+        table_name = "folder_state"
+
+
+class AssetSearch(FTS5Model):
+    """
+    Full-text index of asset names, tags and descriptions. rowid is the asset id
+    """
+    name = SearchField()
+    tags = SearchField()
+    description = SearchField()
+
+    class Meta:
+        database = data_base
+        table_name = "asset_search"
+        options = {"prefix": [2, 3], "tokenize": "unicode61"}  # prefix indexes for partial words
+
+
+# False if the SQLite library is built without FTS5, full-text search is disabled then
+full_text_search = False
+
+# all tags of the library with usage counts for autocomplete
+tag_index = TagIndex()
+
+# tag sets of all assets for finding similar assets, loaded when they are first needed
+similarity_index = SimilarityIndex()
+
+# databases of other libraries opened for searching and export, {library path: database}
+libraries = {}
+# database files of other libraries already migrated for writing
+prepared_libraries = set()
+# threads searching several libraries at once, they keep their connections between searches
+library_pool = ThreadPoolExecutor(max_workers=4)
+
+# index file searched instead of the database by clients of CLIENT_MODE, None if the database is searched
+library_index = None
+
+# incremented on every change of the data, cached search results of older generations are invalid
+generation = 0
+
+
+def data_changed():
+    global generation
+    generation += 1
 
 
-def initialize(lib_path):
+def data_version():
+    """
+    Version of the data for cached search results. Without the local copy the changes of other users
+    are not seen by generation, the modification time and size of the library database are added then
+    """
+    if library_index is not None or data_base.replica_path or data_base.deferred:
+        # a new index file or a new copy of the database increments generation
+        return generation
+    try:
+        stat = os.stat(data_base.database)
+        return generation, stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return generation, None, None
+
+
+def initialize(lib_path, replica=LOCAL_REPLICA, use_index=False):
+    """
+    Opens the database of the library. With use_index the index file of the library is searched instead
+    if it is up to date, the database is not opened then
+    """
+    global library_index, library_pool
     from settings import DATABASE_NAME
     if not lib_path:
         logger.error("Database path required for initialization")
         return False
     else:
         db_path = lib_path + "/" + DATABASE_NAME
+        library_index = open_library_index(lib_path) if use_index else None
+        similarity_index.clear()
+        # the threads of the pool keep their connections to the previous library, new threads connect to this one
+        library_pool.shutdown(wait=False)
+        library_pool = ThreadPoolExecutor(max_workers=4)
+        if library_index is not None:
+            data_base.init(None)
+            build_tag_index()
+            data_changed()
+            logger.debug("Index " + library_index.source + " loaded successfully!")
+            return True
         try:
             data_base.init(db_path)
             data_base.connect()
-            data_base.create_tables([Asset, Tag])
+            # migrate old tables before create_tables builds indexes on the new columns
+            migrate_database(data_base)
+            data_base.create_tables([Asset, Tag, AssetTag, AssetFile, FolderState])
+            create_triggers(data_base)
+            initialize_search_index()
+            build_tag_index()
+            data_changed()
+            if replica:
+                data_base.start_replica(REPLICA_CACHE_DIR)
             logger.debug("Database " + db_path + "  initialized successfully!")
             return True
         except Exception as message:
@@ -48,13 +191,210 @@ def initialize(lib_path):
             return False
 
 
+def atomic(lock_type=None):
+    """
+    Transaction for several Models calls, nested calls become savepoints
+    """
+    return data_base.atomic(lock_type=lock_type)
+
+
+def refresh_replica():
+    """
+    Updates the local copy of the database if the library database has changed,
+    or loads the index file of the library if a new one is published
+    """
+    if library_index is not None:
+        return refresh_library_index()
+    if data_base.refresh_replica():
+        # tags could be changed by other users
+        build_tag_index()
+        similarity_index.clear()
+        data_changed()
+        return True
+    return False
+
+
+def replica_status():
+    """
+    Returns the state of the local copy for the status bar: (text, is_stale)
+    """
+    if library_index is not None:
+        return "Library index " + time.strftime("%H:%M:%S", time.localtime(library_index.database_mtime)), False
+    if not data_base.replica_path:
+        return "", False
+    if data_base.stale or not data_base.synced_at:
+        return "Local database copy is out of date", True
+    return "Local database copy " + data_base.synced_at.strftime("%H:%M:%S"), False
+
+
+def build_tag_index():
+    """
+    Loads all used tags with their usage counts into the autocomplete index
+    """
+    try:
+        if library_index is not None:
+            tag_index.build(library_index.tag_usage())
+            return
+        query = Tag.select(Tag.name, Tag.usage_count).where(Tag.usage_count > 0)
+        tag_index.build(query.tuples())
+    except Exception as message:
+        logger.error(message)
+
+
+def get_popular_tags(limit=50):
+    """
+    The most used tags of the library with their usage counts, read from the index of the counters
+    """
+    try:
+        if library_index is not None:
+            return library_index.popular_tags(limit)
+        query = (Tag
+                 .select(Tag.name, Tag.usage_count)
+                 .where(Tag.usage_count > 0)
+                 .order_by(Tag.usage_count.desc(), Tag.name)
+                 .limit(limit))
+        return list(query.tuples())
+    except Exception as message:
+        logger.error(message)
+        return []
+
+
+def complete_tags(prefix, limit=10):
+    """
+    The most used tags starting with the prefix
+    """
+    return tag_index.complete(prefix.lower(), limit)
+
+
+def similar_tags(word, limit=5):
+    """
+    Existing tags similar to the mistyped word
+    """
+    return tag_index.similar(word.lower(), limit)
+
+
+def unknown_tags(tags):
+    """
+    Tags of the list that no asset has
+    """
+    return [x for x in tags if x not in tag_index]
+
+
+def initialize_search_index():
+    """
+    Creates the full-text index and adds assets that are not indexed yet,
+    for example written by older versions of the program
+    """
+    global full_text_search
+    full_text_search = AssetSearch.fts5_installed()
+    if not full_text_search:
+        logger.error("SQLite is built without FTS5, full-text search is disabled")
+        return
+    data_base.create_tables([AssetSearch])
+    with data_base.atomic():
+        AssetSearch.delete().where(AssetSearch.rowid.not_in(Asset.select(Asset.id))).execute()
+        tags = (Tag
+                .select(fn.GROUP_CONCAT(Tag.name, " "))
+                .join(AssetTag)
+                .where(AssetTag.asset_id == Asset.id))
+        missing = (Asset
+                   .select(Asset.id, Asset.name, fn.COALESCE(tags, ""), Value(""))
+                   .where(Asset.id.not_in(AssetSearch.select(AssetSearch.rowid))))
+        AssetSearch.insert_from(missing, [AssetSearch.rowid, AssetSearch.name, AssetSearch.tags,
+                                          AssetSearch.description]).execute()
+
+
+def update_search_index(asset_id, description=None):
+    """
+    Writes the current name and tags of the asset to the full-text index.
+    If description is None the indexed description is kept
+    """
+    if not full_text_search:
+        return
+    if description is None:
+        description = (AssetSearch
+                       .select(AssetSearch.description)
+                       .where(AssetSearch.rowid == asset_id)
+                       .scalar()) or ""
+    name = Asset.select(Asset.name).where(Asset.id == asset_id).scalar()
+    tags = get_asset_tags(asset_id)
+    AssetSearch.delete().where(AssetSearch.rowid == asset_id).execute()
+    if name is not None:
+        AssetSearch.insert({AssetSearch.rowid: asset_id,
+                            AssetSearch.name: name,
+                            AssetSearch.tags: " ".join(tags),
+                            AssetSearch.description: description}).execute()
+
+
+def result_set(query):
+    """
+    Selects only the ids of the query, the assets are loaded by AssetResultSet when needed
+    """
+    return AssetResultSet(Asset, [x for x, in query.select(Asset.id).tuples()])
+
+
+def search_assets(text):
+    """
+    Full-text search by the words of the text in asset names, tags and descriptions.
+    Every word matches as a prefix, results are ranked by BM25 with names weighted highest
+    """
+    out = AssetResultSet(Asset, [])
+    try:
+        if library_index is not None:
+            return library_index.text_search(text)
+        query = text_search_query(text)
+        if full_text_search and query is not None:
+            out = result_set(query)
+    except Exception as message:
+        logger.error(message)
+    return out
+
+
+def text_search_query(text):
+    """
+    Select query of the full-text search, None if there are no words in the text
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    match = " ".join(['"' + x + '"*' for x in words])
+    rank = AssetSearch.bm25(10.0, 5.0, 1.0)
+    return (Asset
+            .select()
+            .join(AssetSearch, on=(AssetSearch.rowid == Asset.id))
+            .where(AssetSearch.match(match))
+            .order_by(rank))
+
+
+def folder_of(path):
+    """
+    Returns the parent folder of the asset path with "/" at the end
+    """
+    return os.path.dirname(path.replace("\\", "/").rstrip("/")) + "/"
+
+
+def folder_condition(path, model=None):
+    """
+    Condition selecting the assets inside the folder and its subfolders as an index range scan
+    """
+    model = model or Asset
+    path = path.replace("\\", "/")
+    path = path if path.endswith("/") else path + "/"
+    # "0" is the character following "/", so the range contains exactly the paths starting with path
+    return (model.folder >= path) & (model.folder < path[:-1] + "0")
+
+
 def add_asset_to_db(**kwargs):
     tags = kwargs.pop('tags')
     kwargs['icon'] = ""
+    kwargs['folder'] = folder_of(kwargs['path'])
+    kwargs['description'] = kwargs.get('description') or ""
     try:
-        db_asset = Asset.create(**kwargs)
-        for tag in tags:
-            Tag.create(name=tag, asset_id=db_asset)
+        with data_base.atomic():
+            db_asset = Asset.create(**kwargs)
+            set_asset_tags(db_asset.id, tags)
+            update_search_index(db_asset.id, kwargs.get("description") or "")
+        data_changed()
         logger.debug("Asset added to database")
         return db_asset.id
     except Exception as message:
@@ -62,57 +402,474 @@ def add_asset_to_db(**kwargs):
         return False
 
 
-def find_assets_by_tag_list(tag_list):
+def set_asset_tags(asset_id, tags):
+    """
+    Replaces the tags of the asset, new tag names are added to the tag table.
+    Runs a fixed number of statements in one transaction whatever the number of tags
+    """
+    with data_base.atomic():
+        old_tags = get_asset_tags(asset_id)
+        AssetTag.delete().where(AssetTag.asset_id == asset_id).execute()
+        for names in chunked(list(dict.fromkeys(tags)), SQLITE_MAX_VARIABLES):
+            Tag.insert_many([{"name": x} for x in names]).on_conflict_ignore().execute()
+            links = Tag.select(Value(asset_id), Tag.id).where(Tag.name.in_(names))
+            AssetTag.insert_from(links, [AssetTag.asset_id, AssetTag.tag_id]).on_conflict_ignore().execute()
+    tag_index.remove(old_tags)
+    tag_index.add(dict.fromkeys(tags))
+    similarity_index.set_tags(asset_id, tags)
+    data_changed()
+
+
+def get_asset_tags(asset_id):
+    return [x.name for x in Tag.select(Tag.name).join(AssetTag).where(AssetTag.asset_id == asset_id)]
+
+
+def set_asset_details(asset_id, description, files, files_mtime=None):
+    """
+    Stores the description and the files of the asset, files - (kind, name, size, mtime) of all its files,
+    files_mtime - time of the folders of the files before they were listed.
+    Searches do not use the files, cached search results stay valid
+    """
+    if library_index is not None:
+        # clients do not write to the library
+        return False
+    try:
+        # the snapshot of the database gets the details too, they do not cause a new copy
+        with data_base.mirrored_atomic():
+            (Asset
+             .update(description=description or "", details_stored=True, files_mtime=files_mtime)
+             .where(Asset.id == asset_id)
+             .execute())
+            AssetFile.delete().where(AssetFile.asset_id == asset_id).execute()
+            rows = [{"asset_id": asset_id, "kind": kind, "name": name, "size": size, "mtime": mtime}
+                    for kind, name, size, mtime in files]
+            for chunk in chunked(rows, SQLITE_MAX_VARIABLES // 5):
+                AssetFile.insert_many(chunk).execute()
+        return True
+    except Exception as message:
+        logger.error(message)
+        return False
+
+
+def get_asset_details(asset_id):
+    """
+    Name, path, description, tags and {kind: [file names]} of the asset,
+    None if its files have not been stored yet
+    """
+    try:
+        if library_index is not None:
+            number = library_index.number_of(asset_id)
+            return library_index.details(number) if number is not None else None
+        db_asset = Asset.get_or_none((Asset.id == asset_id) & Asset.details_stored)
+        if db_asset is None:
+            return None
+        files = {}
+        query = AssetFile.select(AssetFile.kind, AssetFile.name).where(AssetFile.asset_id == asset_id)
+        for kind, name in query.order_by(AssetFile.kind, AssetFile.name).tuples():
+            files.setdefault(kind, []).append(name)
+        return {"asset_id": db_asset.id, "name": db_asset.name, "path": db_asset.path,
+                "description": db_asset.description, "tags": get_asset_tags(asset_id),
+                "has_icon": db_asset.has_icon, "files": files, "files_mtime": db_asset.files_mtime}
+    except Exception as message:
+        logger.error(message)
+        return None
+
+
+def compile_query(node):
+    """
+    Compiles the expression tree of QueryParser into a WHERE condition on Asset.
+    Every tag is an indexed subquery of asset ids, the set operations are done by SQLite
+    """
+    kind = node[0]
+    if kind == "tag":
+        return Asset.id.in_(AssetTag.select(AssetTag.asset_id).join(Tag).where(Tag.name == node[1]))
+    if kind == "not":
+        return ~compile_query(node[1])
+    if kind == "and":
+        return compile_query(node[1]) & compile_query(node[2])
+    return compile_query(node[1]) | compile_query(node[2])
+
+
+def expand_unknown_tags(node, limit=3):
+    """
+    Replaces tags no asset has with any of the similar existing tags
+    """
+    kind = node[0]
+    if kind == "tag":
+        if node[1] in tag_index:
+            return node
+        expanded = None
+        for name in similar_tags(node[1], limit):
+            expanded = ("tag", name) if expanded is None else ("or", expanded, ("tag", name))
+        return expanded or node
+    return (kind,) + tuple(expand_unknown_tags(x, limit) for x in node[1:])
+
+
+def search_node(text, fuzzy=False):
+    """
+    Expression tree of the boolean search text, None if there are no tags in it.
+    In the fuzzy mode mistyped tags match similar tags.
+    Raises QuerySyntaxError for a wrong search text
+    """
+    node = parse_query(text)
+    if node is not None and fuzzy:
+        node = expand_unknown_tags(node)
+    return node
+
+
+def search_query(text, fuzzy=False):
+    """
+    Select query of assets matching the boolean search text, None if there are no tags in it
+    """
+    node = search_node(text, fuzzy)
+    if node is None:
+        return None
+    return Asset.select().where(compile_query(node)).order_by(Asset.id)
+
+
+def find_assets_by_query(text, fuzzy=False):
+    out = AssetResultSet(Asset, [])
+    try:
+        if library_index is not None:
+            node = search_node(text, fuzzy)
+            return library_index.find(node) if node is not None else out
+        query = search_query(text, fuzzy)
+        if query is not None:
+            logger.debug("Set quest to db : " + str(query.sql()))
+            out = result_set(query)
+    except Exception as message:
+        logger.error(message)
+    return out
+
+
+def find_tags_by_query(text, fuzzy=False):
+    """
+    Tag facets for the result of find_assets_by_query
+    """
+    try:
+        if library_index is not None:
+            node = search_node(text, fuzzy)
+            return library_index.facets(library_index.evaluate(node)) if node is not None else []
+        query = search_query(text, fuzzy)
+    except Exception as message:
+        logger.error(message)
+        return []
+    return get_tag_facets(query) if query is not None else []
+
+
+def get_tag_facets(asset_query, database=None):
+    """
+    Returns all tags of the assets selected by the query with the number of assets
+    for each tag, most frequent first, the most used in the library first among equal ones.
+    Computed by one aggregate query
+    in the database of the library or in data_base if database is None
+    """
     out = []
     try:
-        has_and_attr = any([x in tag_list for x in COMPLEX_SEARCH_SIGNS])
-        # if the asset you are looking for must include all tags
-        if has_and_attr:
-            tag_list = [x for x in tag_list if x not in COMPLEX_SEARCH_SIGNS]
-            res_set = set()
-            for i, tag in enumerate(tag_list):
-                quest_rez = Tag.select().where(Tag.name == tag)
-                if not i:
-                    res_set = set([x.asset_id for x in quest_rez])
-                else:
-                    res_set = res_set & set([x.asset_id for x in quest_rez])
-            out = list(res_set)
-        else:
-            # if the asset you are looking for must include one of the tags
-            tag_quest_string = ['(Tag.name == "' + x + '")' for x in tag_list]
-            tag_quest_string = " | ".join(tag_quest_string)
-            quest = 'Tag.select().where(' + tag_quest_string + ')'
-            assets_id = eval(quest)
-            logger.debug("Set quest to db : " + quest)
-            for id in assets_id:
-                asset = Asset.get(Asset.id == id.asset_id)
-                if asset not in out:
-                    out.append(asset)
+        asset_ids = asset_query.select(Asset.id)
+        count = fn.COUNT(AssetTag.id)
+        query = (Tag
+                 .select(Tag.name, count.alias("count"))
+                 .join(AssetTag)
+                 .where(AssetTag.asset_id.in_(asset_ids))
+                 .group_by(Tag.id)
+                 .order_by(count.desc(), Tag.usage_count.desc(), Tag.name))
+        if database is not None:
+            query = query.bind(database)
+        out = [(name, count) for name, count in query.tuples()]
     except Exception as message:
         logger.error(message)
     return out
 
 
 def find_tags_by_asset_list(asset_list):
-    out = []
-    # limiting the number of assets for the normal operation of the recursive tag search
-    asset_list = asset_list[:20] if len(asset_list) > 20 else asset_list
+    """
+    Tag facets for an already found list of assets.
+    Asset ids are sent in chunks so as not to exceed the SQLite variables limit
+    """
+    counts = {}
+    try:
+        if library_index is not None:
+            if isinstance(asset_list, IndexResultSet):
+                return library_index.facets(asset_list.numbers)
+            numbers = [library_index.number_of(x.id) for x in asset_list]
+            return library_index.facets([x for x in numbers if x is not None])
+        # a result set knows the ids without reading the assets
+        asset_ids = asset_list.ids if isinstance(asset_list, AssetResultSet) else [x.id for x in asset_list]
+        for ids in chunked(asset_ids, SQLITE_MAX_VARIABLES):
+            for name, count in get_tag_facets(Asset.select().where(Asset.id.in_(ids))):
+                counts[name] = counts.get(name, 0) + count
+    except Exception as message:
+        logger.error(message)
+    return sort_facets(counts)
+
+
+def sort_facets(counts):
+    """
+    Facets summed over several queries in the order of get_tag_facets,
+    library usage is taken from the tag index of the current library
+    """
+    return sorted(counts.items(), key=lambda x: (-x[1], -tag_index.counts.get(x[0], 0), x[0]))
+
+
+def build_similarity_index():
+    """
+    Loads the tags of all assets into the similarity index
+    """
+    if library_index is not None:
+        # the index file has the tags of the assets
+        return
+    try:
+        query = AssetTag.select(AssetTag.asset_id, Tag.name).join(Tag)
+        # the rows are read without the conversions of peewee, several times faster for a large library
+        similarity_index.build(data_base.execute_sql(*query.sql()))
+    except Exception as message:
+        logger.error(message)
+
+
+def similarity_index_ready():
+    """
+    True if get_similar_assets can answer, otherwise build_similarity_index must run first
+    """
+    return library_index is not None or similarity_index.built
+
 
-    tag_quest_string = ['(Tag.asset_id == "' + str(x.id) + '")' for x in asset_list]
-    tag_quest_string = " | ".join(tag_quest_string)
-    quest = 'Tag.select().where(' + tag_quest_string + ')'
+def get_similar_assets(asset_id, limit=10, with_asset=False):
+    """
+    Assets with tags most similar to the tags of the asset, the most similar first.
+    Returns (result set, similarity of every asset from 0 to 1), with with_asset the asset itself comes first.
+    Nothing is similar until the similarity index is built
+    """
     try:
-        tags = eval(quest)
-        for tag in tags:
-            if tag.name not in out:
-                out.append(tag.name)
+        if library_index is not None:
+            number = library_index.number_of(asset_id)
+            similar = library_index.similar(number, limit) if number is not None else []
+            numbers = [x for x, score in similar]
+            scores = [score for x, score in similar]
+            if with_asset and number is not None:
+                numbers, scores = [number] + numbers, [1.0] + scores
+            return library_index.result(numbers), scores
+        similar = similarity_index.similar(asset_id, limit)
+        ids = [x for x, score in similar]
+        scores = [score for x, score in similar]
+        if with_asset:
+            ids, scores = [asset_id] + ids, [1.0] + scores
+        return AssetResultSet(Asset, ids), scores
     except Exception as message:
         logger.error(message)
+        return AssetResultSet(Asset, []), []
+
+
+def get_folder_states():
+    """
+    {folder: modification time} of the folders scanned by the last sync
+    """
+    return dict(FolderState.select(FolderState.path, FolderState.mtime).tuples())
+
+
+def get_assets_in_folders(folders):
+    """
+    Assets directly inside the folders as (id, name, path, missing) tuples
+    """
+    out = []
+    for chunk in chunked(list(folders), SQLITE_MAX_VARIABLES):
+        query = Asset.select(Asset.id, Asset.name, Asset.path, Asset.missing).where(Asset.folder.in_(chunk))
+        out += list(query.tuples())
     return out
 
 
+def get_existing_names(names):
+    """
+    The names of the list that are taken by assets, found by the index of the asset name
+    """
+    out = set()
+    for chunk in chunked(list(names), SQLITE_MAX_VARIABLES):
+        out.update(x for x, in Asset.select(Asset.name).where(Asset.name.in_(chunk)).tuples())
+    return out
+
+
+def get_missing_assets(names):
+    """
+    {name: (id, path)} of the assets with the names that are flagged as missing
+    """
+    out = {}
+    for chunk in chunked(list(names), SQLITE_MAX_VARIABLES):
+        query = Asset.select(Asset.name, Asset.id, Asset.path).where(Asset.name.in_(chunk) & Asset.missing)
+        out.update((name, (asset_id, path)) for name, asset_id, path in query.tuples())
+    return out
+
+
+def apply_sync(added, moved, missing, found, folder_states, removed_folders):
+    """
+    Writes the changes found by the sync in one transaction:
+    added - data of new assets for add_asset_to_db, moved - (asset id, new path),
+    missing and found - ids of assets to flag and unflag, folder_states - {folder: mtime} of scanned folders,
+    removed_folders - folders that no longer exist
+    """
+    try:
+        with data_base.atomic():
+            for data in added:
+                add_asset_to_db(**data)
+            for asset_id, path in moved:
+                Asset.update(path=path, folder=folder_of(path), missing=False).where(Asset.id == asset_id).execute()
+            for ids, flag in ((missing, True), (found, False)):
+                for chunk in chunked(list(ids), SQLITE_MAX_VARIABLES):
+                    Asset.update(missing=flag).where(Asset.id.in_(chunk)).execute()
+            for chunk in chunked(list(removed_folders), SQLITE_MAX_VARIABLES):
+                FolderState.delete().where(FolderState.path.in_(chunk)).execute()
+            rows = [{"path": path, "mtime": mtime} for path, mtime in folder_states.items()]
+            for chunk in chunked(rows, SQLITE_MAX_VARIABLES // 2):
+                FolderState.insert_many(chunk).on_conflict_replace().execute()
+        if added or moved or missing or found:
+            data_changed()
+        return True
+    except Exception as message:
+        logger.error(message)
+        return False
+
+
+def get_unmeasured_icons(limit=500):
+    """
+    (id, path) of assets whose icon size is not known yet
+    """
+    if library_index is not None:
+        # the index file is read only, the icons are measured by the side writing the database
+        return []
+    try:
+        query = Asset.select(Asset.id, Asset.path).where(Asset.has_icon.is_null() & ~Asset.missing).limit(limit)
+        return list(query.tuples())
+    except Exception as message:
+        logger.error(message)
+        return []
+
+
+def set_icon_sizes(sizes):
+    """
+    Writes (asset id, width, height) of asset icons in one transaction, width 0 means the asset has no icon.
+    Sizes that are stored already are skipped
+    """
+    try:
+        changed = 0
+        # the snapshot of the database gets the sizes too, they do not cause a new copy
+        with data_base.mirrored_atomic():
+            for asset_id, width, height in sizes:
+                changed += (Asset
+                            .update(icon_width=width, icon_height=height, has_icon=bool(width and height))
+                            .where((Asset.id == asset_id) &
+                                   (Asset.has_icon.is_null() | (Asset.icon_width != width) |
+                                    (Asset.icon_height != height)))
+                            .execute())
+        if changed:
+            data_changed()
+        return True
+    except Exception as message:
+        logger.error(message)
+        return False
+
+
+def library_database(lib_path):
+    """
+    Database of another library, opened once and kept for the next calls
+    """
+    from settings import DATABASE_NAME
+    lib_path = os.path.normpath(lib_path)
+    if lib_path not in libraries:
+        libraries[lib_path] = SqliteDatabase(os.path.join(lib_path, DATABASE_NAME), timeout=10)
+    return libraries[lib_path]
+
+
+def library_versions(lib_paths):
+    """
+    Modification times of the library databases, they change with every write to the library
+    """
+    from settings import DATABASE_NAME
+    versions = []
+    for lib_path in lib_paths:
+        try:
+            versions.append(os.path.getmtime(os.path.join(lib_path, DATABASE_NAME)))
+        except OSError:
+            versions.append(None)
+    return tuple(versions)
+
+
+def search_library(text, lib_path=None, fuzzy=False):
+    """
+    Boolean search with the full-text fallback in one library, the current one if lib_path is None.
+    Returns (assets, tag facets)
+    """
+    if lib_path is None and library_index is not None:
+        return search_index(text, fuzzy)
+    database = data_base if lib_path is None else library_database(lib_path)
+    empty = AssetResultSet(Asset, [], database=database, library=lib_path), []
+    try:
+        if lib_path is not None:
+            if not os.path.exists(database.database):
+                logger.error(f"Library database {database.database} not found")
+                return empty
+            version = database.execute_sql("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                logger.error(f"Library database {database.database} has an old version, open it to migrate")
+                return empty
+        # the tag index knows only the tags of the current library
+        query = search_query(text, fuzzy and lib_path is None)
+        if query is None:
+            return empty
+        ids = [x for x, in query.select(Asset.id).bind(database).tuples()]
+        if not ids and database.table_exists(AssetSearch._meta.table_name):
+            # no exact tags, search for partial words in names, tags and descriptions
+            query = text_search_query(" ".join(query_tags(parse_query(text))))
+            if query is not None:
+                ids = [x for x, in query.select(Asset.id).bind(database).tuples()]
+        if not ids:
+            return empty
+        return AssetResultSet(Asset, ids, database=database, library=lib_path), get_tag_facets(query, database)
+    except Exception as message:
+        logger.error(message)
+        return empty
+
+
+def search_index(text, fuzzy=False):
+    """
+    search_library in the index file of the current library
+    """
+    empty = library_index.result([]), []
+    try:
+        node = search_node(text, fuzzy)
+        if node is None:
+            return empty
+        assets = library_index.find(node)
+        if not assets:
+            assets = library_index.text_search(" ".join(query_tags(parse_query(text))))
+        if not assets:
+            return empty
+        return assets, library_index.facets(assets.numbers)
+    except Exception as message:
+        logger.error(message)
+        return empty
+
+
+def search_libraries(text, lib_paths, fuzzy=False):
+    """
+    Searches the current library and the other libraries at the same time.
+    Assets of the current library come first, tag facets are summed over all libraries
+    """
+    results = list(library_pool.map(lambda x: search_library(text, x, fuzzy), [None] + list(lib_paths)))
+    counts = {}
+    for assets, facets in results:
+        for name, count in facets:
+            counts[name] = counts.get(name, 0) + count
+    tags = sort_facets(counts)
+    return MergedResultSet([assets for assets, facets in results]), tags
+
+
 def find_asset(id=None, name=None, path=None):
     try:
+        if library_index is not None:
+            number = library_index.find_asset(id, name, path)
+            if number is None:
+                return None
+            asset = library_index.asset(number)
+            return asset.id, asset.name, asset.path
         asset = None
         if id:
             asset = Asset.select().where(Asset.id == id).get()
@@ -131,10 +888,15 @@ def find_asset(id=None, name=None, path=None):
 
 def delete_asset(asset_name):
     try:
-        asset_obj = Asset.get(Asset.name == asset_name)
-        for tag in Tag.select().where(Tag.asset_id == asset_obj):
-            tag.delete_instance()
-        asset_obj.delete_instance()
+        with data_base.atomic():
+            asset_obj = Asset.get(Asset.name == asset_name)
+            tag_index.remove(get_asset_tags(asset_obj.id))
+            AssetTag.delete().where(AssetTag.asset_id == asset_obj.id).execute()
+            AssetFile.delete().where(AssetFile.asset_id == asset_obj.id).execute()
+            asset_obj.delete_instance()
+            update_search_index(asset_obj.id)
+        similarity_index.remove(asset_obj.id)
+        data_changed()
         logger.error("Deleted asset " + asset_obj.name)
         return True
     except Exception as message:
@@ -144,20 +906,23 @@ def delete_asset(asset_name):
 
 def edit_db_asset(**kwargs):
     try:
-        asset_obj = Asset.get(Asset.id == kwargs["asset_id"])
-        # edit tags
-        if kwargs.setdefault("tags", None):
-            for tag in Tag.select().where(Tag.asset_id == asset_obj):
-                tag.delete_instance()
-            for tag in kwargs["tags"]:
-                Tag.create(name=tag, asset_id=asset_obj)
-        # edit name
-        if kwargs.setdefault("name", None):
-            asset_obj.name = kwargs["name"]
-        # edit path
-        if kwargs.setdefault("path", None):
-            asset_obj.path = kwargs["path"]
-        asset_obj.save()
+        with data_base.atomic():
+            asset_obj = Asset.get(Asset.id == kwargs["asset_id"])
+            # edit tags
+            if kwargs.setdefault("tags", None):
+                set_asset_tags(asset_obj.id, kwargs["tags"])
+            # edit name
+            if kwargs.setdefault("name", None):
+                asset_obj.name = kwargs["name"]
+            # edit path
+            if kwargs.setdefault("path", None):
+                asset_obj.path = kwargs["path"]
+                asset_obj.folder = folder_of(kwargs["path"])
+            if kwargs.get("description") is not None:
+                asset_obj.description = kwargs["description"]
+            asset_obj.save()
+            update_search_index(asset_obj.id, kwargs.get("description"))
+        data_changed()
         logger.debug(" executed")
 
     except Exception as message:
@@ -166,14 +931,20 @@ def edit_db_asset(**kwargs):
 
 
 def rename_directory(old_path, new_path, old_name, new_name):
+    """
+    Changes the paths of all assets inside the folder with a single UPDATE
+    """
     try:
-        renamed_paths = []
-        for asset_obj in Asset.select():
-            if old_path in asset_obj.path:
-                path = asset_obj.path.replace(old_path, new_path)
-                asset_obj.path = path
-                asset_obj.save()
-                renamed_paths.append(path)
+        old_path = old_path if old_path.endswith("/") else old_path + "/"
+        new_path = new_path if new_path.endswith("/") else new_path + "/"
+        with data_base.atomic():
+            (Asset
+             .update(path=Value(new_path).concat(fn.SUBSTR(Asset.path, len(old_path) + 1)),
+                     folder=Value(new_path).concat(fn.SUBSTR(Asset.folder, len(old_path) + 1)))
+             .where(folder_condition(old_path))
+             .execute())
+        data_changed()
+        renamed_paths = [x.path for x in Asset.select(Asset.path).where(folder_condition(new_path))]
 
         logger.debug("Path " + old_path + " renamed to " + new_path)
         return renamed_paths
@@ -182,71 +953,276 @@ def rename_directory(old_path, new_path, old_name, new_name):
         return False
 
 
+def folder_query(path):
+    """
+    Query of all assets inside the folder and its subfolders
+    """
+    return Asset.select().where(folder_condition(path)).order_by(Asset.id)
+
+
 def get_all_from_folder(path):
     try:
-        out = []
-        for asset_obj in Asset.select():
-            if path in asset_obj.path:
-                out.append(asset_obj)
+        if library_index is not None:
+            return library_index.in_folder(path)
+        out = result_set(folder_query(path))
         logger.debug(out)
         return out
     except Exception as message:
         logger.error(message)
         return False
 
-def add_asset_to_other_db(data, db_path):
-    data_base_new = SqliteDatabase(db_path)
 
-    class BaseModel_new(Model):
-        id = PrimaryKeyField(unique=True)
+def find_tags_by_folder(path):
+    """
+    Tag facets for the result of get_all_from_folder
+    """
+    if library_index is not None:
+        return library_index.facets(library_index.in_folder(path).numbers)
+    return get_tag_facets(folder_query(path))
+
 
-        class Meta:
-            database = data_base_new  # model will use the database 'assets.db'
+def get_folder_tree():
+    """
+    Folders of the library from its index file, None if the library is searched in the database
+    """
+    return library_index.folder_tree() if library_index is not None else None
 
-    class Asset(BaseModel_new):
-        name = CharField()
-        path = CharField()
-        icon = TextField()
 
-    class Tag(BaseModel_new):
-        name = CharField()
-        asset_id = ForeignKeyField(Asset)
+def open_library_index(lib_path):
+    """
+    Index file of the library mapped into memory,
+    None if there is no index or the data of the database has changed since the index was written
+    """
+    from settings import DATABASE_NAME, INDEX_NAME
+    index_path = os.path.join(lib_path, INDEX_NAME)
+    if not os.path.exists(index_path):
+        logger.debug("No index file in " + lib_path + ", the database is searched")
+        return None
+    try:
+        index = load_index(index_path, REPLICA_CACHE_DIR)
+        db_path = os.path.join(lib_path, DATABASE_NAME)
+        if os.path.exists(db_path):
+            database = SqliteDatabase(db_path, timeout=10)
+            try:
+                version = content_version(database)
+            finally:
+                database.close()
+            # writes that do not change the data, like migrations, keep the index valid
+            if version is not None and version != index.content_version:
+                logger.error("The index file of " + lib_path + " is older than the database, the database is searched")
+                return None
+        return index
+    except Exception as message:
+        logger.error(message)
+        return None
 
-    Asset.create_table()
-    Tag.create_table()
 
-    tags = data['tags']
-    data['icon'] = ""
+def refresh_library_index():
+    """
+    Loads the index file if a new version is published, searches that have started keep the old one
+    """
+    global library_index
     try:
-        if data['name'] in [x.name for x in Asset.select()]:
-            logger.error(f'Asset named {data["name"]} already exists in the database and cannot be added.')
+        if os.stat(library_index.source).st_mtime_ns == library_index.version:
             return False
+    except OSError:
+        return False
+    index = open_library_index(os.path.dirname(library_index.source))
+    if index is None:
+        return False
+    library_index = index
+    build_tag_index()
+    data_changed()
+    return True
 
-        db_asset = Asset.create(**data)
-        for tag in tags:
-            Tag.create(name=tag, asset_id=db_asset)
 
-        return db_asset.id
+def write_library_index(lib_path=None):
+    """
+    Writes the index file of the library for the clients, of the current library if lib_path is None.
+    Returns the path of the file or False
+    """
+    from settings import INDEX_NAME
+    try:
+        database = data_base if lib_path is None else prepare_library(lib_path)
+        root = folder_of(database.database)
+        database_mtime = os.path.getmtime(database.database)
+        # the queries are bound one by one, the models stay bound to the current library for other threads
+        with database.atomic():
+            # read in the transaction of the rows, the version is the one of the data in the index
+            version = content_version(database) or 0
+            assets = list(Asset
+                          .select(Asset.id, Asset.name, Asset.path, Asset.folder, Asset.missing, Asset.icon_width,
+                                  Asset.icon_height, Asset.has_icon, Asset.description, Asset.details_stored,
+                                  Asset.files_mtime)
+                          .order_by(Asset.id)
+                          .bind(database)
+                          .tuples())
+            tags = dict(Tag.select(Tag.name, Tag.usage_count).bind(database).tuples())
+            links = list(AssetTag.select(AssetTag.asset_id, Tag.name).join(Tag).bind(database).tuples())
+            files = list(AssetFile.select(AssetFile.asset_id, AssetFile.kind, AssetFile.name).bind(database).tuples())
+            folders = {x for x, in FolderState.select(FolderState.path).bind(database).tuples()}
+        # the tree of the library has every folder between the root and the folders of the assets
+        tree = set()
+        for folder in folders | {x[3] for x in assets}:
+            while folder.startswith(root) and folder != root and folder not in tree:
+                tree.add(folder)
+                folder = folder_of(folder)
+        index_path = root + INDEX_NAME
+        write_index(index_path, assets, tags, links, files, tree, database_mtime, version)
+        logger.debug(f"Index of {len(assets)} assets written to {index_path}")
+        return index_path
     except Exception as message:
         logger.error(message)
+        return False
 
-if __name__ == '__main__':
-    from settings import DATABASE_NAME
-    db_path = get_library_path()
-    data_base.init(os.path.join(db_path, "database.db"))
 
-    tag_list = ["head", "mgs"]
-    super_list = []
+def update_library_index():
+    """
+    Writes the index file of the current library again if its data has changed since the file was written.
+    Only libraries published with an index file are updated. Returns the path of the file or False
+    """
+    from settings import INDEX_NAME
+    if library_index is not None or data_base.deferred:
+        # clients do not write to the library
+        return False
+    try:
+        index_path = folder_of(data_base.database) + INDEX_NAME
+        if not os.path.exists(index_path):
+            return False
+        with data_base.atomic():
+            version = content_version(data_base)
+        if version is None or version == read_content_version(index_path):
+            return False
+        return write_library_index()
+    except Exception as message:
+        logger.error(message)
+        return False
+
 
+def prepare_library(lib_path):
+    """
+    Database of another library ready for writing, it is migrated and its tables are created once
+    """
+    database = library_database(lib_path)
+    if database.database not in prepared_libraries:
+        create_library_tables(database)
+        prepared_libraries.add(database.database)
+    return database
 
-    assets_with_tags = Asset.select(Asset).join(Tag).where(Tag.name=="head")
 
-    # for tag in tag_list:
-    #     quest_rez = Tag.select().where(Tag.name == tag)
-    #     super_list.append([x.asset_id.id for x in quest_rez])
-    #     print(len([x.asset_id.id for x in quest_rez]))
+def create_library_tables(database):
+    """
+    Migrates the database of a library and creates the missing tables
+    """
+    migrate_database(database)
+    models = [Asset, Tag, AssetTag, AssetFile, FolderState] + ([AssetSearch] if full_text_search else [])
+    # the tables are written to the library by schema managers of its own, the models stay bound
+    # to the current library for other threads. The list is in the order of the foreign keys
+    for model in models:
+        type(model._schema)(model, database, **model._schema.context_options).create_all(safe=True)
+    create_triggers(database)
+
+
+def rebuild_database(db_path, assets):
+    """
+    Writes a new library database from the list of asset dicts with id, name, path, tags and description.
+    The file must not exist, all rows are written with bulk inserts in one transaction
+    """
+    # nobody reads the new file until it replaces the library database, so the journal is not needed
+    database = SqliteDatabase(db_path, pragmas={"journal_mode": "off", "synchronous": "off"})
+    try:
+        create_library_tables(database)
+        with database.atomic():
+            rows = [{"id": x["id"], "name": x["name"], "path": x["path"], "icon": "", "folder": folder_of(x["path"]),
+                     "description": x["description"] or ""} for x in assets]
+            for chunk in chunked(rows, SQLITE_MAX_VARIABLES // len(rows[0]) if rows else 1):
+                Asset.insert_many(chunk).bind(database).execute()
+
+            tag_names = list(dict.fromkeys(tag for x in assets for tag in x["tags"]))
+            for names in chunked(tag_names, SQLITE_MAX_VARIABLES):
+                Tag.insert_many([{"name": x} for x in names]).bind(database).execute()
+            tag_ids = dict(Tag.select(Tag.name, Tag.id).bind(database).tuples())
+            links = [{"asset_id": x["id"], "tag_id": tag_ids[tag]} for x in assets for tag in dict.fromkeys(x["tags"])]
+            for chunk in chunked(links, SQLITE_MAX_VARIABLES // 2):
+                AssetTag.insert_many(chunk).bind(database).execute()
+
+            if full_text_search:
+                search_rows = [{AssetSearch.rowid: x["id"],
+                                AssetSearch.name: x["name"],
+                                AssetSearch.tags: " ".join(x["tags"]),
+                                AssetSearch.description: x["description"] or ""} for x in assets]
+                for chunk in chunked(search_rows, SQLITE_MAX_VARIABLES // 4):
+                    AssetSearch.insert_many(chunk).bind(database).execute()
+        return True
+    except Exception as message:
+        logger.error(message)
+        return False
+    finally:
+        database.close()
+
+
+def export_assets_to_library(data_list, lib_path):
+    """
+    Adds the assets to the database of another library in one transaction.
+    Returns the new asset ids in the order of data_list, False for names already taken
+    """
+    out = [False] * len(data_list)
+    try:
+        database = prepare_library(lib_path)
+        with database.atomic():
+            # names are checked by the index of the asset name
+            taken = set()
+            for names in chunked([x["name"] for x in data_list], SQLITE_MAX_VARIABLES):
+                taken.update(x for x, in Asset.select(Asset.name).where(Asset.name.in_(names)).bind(database).tuples())
+            new_assets = {}
+            for data in data_list:
+                if data["name"] in taken or data["name"] in new_assets:
+                    logger.error(f'Asset named {data["name"]} already exists in the database and cannot be added.')
+                    continue
+                new_assets[data["name"]] = data
+            if not new_assets:
+                return out
+
+            # icon sizes are known if the asset data has them, otherwise they are measured in the library later
+            rows = [{"name": x["name"], "path": x["path"], "icon": "", "folder": folder_of(x["path"]),
+                     "icon_width": x.get("icon_width", 0), "icon_height": x.get("icon_height", 0),
+                     "has_icon": bool(x.get("icon_width")) if "icon_width" in x else None,
+                     "description": x.get("description") or ""}
+                    for x in new_assets.values()]
+            asset_ids = {}
+            for chunk in chunked(rows, SQLITE_MAX_VARIABLES // len(rows[0])):
+                Asset.insert_many(chunk).bind(database).execute()
+                names = [x["name"] for x in chunk]
+                asset_ids.update(Asset.select(Asset.name, Asset.id).where(Asset.name.in_(names)).bind(database).tuples())
+
+            tag_names = list(dict.fromkeys(x for data in new_assets.values() for x in data["tags"]))
+            tag_ids = {}
+            for names in chunked(tag_names, SQLITE_MAX_VARIABLES):
+                Tag.insert_many([{"name": x} for x in names]).on_conflict_ignore().bind(database).execute()
+                tag_ids.update(Tag.select(Tag.name, Tag.id).where(Tag.name.in_(names)).bind(database).tuples())
+            links = [{"asset_id": asset_ids[name], "tag_id": tag_ids[x]}
+                     for name, data in new_assets.items() for x in dict.fromkeys(data["tags"])]
+            for chunk in chunked(links, SQLITE_MAX_VARIABLES // 2):
+                AssetTag.insert_many(chunk).bind(database).execute()
+
+            if full_text_search:
+                search_rows = [{AssetSearch.rowid: asset_ids[name],
+                                AssetSearch.name: name,
+                                AssetSearch.tags: " ".join(data["tags"]),
+                                AssetSearch.description: data.get("description") or ""}
+                               for name, data in new_assets.items()]
+                for chunk in chunked(search_rows, SQLITE_MAX_VARIABLES // 4):
+                    AssetSearch.insert_many(chunk).bind(database).execute()
+
+        out = [asset_ids.get(x["name"], False) if new_assets.get(x["name"]) is x else False for x in data_list]
+        logger.debug(f"{len(new_assets)} assets exported to {database.database}")
+    except Exception as message:
+        logger.error(message)
+    return out
+
 
-    # assets_with_tags = (Asset.select(Asset).join(Tag, on=(Tag.asset_id == Asset.id))
-    # )
-    print(len(assets_with_tags))
-    print([x.name for x in assets_with_tags])
\ No newline at end of file
+def add_asset_to_other_db(data, lib_path):
+    """
+    Adds one asset to the database of another library
+    """
+    return export_assets_to_library([data], lib_path)[0]
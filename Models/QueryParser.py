@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import re
+
+from settings import COMPLEX_SEARCH_SIGNS
+
+"""
+The module QueryParser.py parses the text of the search line into a boolean expression of tags.
+
+    car truck             assets with any of the tags
+    car & truck           assets with all of the tags, "+" and "and" work the same way
+    car + truck wheel     without parentheses and "|" all of the tags, as before the boolean search
+    car | truck           any of the tags, also "or"
+    damaged -lowpoly      "-" and "not" exclude a tag, a word followed by an exclusion is a conjunction
+    -lowpoly car truck    a leading exclusion is a conjunction with the words after it
+    (car | truck) & damaged -lowpoly
+
+"&" binds tighter than "|", operators at the ends of the search are ignored. The expression is a tree of tuples:
+("tag", name), ("not", node), ("and", left, right), ("or", left, right)
+"""
+
+# "-" is an exclusion only before a tag or a parenthesis, inside a tag it is a part of the name
+TOKEN_PATTERN = re.compile(r"\s*(?:(?P<operator>[()|&+])|(?P<exclude>-)(?=[0-9A-Za-z_(])|(?P<word>[0-9A-Za-z_][-0-9A-Za-z_]*))")
+OPERATORS = dict({"or": "|", "not": "-"}, **{x: "&" for x in COMPLEX_SEARCH_SIGNS})
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def tokenize(text):
+    """
+    Splits the text into operators and lower case tag names, unknown characters are skipped
+    """
+    tokens = []
+    position = 0
+    while position < len(text):
+        found = TOKEN_PATTERN.match(text, position)
+        if not found:
+            position += 1
+            continue
+        position = found.end()
+        token = found.group(found.lastgroup).lower()
+        tokens.append(OPERATORS.get(token, token))
+    return tokens
+
+
+class Parser:
+    def __init__(self, tokens, match_all=False):
+        self.tokens = tokens
+        self.position = 0
+        self.match_all = match_all  # words one after another mean all of them
+
+    def at_term(self):
+        """
+        The next token starts a tag, an exclusion or a group
+        """
+        return self.peek() not in (None, "&", "|", ")")
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"Unexpected '{self.peek()}' in the search")
+        return node
+
+    def parse_or(self):
+        node = self.parse_words()
+        while self.peek() == "|":
+            self.take()
+            node = ("or", node, self.parse_words())
+        return node
+
+    def parse_words(self):
+        node = self.parse_and()
+        if node[0] == "not" and self.at_term():
+            return "and", node, self.parse_words()
+        # tags written one after another mean any of them
+        while self.at_term():
+            node = ("and" if self.match_all else "or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() in ("&", "-"):
+            if self.peek() == "&":
+                self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == "-":
+            self.take()
+            return "not", self.parse_not()
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.take()
+        if token == "(":
+            node = self.parse_or()
+            if self.take() != ")":
+                raise QuerySyntaxError("Missing ')' in the search")
+            return node
+        if token is None or token in ("&", "|", ")"):
+            raise QuerySyntaxError("Tag expected" + (f" before '{token}'" if token else " at the end of the search"))
+        return "tag", token
+
+
+def parse_query(text):
+    """
+    Returns the expression tree of the search text or None if there are no tags in it.
+    Raises QuerySyntaxError for unbalanced parentheses and operators without tags
+    """
+    tokens = tokenize(text)
+    # the search is typed from left to right, an operator at its end waits for the next tag
+    match_all = "&" in tokens and not {"(", ")", "|"} & set(tokens)
+    while tokens and tokens[-1] in ("&", "|", "-"):
+        tokens.pop()
+    while tokens and tokens[0] in ("&", "|"):
+        tokens.pop(0)
+    if not tokens:
+        return None
+    return Parser(tokens, match_all).parse()
+
+
+def query_tags(node, negated=False):
+    """
+    Tag names of the expression that are not excluded
+    """
+    if node is None:
+        return []
+    if node[0] == "tag":
+        return [] if negated else [node[1]]
+    if node[0] == "not":
+        return query_tags(node[1], not negated)
+    return list(dict.fromkeys(query_tags(node[1], negated) + query_tags(node[2], negated)))
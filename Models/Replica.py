@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+from contextlib import contextmanager
+
+from peewee import SqliteDatabase, __exception_wrapper__
+
+from Utilities.Logging import logger
+
+"""
+The module Replica.py keeps a local copy of the library database.
+The database on the network share stays the master: all writes and all queries inside
+transactions go to it, other reads are served by the local snapshot
+"""
+
+
+def is_read_query(sql):
+    return sql.lstrip()[:6].upper() in ("SELECT", "WITH")
+
+
+def change_counter(path):
+    """
+    File change counter from the header of the database, SQLite increments it with every committed write
+    """
+    with open(path, "rb") as infile:
+        header = infile.read(28)
+    return struct.unpack(">I", header[24:28])[0] if len(header) == 28 else 0
+
+
+class ReplicatedSqliteDatabase(SqliteDatabase):
+    """
+    SqliteDatabase that routes reads to a local snapshot of the master file.
+    The snapshot is refreshed by refresh_replica when the master file changes or after own writes
+    """
+    def __init__(self, *args, **kwargs):
+        self.replica_path = None
+        self.synced_at = None  # time of the last snapshot
+        self.stale = False  # the master has changed or is unavailable, but the snapshot is not updated
+        self._master_mtime = None
+        self._master_counter = None  # change counter of the master in the snapshot
+        self._dirty = False  # own writes not yet in the snapshot
+        self._writes = 0  # number of own writes, a copy taken during a write does not clear _dirty
+        self._generation = 0  # incremented when the replica file changes its path
+        self._lock = threading.Lock()
+        self._local = threading.local()  # replica connection of each thread
+        super(ReplicatedSqliteDatabase, self).__init__(*args, **kwargs)
+
+    def init(self, database, **kwargs):
+        self.stop_replica()
+        super(ReplicatedSqliteDatabase, self).init(database, **kwargs)
+
+    def start_replica(self, cache_dir):
+        """
+        Takes the first snapshot of the master into cache_dir and starts serving reads from it
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        name = hashlib.md5(os.path.abspath(self.database).encode("utf-8")).hexdigest() + ".db"
+        self.replica_path = os.path.join(cache_dir, name)
+        self._generation += 1
+        if not self.refresh_replica(force=True):
+            self.replica_path = None
+            return False
+        logger.debug("Local replica " + self.replica_path + " of " + self.database)
+        return True
+
+    def stop_replica(self):
+        self.replica_path = None
+        self.synced_at = None
+        self.stale = False
+        self._master_mtime = None
+        self._master_counter = None
+        self._generation += 1
+
+    def refresh_replica(self, force=False):
+        """
+        Copies the master into the snapshot if it has changed since the last copy.
+        Returns True if the snapshot was updated
+        """
+        if not self.replica_path:
+            return False
+        with self._lock:
+            try:
+                stat = os.stat(self.database)
+                mtime = stat.st_mtime, stat.st_size
+                if not force and not self._dirty and mtime == self._master_mtime:
+                    return False
+                writes = self._writes
+                counter = change_counter(self.database)
+                source = sqlite3.connect(self.database, timeout=self._timeout)
+                target = sqlite3.connect(self.replica_path, timeout=self._timeout)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                    source.close()
+                # until the copy succeeds own writes are read from the master, a write during the copy may be missing
+                if self._writes == writes:
+                    self._dirty = False
+                # the counter of the copy is its own, the one of the master is known if nobody wrote during the copy
+                self._master_counter = counter if change_counter(self.database) == counter else None
+                self._master_mtime = mtime
+                self.synced_at = datetime.datetime.now()
+                self.stale = False
+                return True
+            except Exception as message:
+                logger.error(message)
+                self.stale = True
+                return False
+
+    def replica_connection(self):
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            if getattr(local, "connection", None):
+                local.connection.close()
+            # the transactions of mirrored writes are begun and ended explicitly
+            local.connection = sqlite3.connect(self.replica_path, timeout=self._timeout, isolation_level=None)
+            local.generation = self._generation
+        return local.connection
+
+    def thread_connections(self):
+        """
+        SQLite connections of the calling thread, another thread can interrupt their queries.
+        A connection to the file of a previous init is closed first
+        """
+        if self.deferred:
+            # the library is searched in its index file
+            return []
+        self.close_stale_connection()
+        connections = [self.connection()]
+        if self.replica_path:
+            connections.append(self.replica_connection())
+        return connections
+
+    def _connect(self):
+        # the file of the connection of each thread, init changes the file for all threads
+        self._local.database = self.database
+        return super(ReplicatedSqliteDatabase, self)._connect()
+
+    def close_stale_connection(self):
+        """
+        Closes the connection of the calling thread if it was opened to the file of a previous init,
+        the next query connects to the current file. A transaction keeps its connection to the end
+        """
+        state = self._state
+        if state.closed or state.transactions or getattr(self._local, "database", None) == self.database:
+            return
+        try:
+            self._close(state.conn)
+        finally:
+            state.reset()
+
+    def cursor(self, commit=None):
+        # the task threads of the interface outlive the library they were started with
+        self.close_stale_connection()
+        return super(ReplicatedSqliteDatabase, self).cursor(commit)
+
+    @contextmanager
+    def mirrored_atomic(self):
+        """
+        Transaction written to the master and to the snapshot. If nobody else has changed the master since
+        the last copy, the snapshot stays up to date and the transaction does not cause a new copy.
+        For data measured from the files of the assets, which is written often
+        """
+        if not self.replica_path or self.in_transaction():
+            with self.atomic():
+                yield
+            return
+        local = self._local
+        # a copy of the master during the transaction would not have it
+        with self._lock:
+            local.mirror, local.mirror_failed = True, False
+            try:
+                with self.atomic(lock_type="IMMEDIATE"):
+                    # nobody else writes to the master until the commit
+                    counter = change_counter(self.database)
+                    yield
+                stat = os.stat(self.database)
+                in_sync = counter == self._master_counter and not self._dirty and not local.mirror_failed
+                # one more commit is ours, more would be the writes of others after it
+                if in_sync and change_counter(self.database) == counter + 1:
+                    self._master_counter = counter + 1
+                    self._master_mtime = stat.st_mtime, stat.st_size
+                else:
+                    self._dirty = True
+                    self._writes += 1
+            finally:
+                local.mirror = False
+
+    def mirror(self, sql, params=None):
+        """
+        Repeats the statement of a mirrored transaction in the snapshot
+        """
+        local = self._local
+        if local.mirror_failed:
+            return
+        connection = self.replica_connection()
+        try:
+            if sql in ("COMMIT", "ROLLBACK") and not connection.in_transaction:
+                return
+            connection.execute(sql, params or ())
+        except Exception as message:
+            logger.error(message)
+            local.mirror_failed = True
+            if connection.in_transaction:
+                connection.rollback()
+
+    def commit(self):
+        result = super(ReplicatedSqliteDatabase, self).commit()
+        if self.replica_path:
+            if getattr(self._local, "mirror", False):
+                self.mirror("COMMIT")
+            else:
+                # a copy started before the commit does not have the writes of the transaction
+                self._writes += 1
+        return result
+
+    def rollback(self):
+        result = super(ReplicatedSqliteDatabase, self).rollback()
+        if self.replica_path and getattr(self._local, "mirror", False):
+            self.mirror("ROLLBACK")
+        return result
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        if self.replica_path:
+            if getattr(self._local, "mirror", False):
+                cursor = super(ReplicatedSqliteDatabase, self).execute_sql(sql, params, *args, **kwargs)
+                if not is_read_query(sql):
+                    self.mirror(sql, params)
+                return cursor
+            if not is_read_query(sql):
+                self._dirty = True
+                self._writes += 1
+            elif not self.in_transaction() and not self._dirty:
+                # until the next refresh own writes are read from the master
+                with __exception_wrapper__:
+                    cursor = self.replica_connection().cursor()
+                    cursor.execute(sql, params or ())
+                return cursor
+        return super(ReplicatedSqliteDatabase, self).execute_sql(sql, params, *args, **kwargs)
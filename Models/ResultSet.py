@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import bisect
+import itertools
+
+"""
+The module ResultSet.py holds search results without loading all assets at once.
+Only the ids of the found assets are selected by the search, the rows are read
+from the database page by page when the gallery shows them
+"""
+
+
+class AssetResultSet:
+    """
+    Lazy sequence of found assets in the order of the search.
+    Supports len(), indexing, iteration and bool() like the list it replaces.
+    Assets of another library are read from its database and get its path as the library attribute
+    """
+    def __init__(self, model, ids, page_size=100, database=None, library=None):
+        self.model = model
+        self.ids = ids
+        self.page_size = page_size
+        self.database = database  # None for the database the model is bound to
+        self.library = library
+        self.pages = {}  # page number: list of assets
+
+    def page(self, number):
+        """
+        Reads the assets of one page by their primary keys
+        """
+        if number not in self.pages:
+            ids = self.ids[number * self.page_size:(number + 1) * self.page_size]
+            query = self.model.select().where(self.model.id.in_(ids))
+            if self.database is not None:
+                query = query.bind(self.database)
+            rows = {x.id: x for x in query}
+            for asset in rows.values():
+                asset.library = self.library
+            # assets deleted after the search are None
+            self.pages[number] = [rows.get(x) for x in ids]
+        return self.pages[number]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("asset index out of range")
+        return self.page(index // self.page_size)[index % self.page_size]
+
+    def loaded(self, index):
+        """
+        The asset with the index is read already
+        """
+        return index // self.page_size in self.pages
+
+    def __iter__(self):
+        for number in range((len(self) + self.page_size - 1) // self.page_size):
+            for asset in self.page(number):
+                if asset is not None:
+                    yield asset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def __repr__(self):
+        return f"<AssetResultSet {len(self)} assets, {len(self.pages)} pages loaded>"
+
+
+class MergedResultSet:
+    """
+    Result sets of several libraries shown one after another
+    """
+    def __init__(self, result_sets):
+        self.result_sets = [x for x in result_sets if x]
+        # index of the first asset of every result set
+        self.starts = [0]
+        for result_set in self.result_sets:
+            self.starts.append(self.starts[-1] + len(result_set))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("asset index out of range")
+        number = bisect.bisect_right(self.starts, index) - 1
+        return self.result_sets[number][index - self.starts[number]]
+
+    def loaded(self, index):
+        number = bisect.bisect_right(self.starts, index) - 1
+        return self.result_sets[number].loaded(index - self.starts[number])
+
+    def __iter__(self):
+        return itertools.chain(*self.result_sets)
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __repr__(self):
+        return f"<MergedResultSet {len(self)} assets from {len(self.result_sets)} libraries>"
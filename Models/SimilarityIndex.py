@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import heapq
+import threading
+from collections import Counter
+
+"""
+The module SimilarityIndex.py finds the assets most similar to an asset by their tags.
+The similarity of two assets is the Jaccard index of their tag sets: the number of common tags
+divided by the number of tags of both. Candidates are only the assets sharing at least one tag,
+they are counted through the inverted lists of the tags of the asset
+"""
+
+
+def rank_similar(tags, postings, size, exclude, limit=10):
+    """
+    (asset, similarity) of the most similar assets, most similar first.
+    tags - tags of the asset, postings(tag) - assets with the tag, size(asset) - number of its tags,
+    exclude - the asset itself. Assets with more common tags come first among equally similar ones
+    """
+    tags = list(tags)
+    common = Counter()
+    for tag in tags:
+        common.update(postings(tag))
+    common.pop(exclude, None)
+    by_common = {}
+    for asset, count in common.items():
+        by_common.setdefault(count, []).append(asset)
+
+    best = []
+    for count in sorted(by_common, reverse=True):
+        # an asset with count common tags is at most count / len(tags) similar, when it has no other tags
+        if len(best) >= limit and best[-1][0] <= -count / len(tags):
+            break
+        scored = [(-count / (len(tags) + size(x) - count), -count, x) for x in by_common[count]]
+        best = heapq.nsmallest(limit, best + scored)
+    return [(asset, -score) for score, count, asset in best]
+
+
+class SimilarityIndex:
+    """
+    Tag sets of all assets and the sets of assets of every tag, read by the thread of the interface
+    and changed by the threads writing assets
+    """
+    def __init__(self):
+        self.tags = {}  # asset id: set of tag names
+        self.postings = {}  # tag name: set of asset ids
+        self.built = False
+        self.version = 0  # incremented on every change, a change during build makes the index not built
+        self.lock = threading.Lock()
+
+    def build(self, links):
+        """
+        Replaces the index with (asset id, tag name) pairs from the database
+        """
+        version = self.version
+        tags, postings = {}, {}
+        for asset_id, name in links:
+            tags.setdefault(asset_id, set()).add(name)
+            postings.setdefault(name, set()).add(asset_id)
+        with self.lock:
+            if version == self.version:
+                self.tags, self.postings, self.built = tags, postings, True
+
+    def clear(self):
+        with self.lock:
+            self.tags, self.postings, self.built = {}, {}, False
+            self.version += 1
+
+    def set_tags(self, asset_id, names):
+        with self.lock:
+            self.version += 1
+            self._remove(asset_id)
+            names = set(names)
+            if names:
+                self.tags[asset_id] = names
+                for name in names:
+                    self.postings.setdefault(name, set()).add(asset_id)
+
+    def remove(self, asset_id):
+        with self.lock:
+            self.version += 1
+            self._remove(asset_id)
+
+    def _remove(self, asset_id):
+        for name in self.tags.pop(asset_id, ()):
+            assets = self.postings.get(name)
+            if assets is not None:
+                assets.discard(asset_id)
+                if not assets:
+                    del self.postings[name]
+
+    def similar(self, asset_id, limit=10):
+        """
+        (asset id, similarity) of the assets most similar to the asset
+        """
+        with self.lock:
+            tags = self.tags.get(asset_id)
+            if not tags:
+                return []
+            return rank_similar(tags, lambda x: self.postings.get(x, ()), lambda x: len(self.tags[x]), asset_id,
+                                limit)
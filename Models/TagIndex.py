@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import bisect
+import heapq
+from collections import Counter
+
+"""
+The module TagIndex.py keeps all tag names of the library in memory for autocomplete
+and for finding tags similar to a mistyped word
+"""
+
+
+def trigrams(word):
+    """
+    Three letter parts of the word, padded so that the beginning and the end of the word count more
+    """
+    word = "  " + word + " "
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class TagIndex:
+    """
+    Sorted array of tag names with usage counts.
+    Names starting with a prefix are a contiguous slice found with bisect,
+    similar names are found through the lists of names containing each trigram
+    """
+    def __init__(self):
+        self.names = []
+        self.counts = {}
+        self.postings = {}  # trigram: set of names
+
+    def build(self, tag_counts):
+        """
+        Replaces the index with (name, count) pairs from the database
+        """
+        counts = {name: count for name, count in tag_counts if count > 0}
+        postings = {}
+        for name in counts:
+            for trigram in trigrams(name):
+                postings.setdefault(trigram, set()).add(name)
+        # assign at once, so readers in other threads see the old or the new index
+        self.names, self.counts, self.postings = sorted(counts), counts, postings
+
+    def add(self, names):
+        for name in names:
+            if name in self.counts:
+                self.counts[name] += 1
+            else:
+                self.counts[name] = 1
+                bisect.insort(self.names, name)
+                for trigram in trigrams(name):
+                    self.postings.setdefault(trigram, set()).add(name)
+
+    def remove(self, names):
+        for name in names:
+            if name not in self.counts:
+                continue
+            self.counts[name] -= 1
+            if self.counts[name] <= 0:
+                del self.counts[name]
+                index = bisect.bisect_left(self.names, name)
+                if index < len(self.names) and self.names[index] == name:
+                    del self.names[index]
+                for trigram in trigrams(name):
+                    self.postings.get(trigram, set()).discard(name)
+
+    def complete(self, prefix, limit=10):
+        """
+        Returns the most used tags starting with the prefix
+        """
+        names, counts = self.names, self.counts
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(names, prefix + "\uffff", start)
+        # nlargest keeps the alphabetical order of tags with equal counts
+        return heapq.nlargest(limit, names[start:end], key=lambda x: counts.get(x, 0))
+
+    def similar(self, word, limit=5, threshold=0.3):
+        """
+        Returns the tags most similar to the word by the share of common trigrams,
+        the most used first among equally similar tags
+        """
+        word_trigrams = trigrams(word)
+        common = Counter()
+        for trigram in word_trigrams:
+            common.update(self.postings.get(trigram, ()))
+        scores = []
+        for name, shared in common.items():
+            # Jaccard similarity of the trigram sets, a name of n letters has n + 1 trigrams
+            score = shared / (len(word_trigrams) + len(name) + 1 - shared)
+            if score >= threshold and name != word:
+                scores.append((score, self.counts.get(name, 0), name))
+        return [name for score, count, name in heapq.nlargest(limit, scores)]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.counts
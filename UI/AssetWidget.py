@@ -16,7 +16,8 @@ from Models import Models
 from UI.Ui_function import UiFunction
 from Utilities.Logging import logger
 from Utilities.telegram_bot import send_message_to_bot
-from Utilities.Utilities import get_library_path, convert_path_to_local, set_font_size, get_preview_images
+from Utilities.Utilities import get_library_path, convert_path_to_local, set_font_size, get_preview_images, \
+    get_image_size
 from settings import COLUMN_WIDTH, DROP_MENU_WIDTH, DATABASE_NAME, CLIENT_MODE
 
 BTN_WIDTH = 30  # The size of the buttons inside the widget
@@ -32,7 +33,10 @@ class AssetWidget(QWidget):
         QWidget.__init__(self, parent)
         self.db_asset = db_asset  # asset object from database
         self.Controller = in_controller
+        # path of the library the asset was found in, None for the current library
+        self.library = getattr(self.db_asset, "library", None)
         self.icon_path = Asset.dir_names(self.db_asset.path)["icon"]
+        self.icon_width, self.icon_height = self.icon_size()
 
         self.layout = QVBoxLayout()
         self.layout.setContentsMargins(0, 0, 0, 0)
@@ -52,6 +56,8 @@ class AssetWidget(QWidget):
 
         self.ast_label = QLabel(self.db_asset.name, parent=self.frame_shadow)
         self.ast_label.setToolTip(self.db_asset.name)
+        if self.library:
+            self.ast_label.setToolTip(self.db_asset.name + " (" + os.path.basename(self.library.rstrip("/\\")) + ")")
         self.ast_label.setStyleSheet("background-color: #16191d;"
                                      "border-radius: 10px;"
                                      "font: bold;"
@@ -69,6 +75,10 @@ class AssetWidget(QWidget):
             self.hidden_list = [self.ast_label, self.check_box]
             self.edit_button.hide()
             self.open_button.hide()
+        elif self.library:
+            # assets of other libraries are read only
+            self.hidden_list.remove(self.edit_button)
+            self.edit_button.hide()
 
         if self.db_asset.path in self.Controller.ui.basket_list_widget.get_list():
             self.select_asset()
@@ -88,7 +98,7 @@ class AssetWidget(QWidget):
             self.open_button.clicked.connect(self.open_directory)
             self.edit_button.clicked.connect(self.preparation_for_editing)
 
-        if not os.path.exists(self.icon_path):
+        if not self.icon_width:
             self.frame_shadow.setIcon(QIcon(":/icons/icons/camera-off.svg"))
             self.frame_shadow.setIconSize(QtCore.QSize(25, 25))
             self.hidden_list.pop(0)  # liable not hiding
@@ -96,7 +106,7 @@ class AssetWidget(QWidget):
 
         # connect Context Menu
         self.setContextMenuPolicy(Qt.CustomContextMenu)
-        if not CLIENT_MODE:
+        if not CLIENT_MODE and not self.library:
             self.customContextMenuRequested.connect(self.right_click_handler)
 
         # set font size
@@ -108,39 +118,58 @@ class AssetWidget(QWidget):
     def set_size(self, resolution_factor):
         self.width = int(COLUMN_WIDTH * resolution_factor)
 
-        self.height = QPixmap(self.icon_path).scaledToWidth(self.width).height()
+        # the icon height scaled to the column width, the icon file is not read
+        self.height = round(self.width * self.icon_height / self.icon_width) if self.icon_width else 0
 
         if not self.height:
-            self.height = self.width * 1.5
+            self.height = int(self.width * 1.5)
 
         self.frame_image.setFixedSize(self.width, self.height)
         self.frame_shadow.setGeometry(0, 0, self.width, self.height)
-        self.ast_label.setGeometry(10, 10, self.width - 20, 22 * resolution_factor)
+        self.ast_label.setGeometry(10, 10, self.width - 20, int(22 * resolution_factor))
 
         button_width = int(BTN_WIDTH * resolution_factor)
         button_radius = int(button_width / 2)
-        y_pos = self.height - 40 * resolution_factor
+        y_pos = self.height - int(40 * resolution_factor)
+        icon_size = QtCore.QSize(int(ICON_SIZE * resolution_factor), int(ICON_SIZE * resolution_factor))
 
         open_button_x = button_radius
         edit_button_x = self.width//2-button_radius
         check_box_x = self.width-button_radius*3
 
         self.open_button.setGeometry(open_button_x, y_pos, button_width, button_width)
-        self.open_button.setIconSize(QtCore.QSize(ICON_SIZE* resolution_factor, ICON_SIZE* resolution_factor))
+        self.open_button.setIconSize(icon_size)
         self.open_button.setStyleSheet("background-color: #16191d;"
                                        "border-radius: " + str(button_radius) + "px;")
 
         self.edit_button.setGeometry(edit_button_x,  y_pos, button_width, button_width)
-        self.edit_button.setIconSize(QtCore.QSize(ICON_SIZE* resolution_factor, ICON_SIZE* resolution_factor))
+        self.edit_button.setIconSize(icon_size)
         self.edit_button.setStyleSheet("background-color: #16191d;"
                                        "border-radius: " + str(button_radius) + "px;")
 
         self.check_box.setGeometry(check_box_x, y_pos, button_width, button_width)
-        self.check_box.setIconSize(QtCore.QSize(ICON_SIZE* resolution_factor, ICON_SIZE* resolution_factor))
+        self.check_box.setIconSize(icon_size)
         self.check_box.setStyleSheet("background-color: #16191d;"
                                      "padding: 9px;"
                                      "border-radius: " + str(button_radius) + "px;")
 
+    def icon_size(self):
+        """
+        (width, height) of the asset icon, (0, 0) if there is no icon.
+        Assets not measured yet by the icon size backfill have their icon header read
+        """
+        if getattr(self.db_asset, "has_icon", None) is not None:
+            return self.db_asset.icon_width, self.db_asset.icon_height
+        if not os.path.exists(self.icon_path):
+            return 0, 0
+        return get_image_size(self.icon_path)
+
+    def asset_id(self):
+        """
+        Id of the asset in the database of the current library, None for assets of other libraries
+        """
+        return None if self.library else self.db_asset.id
+
     def check_box_state_changed(self):
         if self.check_box.state:
             self.deselect_asset()
@@ -199,7 +228,7 @@ class AssetWidget(QWidget):
             self.Controller.ui.asset_overview_label.setText(" View asset " + self.db_asset.name)
 
             # get asset data
-            asset_data = Asset.recognize_asset(self.db_asset.path, self.Controller.Models)
+            asset_data = Asset.recognize_asset(self.db_asset.path, self.Controller.Models, self.asset_id())
 
             # set description and form height
             self.Controller.ui.description_textEdit2.setPlainText(asset_data["description"])
@@ -208,7 +237,7 @@ class AssetWidget(QWidget):
             else:
                 self.Controller.ui.description_textEdit2.show()
                 lines_num = len(asset_data["description"]) / 35
-                self.Controller.ui.description_textEdit2.setFixedHeight(lines_num * 18 + 20)
+                self.Controller.ui.description_textEdit2.setFixedHeight(int(lines_num * 18 + 20))
 
             # clear old images from ui
             for i in range(self.Controller.ui.gallery_VLayout.count()):
@@ -218,7 +247,7 @@ class AssetWidget(QWidget):
 
             # create new images if necessary
             asset_folders = Asset.dir_names(self.db_asset.path)
-            preview_images = sorted(get_preview_images(**asset_folders), reverse=True)
+            preview_images = sorted(get_preview_images(gallery=asset_data["gallery"], **asset_folders), reverse=True)
 
             for icon_path, image_path in preview_images:
                 image_preview_btn = QPushButton()
@@ -226,7 +255,7 @@ class AssetWidget(QWidget):
                 pix = QPixmap(icon_path)
                 image_preview_btn.default_size = pix.width(), pix.height()
 
-                image_width = DROP_MENU_WIDTH * self.Controller.ui.resolution_factor - 45
+                image_width = int(DROP_MENU_WIDTH * self.Controller.ui.resolution_factor) - 45
 
                 pix = pix.scaledToWidth(image_width, mode=Qt.SmoothTransformation)
                 image_preview_btn.setFixedSize(pix.width(), pix.height())
@@ -237,7 +266,8 @@ class AssetWidget(QWidget):
                                                 "background-color: #2c313c;"
                                                 "border-image: url(" + icon_path + ") 0 0 0 0;}")
 
-
+            # assets with similar tags
+            self.Controller.ui.similar_assets_widget.show_asset(self.asset_id())
 
             logger.debug(self.db_asset.name + "\n")
             self.Controller.ui.status_message("")
@@ -305,7 +335,7 @@ class AssetWidget(QWidget):
         change the menu mode and fill in the fields for editing
         """
         self.Controller.ui.asset_menu_mode = "Edit"
-        asset_data = Asset.recognize_asset(self.db_asset.path, self.Controller.Models)
+        asset_data = Asset.recognize_asset(self.db_asset.path, self.Controller.Models, self.asset_id())
 
         pattern = r"_ast$"
         asset_data['name'] = re.sub(pattern, "", asset_data['name'])
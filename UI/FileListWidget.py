@@ -7,6 +7,7 @@ from PyQt5.QtGui import QStandardItemModel, QStandardItem, QIcon
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QPushButton, QListView, QApplication, QAbstractItemView, QFileDialog
 
 from Asset import Asset
+from Utilities.IconSizes import read_icon_size
 from Utilities.Logging import logger
 from settings import CONTENT_FOLDER, GALLERY_FOLDER, INFO_FOLDER, CLIENT_DATABASE_PATH
 
@@ -171,7 +172,17 @@ class BasketWidget(FileListWidget):
             if target_folder and path_list:
                 copy_list = []
 
-                for path in path_list:
+                if to_library:
+                    # transferring assets to another library, all of them are added in one transaction
+                    data_list = []
+                    for path in path_list:
+                        data = Asset.get_info_file(Asset.dir_names(path)["asset_json"])
+                        data['path'] = target_folder + "/" + os.path.basename(path)
+                        data['icon_width'], data['icon_height'] = read_icon_size(path)
+                        data_list.append(data)
+                    asset_ids = self.Controller.Models.export_assets_to_library(data_list, CLIENT_DATABASE_PATH)
+
+                for number, path in enumerate(path_list):
                     asset_name = os.path.basename(path)
                     if not to_library:
                         # get asset
@@ -181,14 +192,7 @@ class BasketWidget(FileListWidget):
                             dst = target_folder + "/" + asset_name + "/" + file
                             copy_list.append([srs, dst])
                     else:
-                        # transferring asset to another library
-                        path_json = Asset.dir_names(path)["asset_json"]
-                        data = Asset.get_info_file(path_json)
-
-                        data['path'] = target_folder + "/" + asset_name
-                        asset_id = self.Controller.Models.add_asset_to_other_db(data, CLIENT_DATABASE_PATH)
-
-                        if not asset_id:
+                        if not asset_ids[number]:
                             self.Controller.ui.status_message("Asset with " + asset_name + " name already exists!",
                                                               state="ERROR")
                             continue
@@ -200,10 +204,17 @@ class BasketWidget(FileListWidget):
                                 dst = target_folder + "/" + asset_name + "/" + folder + "/" + file
                                 copy_list.append([srs, dst])
 
-                        data['asset_id'] = asset_id
-                        Asset.write_info_file(path_json, data)
+                        data = data_list[number]
+                        data['asset_id'] = asset_ids[number]
+                        Asset.write_info_file(Asset.dir_names(path)["asset_json"], data)
+
+                def export():
+                    # the clients see the exported assets when the index of the library is written again,
+                    # not before all their files are there
+                    if self.export_files(copy_list) and to_library:
+                        self.Controller.Models.write_library_index(CLIENT_DATABASE_PATH)
 
-                self.Controller.ui.add_task(lambda: self.export_files(copy_list))
+                self.Controller.ui.add_task(export)
 
             for path in path_list:
                 self.deselect_asset_in_gallery(path)
@@ -213,10 +224,16 @@ class BasketWidget(FileListWidget):
             logger.error(message)
 
     def export_files(self, copy_list):
+        """
+        Copies the files of the exported assets, returns True if all of them are copied
+        """
         self.Controller.ui.copy_progress_bar.show()
-        for source_files, destination_files in copy_list:
-            self.Controller.ui.copy_function.copy(source_files, destination_files)
+        failed = self.Controller.ui.copy_function.copy_files(copy_list)
         self.Controller.ui.copy_progress_bar.hide()
+        if failed:
+            self.Controller.ui.status_message_signal.emit(
+                f"{len(failed)} of {len(copy_list)} files are not exported!", "ERROR")
+        return not failed
 
     def deselect_asset_in_gallery(self, path):
         for asset in self.Controller.ui.gallery.widget_list:
@@ -8,6 +8,8 @@ from UI.TagFlowWidget import FlowLayout
 from Utilities.Logging import logger
 from settings import SPACING, COLUMN_WIDTH
 
+PREFETCH_AHEAD = 50  # number of assets after the loaded ones whose page is read in the background
+
 
 class GalleryWidget(QWidget):
     """
@@ -19,6 +21,7 @@ class GalleryWidget(QWidget):
         QWidget.__init__(self, parent)
 
         self.widget_list = []
+        self.loaded_num = 0  # number of found assets taken for the widgets
         self.icons_width = icons_width
         self.mine_window = mine_window
         self.spacing = spacing
@@ -56,13 +59,14 @@ class GalleryWidget(QWidget):
         """
 
         try:
-            found_assets_num = len(self.mine_window.Controller.found_assets)
-            widget_num = len(self.widget_list)
-            for i in range(widget_num, widget_num+number_to_add):
-                if len(self.widget_list)<found_assets_num:
-                    asset = self.mine_window.Controller.found_assets[i]
-                    asset_widget = AssetWidget(asset, self.mine_window.Controller)
-                    self.add_widget(asset_widget)
+            found_assets = self.mine_window.Controller.found_assets
+            # found assets are read from the database page by page, only the next ones are requested
+            for asset in found_assets[self.loaded_num:self.loaded_num + number_to_add]:
+                self.loaded_num += 1
+                # the asset was deleted after the search
+                if asset is not None:
+                    self.add_widget(AssetWidget(asset, self.mine_window.Controller))
+            self.mine_window.Controller.prefetch_ahead(self.loaded_num + PREFETCH_AHEAD)
 
         except Exception as message:
             logger.error(message)
@@ -99,6 +103,7 @@ class GalleryWidget(QWidget):
         for i in range(self.flow_layout.count()):
             self.flow_layout.itemAt(i).widget().deleteLater()
         self.widget_list = []
+        self.loaded_num = 0
 
 
 if __name__ == "__main__":
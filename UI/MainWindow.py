@@ -7,25 +7,28 @@ import tempfile
 import webbrowser
 
 from PyQt5 import QtCore
-from PyQt5.QtCore import QSettings, QRegExp, Qt, QSize, QVariantAnimation
+from PyQt5.QtCore import QSettings, QRegExp, Qt, QSize, QVariantAnimation, QTimer
 from PyQt5.QtGui import QRegExpValidator, QCursor
-from PyQt5.QtWidgets import QMainWindow, QMenu, QAction, QApplication, QPushButton
+from PyQt5.QtWidgets import QMainWindow, QMenu, QAction, QApplication, QPushButton, QLabel
 
 from UI.AssetWidget import AssetWidget
 from UI.CustomTitleBar import CustomTitleBar
 from UI.FileListWidget import FileListWidget, BasketWidget
 from UI.GalleryWidget import GalleryWidget
 from UI.IconLineEdit import IconLineEdit
+from UI.SimilarAssetsWidget import SimilarAssetsWidget
 from UI.TagButton import TagButton
+from UI.TagCompleter import TagCompleter
 from UI.TagFlowWidget import TagFlowWidget
 from UI.TagsWidget import TagsWidget
 from UI.TreeAssetsWidget import MenuTreeWidget
 from UI.Ui_MainWindow import Ui_MainWindow
 from UI.Ui_function import UiFunction
 from Utilities.Logging import logger
-from Utilities.Utilities import convert_path_to_global, remove_non_unique_tags, CopyWithProgress
+from Utilities.CopyEngine import CopyEngine
+from Utilities.Utilities import convert_path_to_global, remove_non_unique_tags
 from settings import COLUMN_WIDTH, SPACING, START_WINDOW_SIZE, SFX, FONT_SIZE, VERSION, ICON_FORMATS_PATTERN, URL, \
-    DROP_MENU_WIDTH, CLIENT_MODE
+    DROP_MENU_WIDTH, CLIENT_MODE, REPLICA_CHECK_INTERVAL, SYNC_INTERVAL
 import resurses_rc
 
 class BaseThread(QtCore.QThread):
@@ -65,6 +68,10 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
     CustomTitleBar - remove TitleBar, setup user ones
     ThreadQueue - Creates a separate thread with a queue in which functions are dropped
     """
+    # messages of the background tasks, shown by the thread of the interface
+    status_message_signal = QtCore.pyqtSignal(str, str)
+    replica_status_signal = QtCore.pyqtSignal(str, bool)
+
     def __init__(self, in_controller, parent=None):
         super(QMainWindow, self).__init__(parent)
 
@@ -112,6 +119,14 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
         self.tag_flow_widget = TagFlowWidget()
         self.verticalLayout.insertWidget(4, self.tag_flow_widget)
 
+        # autocomplete tags from the library
+        self.search_completer = TagCompleter(self.search_lineEdit, self.Controller)
+        self.tag_completer = TagCompleter(self.tag_lineEdit, self.Controller)
+
+        # insert similar assets widget under the preview images of the asset overview
+        self.similar_assets_widget = SimilarAssetsWidget(self.Controller)
+        self.gallery_VLayout.insertWidget(self.gallery_VLayout.count() - 1, self.similar_assets_widget)
+
         # insert tree widget
         self.tree_widget = MenuTreeWidget(self.Controller)
         self.tree_body_VLayout.addWidget(self.tree_widget)
@@ -168,10 +183,30 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
         self.load_settings()
         self.decorate_icons_color()
 
-        self.copy_function = CopyWithProgress()
+        self.copy_function = CopyEngine()
         self.copy_function.progress_bar_signal.connect(self.progress_bar_slot)
+        self.status_message_signal.connect(self.status_message)
+        self.replica_status_signal.connect(self.set_replica_status)
         self.thread.start()
 
+        # state of the local copy of the database
+        self.replica_label = QLabel()
+        self.footer_layout.insertWidget(1, self.replica_label)
+        self.set_replica_status(*self.Controller.Models.replica_status())
+        self.replica_timer = QTimer(self)
+        self.replica_timer.timeout.connect(self.Controller.check_replica)
+        self.replica_timer.start(REPLICA_CHECK_INTERVAL * 1000)
+
+        # find assets copied, moved or deleted by hand, clients only read the library
+        if SYNC_INTERVAL and not CLIENT_MODE:
+            self.sync_timer = QTimer(self)
+            self.sync_timer.timeout.connect(self.Controller.sync_library)
+            self.sync_timer.start(SYNC_INTERVAL * 1000)
+            # the first sync after the window is created
+            QTimer.singleShot(0, self.Controller.sync_library)
+        elif not CLIENT_MODE:
+            QTimer.singleShot(0, self.Controller.measure_icons)
+
         if not self.Controller.connect_db:
             self.status_message("Problems connecting to the database.", state="ERROR")
         logger.debug("Ui loaded successfully.\n")
@@ -213,13 +248,13 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
                 self.gallery.set_size()
 
                 if self.drop_menu.width():
-                    self.drop_menu.setFixedWidth(DROP_MENU_WIDTH * self.resolution_factor)
+                    self.drop_menu.setFixedWidth(int(DROP_MENU_WIDTH * self.resolution_factor))
 
                 for i in range(self.Controller.ui.gallery_VLayout.count()):
                     widget = self.Controller.ui.gallery_VLayout.itemAt(i).widget()
                     if type(widget) == QPushButton:
                         size = widget.default_size
-                        widget.setFixedSize(size[0] * self.resolution_factor, size[1] * self.resolution_factor)
+                        widget.setFixedSize(int(size[0] * self.resolution_factor), int(size[1] * self.resolution_factor))
 
                 # vertical elements
                 for elem in (self.left_panel,):
@@ -259,13 +294,13 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
                 item.start_icon_size = item.iconSize().width(), item.iconSize().height()
 
             if width:
-                item.setFixedWidth(item.start_width * self.resolution_factor)
-                item.setMaximumWidth(item.start_width * self.resolution_factor)
-                item.setMinimumWidth(item.start_width * self.resolution_factor)
+                item.setFixedWidth(int(item.start_width * self.resolution_factor))
+                item.setMaximumWidth(int(item.start_width * self.resolution_factor))
+                item.setMinimumWidth(int(item.start_width * self.resolution_factor))
             if height:
-                item.setFixedHeight(item.start_height * self.resolution_factor)
-                item.setMaximumHeight(item.start_height * self.resolution_factor)
-                item.setMinimumHeight(item.start_height * self.resolution_factor)
+                item.setFixedHeight(int(item.start_height * self.resolution_factor))
+                item.setMaximumHeight(int(item.start_height * self.resolution_factor))
+                item.setMinimumHeight(int(item.start_height * self.resolution_factor))
 
             if hasattr(item, 'start_icon_size'):
                 new_size = QSize(int(item.start_icon_size[0] * self.resolution_factor),
@@ -295,6 +330,10 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
         self.tag_flow_widget.add_tags(tag_list)
         self.tag_lineEdit.clear()
 
+    def set_replica_status(self, message, stale=False):
+        self.replica_label.setText(message)
+        self.replica_label.setStyleSheet(" color: red;" if stale else " color: #838ea2;")
+
     def progress_bar_slot(self, percent):
         if percent <= 100:
             self.copy_progress_bar.setValue(percent)
@@ -343,7 +382,10 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
             self.asset_menu_mode = "Add"
             self.update_assets_widgets()
             self.update_tags_widgets()
-            self.status_message(f"In the database were found {len(self.Controller.found_assets)} items ")
+            message = f"In the database were found {len(self.Controller.found_assets)} items "
+            if self.Controller.suggestions:
+                message += "  Did you mean: " + ", ".join(self.Controller.suggestions.values()) + "?"
+            self.status_message(message)
         except Exception as message:
             logger.error(message)
 
@@ -361,8 +403,8 @@ class MainWindow(QMainWindow, Ui_MainWindow, UiFunction, CustomTitleBar, ThreadQ
         """
         self.tag_widget.clear()
         if self.Controller.found_tags:
-            for each_tag in self.Controller.found_tags:
-                tag_widget = TagButton(each_tag, self.Controller)
+            for each_tag, count in self.Controller.found_tags:
+                tag_widget = TagButton(each_tag, self.Controller, count=count)
                 self.tag_widget.add_widget(tag_widget)
 
     def get_asset_data(self):
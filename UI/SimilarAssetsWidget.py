@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+
+from PyQt5.QtCore import QSize, pyqtSignal
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton
+
+from Asset import Asset
+from Utilities.Logging import logger
+from Utilities.Utilities import set_font_size
+from settings import SIMILAR_ASSETS_COUNT
+
+
+class SimilarAssetsWidget(QWidget):
+    """
+    List of the assets with tags most similar to the viewed asset, shown under the asset overview.
+    A click on an asset shows it with its own similar assets in the gallery
+    """
+    # the similarity index is built in the task thread, the list is filled when it is ready
+    index_ready = pyqtSignal()
+
+    def __init__(self, in_controller, parent=None):
+        QWidget.__init__(self, parent)
+        self.Controller = in_controller
+        self.buttons = []
+        self.asset_id = None  # the asset of the list
+        self.building = False  # the similarity index is being built
+        self.index_ready.connect(self.index_built)
+
+        self.layout = QVBoxLayout()
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(4)
+        self.setLayout(self.layout)
+
+        self.title = QLabel("Similar assets")
+        self.title.setStyleSheet("font: bold; color: rgb(200, 200, 200);")
+        self.layout.addWidget(self.title)
+        self.hide()
+
+    def show_asset(self, asset_id):
+        """
+        Fills the list with the assets similar to the asset, hides it if there are none
+        """
+        for button in self.buttons:
+            button.deleteLater()
+        self.buttons = []
+        self.asset_id = asset_id
+        if asset_id is None:
+            # assets of other libraries
+            self.hide()
+            return
+        if not self.Controller.Models.similarity_index_ready():
+            self.hide()
+            if not self.building:
+                self.building = True
+                self.Controller.ui.add_task(self.build_index)
+            return
+        assets, scores = self.Controller.Models.get_similar_assets(asset_id, SIMILAR_ASSETS_COUNT)
+        size = self.Controller.ui.font_spinBox.value()
+        # the slice keeps deleted assets as None, so they stay in line with their scores
+        for asset, score in zip(assets[:], scores):
+            if asset is None:
+                continue
+            button = QPushButton(f"{asset.name}   {round(score * 100)}%")
+            button.setToolTip(asset.path)
+            icon_path = Asset.dir_names(asset.path)["icon"]
+            # the icon is loaded by Qt when the button is painted
+            if asset.has_icon or (asset.has_icon is None and os.path.exists(icon_path)):
+                button.setIcon(QIcon(icon_path))
+                button.setIconSize(QSize(32, 32))
+            button.setStyleSheet("QPushButton {"
+                                 "text-align: left;"
+                                 "border-radius: 6px;"
+                                 "padding: 4px 10px;"
+                                 "background-color: #343b47;"
+                                 "color: rgb(200, 200, 200);}"
+                                 "QPushButton:hover {"
+                                 "color: #9bc2ff;"
+                                 "background-color: #2c313c;}")
+            set_font_size(button, size)
+            button.clicked.connect(lambda _, x=asset.id: self.Controller.show_similar(x))
+            self.layout.addWidget(button)
+            self.buttons.append(button)
+        self.setVisible(bool(self.buttons))
+        logger.debug(f"{len(self.buttons)} similar assets")
+
+    def build_index(self):
+        """
+        Reads the tags of all assets, runs in the task thread
+        """
+        self.Controller.Models.build_similarity_index()
+        self.index_ready.emit()
+
+    def index_built(self):
+        self.building = False
+        if self.asset_id is not None and self.Controller.Models.similarity_index_ready():
+            self.show_asset(self.asset_id)
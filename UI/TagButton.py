@@ -8,10 +8,11 @@ from Utilities.Utilities import set_font_size
 
 class TagButton(QWidget):
 
-    def __init__(self, tag, in_controller, parent=None, ):
+    def __init__(self, tag, in_controller, parent=None, count=None):
         QWidget.__init__(self, parent)
 
         self.tag = tag.lower()
+        self.count = count  # number of found assets with this tag
         self.Controller = in_controller
 
         self.layout = QVBoxLayout()
@@ -19,7 +20,7 @@ class TagButton(QWidget):
         self.setLayout(self.layout)
         self.button = QPushButton(self.tag)
         self.button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Fixed)
-        self.button.setToolTip(self.tag)
+        self.button.setToolTip(self.tag if count is None else f"{self.tag} ({count})")
         self.button.clicked.connect(self.serch_asset)
 
         self.button.setStyleSheet("QPushButton  { \n"
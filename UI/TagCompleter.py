@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import re
+
+from PyQt5.QtCore import Qt, QStringListModel
+from PyQt5.QtWidgets import QCompleter
+
+# the tag at the end of the text, a "-" before it excludes the tag in the search and is not a part of it
+WORD_PATTERN = re.compile(r"(?<![-\w])-?([0-9A-Za-z_][-0-9A-Za-z_]*)$")
+
+
+class TagCompleter(QCompleter):
+    """
+    Completes the last tag typed in a line edit with tags from the library.
+    Suggestions come from the in-memory tag index, the most used tags first
+    """
+    def __init__(self, line_edit, in_controller, limit=10):
+        super(TagCompleter, self).__init__(line_edit)
+        self.line_edit = line_edit
+        self.Controller = in_controller
+        self.limit = limit
+
+        self.model = QStringListModel(self)
+        self.setModel(self.model)
+        self.setWidget(self.line_edit)
+        # the tag index filters the tags itself
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.popup().setStyleSheet("background-color: #16191d; color: #fff;")
+
+        self.line_edit.textEdited.connect(self.update_suggestions)
+        self.activated[str].connect(self.insert_tag)
+
+    def current_word(self):
+        """
+        The tag under construction at the end of the line, without the "-" of an exclusion
+        """
+        found = WORD_PATTERN.search(self.line_edit.text()[:self.line_edit.cursorPosition()])
+        return found.group(1) if found else ""
+
+    def update_suggestions(self):
+        word = self.current_word()
+        suggestions = self.Controller.Models.complete_tags(word, self.limit) if word else []
+        if not suggestions and len(word) > 2:
+            # probably a typo, offer similar tags
+            suggestions = self.Controller.Models.similar_tags(word, self.limit)
+        if suggestions == [word.lower()]:
+            suggestions = []
+        self.model.setStringList(suggestions)
+        if suggestions:
+            self.complete()
+        else:
+            self.popup().hide()
+
+    def insert_tag(self, tag):
+        """
+        Replaces the typed part of the tag with the chosen one, the "-" of an exclusion stays in front of it
+        """
+        text = self.line_edit.text()
+        position = self.line_edit.cursorPosition()
+        start = position - len(self.current_word())
+        self.line_edit.setText(text[:start] + tag + text[position:])
+        self.line_edit.setCursorPosition(start + len(tag))
@@ -97,12 +97,35 @@ class MenuTreeWidget(QTreeWidget):
                     item.setExpanded(True)
                 self.get_tree(item, filepath)
 
+    def get_tree_from_index(self, folders):
+        """
+        Builds the tree from the folders of the library index, the share is not listed
+        """
+        items = {self.path: self.invisibleRootItem()}
+        for folder in folders:
+            filepath = folder.rstrip("/")
+            root, f = os.path.split(filepath)
+            if root not in items or re.search(r"_ast$", filepath) or re.search(DELETED_ASSET_FOLDER, filepath):
+                continue
+            item = QTreeWidgetItem()
+            self.items_list.append(item)
+            items[root].addChild(item)
+            item.setText(0, f)
+            item.setData(0, 32, filepath)
+            if root == self.path:
+                item.setExpanded(True)
+            items[filepath] = item
+
     def update_ui(self):
         try:
             self.clear()
             self.path = self.Controller.lib_path
             if self.Controller.lib_path:
-                self.get_tree()
+                folders = self.Controller.Models.get_folder_tree()
+                if folders is not None:
+                    self.get_tree_from_index(folders)
+                else:
+                    self.get_tree()
         except Exception as message:
             logger.error(message)
 
@@ -7,7 +7,7 @@ from PyQt5.QtWidgets import QFileDialog, QWidget, QSizeGrip, qApp
 
 from Utilities.Logging import logger
 from Utilities.Utilities import convert_path_to_local
-from settings import DROP_MENU_WIDTH, COLUMN_WIDTH
+from settings import DROP_MENU_WIDTH, COLUMN_WIDTH, CLIENT_MODE, LIBRARY_INDEX
 
 
 class UiFunction(QWidget):
@@ -20,7 +20,8 @@ class UiFunction(QWidget):
         lib_path = lib_path.replace("\\", "/")
         self.db_path_lineEdit.setText(lib_path)
         self.Controller.lib_path = lib_path
-        self.Controller.connect_db = self.Controller.Models.initialize(lib_path)
+        self.Controller.connect_db = self.Controller.Models.initialize(lib_path,
+                                                                      use_index=CLIENT_MODE and LIBRARY_INDEX)
         if self.Controller.connect_db:
             self.Controller.refresh_ui()
         file_path = os.path.join(tempfile.gettempdir(), 'asset_manager_settings.ini')
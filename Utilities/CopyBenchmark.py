@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import argparse
+import filecmp
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+if __name__ == '__main__':
+    # run as a script, the modules are imported from the root of the project
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtCore import Qt
+
+from Utilities.CopyEngine import CopyEngine, copy_file
+from Utilities.Logging import logger
+from settings import COPY_WORKERS, COPY_BUFFER_SIZE
+
+"""
+The module CopyBenchmark.py compares the copy engine with the copying used before it, one file after another
+in 100 chunks with a progress signal after every chunk. Small, medium and large files are generated into
+a temporary folder and copied to the target folder, a local temporary folder by default. To measure
+a network share, give a folder on it as the target. A share can also be imitated locally, every opened file
+and every copied chunk then waits for the round trip time:
+
+    python Utilities/CopyBenchmark.py --latency-ms 2 --output copy.json
+"""
+
+
+def legacy_copy(src, dst, emit):
+    """
+    The copying used before the copy engine, kept as it was for the comparison.
+    Files smaller than 100 bytes are read with a buffer of 0 bytes and are left empty
+    """
+    path_name = os.path.dirname(dst)
+    if not os.path.exists(path_name):
+        os.makedirs(path_name)
+
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        buffer = os.stat(src).st_size // 100
+        percent = 0
+        while True:
+            buf = src_file.read(buffer)
+            bytes_written = dst_file.write(buf)
+            percent += 1
+            emit(percent)
+            if bytes_written < len(buf) or bytes_written == 0:
+                break
+
+
+def wait(latency):
+    if latency:
+        time.sleep(latency)
+
+
+class LatencyCopyEngine(CopyEngine):
+    """
+    The copy engine waiting for the round trip time on every opened file and copied chunk
+    """
+    def __init__(self, latency, **kwargs):
+        CopyEngine.__init__(self, **kwargs)
+        self.latency = latency
+
+    def copy_file(self, src, dst, progress):
+        def chunk_copied(count):
+            wait(self.latency)
+            progress(count)
+
+        wait(self.latency)
+        copy_file(src, dst, chunk_copied, self.buffer_size)
+
+
+def generate_files(folder, counts, seed):
+    """
+    Files of the three groups of sizes, returns their paths. Some small files are shorter than 100 bytes
+    """
+    rng = random.Random(seed)
+    sizes = {"small": lambda: rng.choice([10, 64, 4 * 1024, 16 * 1024, 64 * 1024]),
+             "medium": lambda: 4 * 1024 * 1024,
+             "large": lambda: 64 * 1024 * 1024}
+    paths = []
+    block = os.urandom(1024 * 1024)
+    for group, count in counts.items():
+        for number in range(count):
+            path = os.path.join(folder, group, "file%d.bin" % number)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            size = sizes[group]()
+            with open(path, "wb") as outfile:
+                for start in range(0, size, len(block)):
+                    outfile.write(block[:min(len(block), size - start)])
+            # an old modification time shows whether it is kept by the copy
+            os.utime(path, (1000000000 + number, 1000000000 + number))
+            paths.append(path)
+    return paths
+
+
+def verify(copy_list):
+    """
+    Numbers of copies with other contents and other modification times than their sources
+    """
+    contents = times = 0
+    for src, dst in copy_list:
+        if not os.path.exists(dst) or not filecmp.cmp(src, dst, shallow=False):
+            contents += 1
+        elif int(os.stat(src).st_mtime) != int(os.stat(dst).st_mtime):
+            times += 1
+    return {"wrong_contents": contents, "wrong_mtimes": times}
+
+
+def measure(name, copy, copy_list, target, repeat):
+    """
+    Copies the list repeat times into an empty target, copy(copy_list, emit) returns after all files are copied
+    """
+    seconds, signals = [], []
+    for _ in range(repeat):
+        shutil.rmtree(target, ignore_errors=True)
+        lock = threading.Lock()
+        count = [0]
+
+        def emit(_):
+            with lock:
+                count[0] += 1
+
+        start = time.perf_counter()
+        copy(copy_list, emit)
+        seconds.append(time.perf_counter() - start)
+        signals.append(count[0])
+    result = verify(copy_list)
+    total = sum(os.stat(x[0]).st_size for x in copy_list)
+    median = statistics.median(seconds)
+    result.update(name=name, median_s=round(median, 4), min_s=round(min(seconds), 4),
+                  mb_per_s=round(total / median / 1024 / 1024, 1) if median else None,
+                  files_per_s=round(len(copy_list) / median, 1) if median else None,
+                  signals=int(statistics.median(signals)))
+    return result
+
+
+def run_benchmark(counts, target=None, latency_ms=0, workers=COPY_WORKERS, buffer_size=COPY_BUFFER_SIZE,
+                  repeat=3, seed=1):
+    latency = latency_ms / 1000
+    source = tempfile.mkdtemp(prefix="copy_benchmark_")
+    target = os.path.join(target or tempfile.mkdtemp(prefix="copy_benchmark_"), "copy_benchmark")
+    try:
+        paths = generate_files(source, counts, seed)
+        copy_list = [(x, os.path.join(target, os.path.relpath(x, source))) for x in paths]
+
+        def legacy(files, emit):
+            def chunk_copied(percent):
+                wait(latency)
+                emit(percent)
+
+            for src, dst in files:
+                wait(latency)
+                legacy_copy(src, dst, chunk_copied)
+
+        def engine(count):
+            def copy(files, emit):
+                copier = LatencyCopyEngine(latency, workers=count, buffer_size=buffer_size)
+                # the signals are counted in the copying threads, there is no event loop here
+                copier.progress_bar_signal.connect(emit, Qt.DirectConnection)
+                copier.copy_files(files)
+            return copy
+
+        copiers = [("legacy", legacy), ("engine, 1 worker", engine(1)), (f"engine, {workers} workers", engine(workers))]
+        results = [measure(name, copy, copy_list, target, repeat) for name, copy in copiers]
+        return {"platform": platform.platform(), "python": platform.python_version(),
+                "files": counts, "bytes": sum(os.stat(x).st_size for x in paths), "target": target,
+                "latency_ms": latency_ms, "buffer_size": buffer_size, "repeat": repeat, "results": results}
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+        shutil.rmtree(target, ignore_errors=True)
+
+
+def result_table(report):
+    lines = [f"{'copier':24} {'s':>8} {'MB/s':>8} {'files/s':>9} {'signals':>8} {'contents':>9} {'mtimes':>7}"]
+    for x in report["results"]:
+        lines.append(f"{x['name']:24} {x['median_s']:>8.3f} {x['mb_per_s']:>8} {x['files_per_s']:>9} "
+                     f"{x['signals']:>8} {x['wrong_contents']:>9} {x['wrong_mtimes']:>7}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the copy engine with the copying used before it")
+    parser.add_argument("--small", type=int, default=500, help="number of files up to 64 KB")
+    parser.add_argument("--medium", type=int, default=20, help="number of 4 MB files")
+    parser.add_argument("--large", type=int, default=2, help="number of 64 MB files")
+    parser.add_argument("--target", help="folder the files are copied to, for example on a network share")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="round trip time waited on every opened file and copied chunk")
+    parser.add_argument("--workers", type=int, default=COPY_WORKERS)
+    parser.add_argument("--buffer-size", type=int, default=COPY_BUFFER_SIZE)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every copier")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="file for the JSON report")
+    args = parser.parse_args()
+
+    # the errors of the copied files would be measured too
+    logger.setLevel(logging.WARNING)
+    report = run_benchmark({"small": args.small, "medium": args.medium, "large": args.large}, args.target,
+                           args.latency_ms, args.workers, args.buffer_size, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(report, outfile, indent=4)
+    print(result_table(report))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import QObject
+
+from Utilities.Logging import logger
+from settings import COPY_WORKERS, COPY_BUFFER_SIZE
+
+"""
+The module CopyEngine.py copies the files of assets to the library and to other folders.
+Several files are copied at once, because on the network share most of the time is spent waiting
+for the server. The data is copied by the kernel where the system can do it (copy_file_range or
+sendfile on Linux), otherwise through one buffer of at most COPY_BUFFER_SIZE bytes per file.
+The modification times of the files are kept. The progress of all files together is reported in percent,
+at most once per PROGRESS_INTERVAL seconds
+"""
+
+PROGRESS_INTERVAL = 0.1  # seconds between progress signals
+
+
+def kernel_copy_functions():
+    """
+    Functions copying count bytes between two file descriptors in the kernel, the best first
+    """
+    functions = []
+    if hasattr(os, "copy_file_range"):
+        functions.append(lambda source, target, count: os.copy_file_range(source, target, count))
+    if hasattr(os, "sendfile"):
+        # the offset None reads from the current position of the source and moves it
+        functions.append(lambda source, target, count: os.sendfile(target, source, None, count))
+    return functions
+
+
+KERNEL_COPY = kernel_copy_functions()
+
+
+def copy_in_kernel(source, target, size, progress, chunk):
+    """
+    Copies the open files in the kernel in chunks. Returns False if the system cannot do it for these files,
+    nothing is copied then
+    """
+    for function in KERNEL_COPY:
+        copied = 0
+        try:
+            while True:
+                count = function(source.fileno(), target.fileno(), chunk)
+                if not count:
+                    break
+                copied += count
+                if progress:
+                    progress(count)
+        except OSError as error:
+            # an error before the first byte means the system cannot copy these files this way, like in shutil
+            if copied or error.errno == errno.ENOSPC:
+                raise
+            continue
+        if copied or not size:
+            return True
+        # some file systems report no data to the kernel copy, the file is read through a buffer
+    return False
+
+
+def copy_with_buffer(source, target, size, progress, buffer_size):
+    """
+    Copies the open files through one buffer, no larger than the file
+    """
+    buffer = bytearray(max(1, min(size, buffer_size)))
+    view = memoryview(buffer)
+    while True:
+        count = source.readinto(buffer)
+        if not count:
+            break
+        target.write(view[:count])
+        if progress:
+            progress(count)
+
+
+def copy_file(src, dst, progress=None, buffer_size=COPY_BUFFER_SIZE):
+    """
+    Copies the file with its modification time, creates the destination folder if needed.
+    progress(number of bytes) is called after every copied chunk
+    """
+    folder = os.path.dirname(dst)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    # the source is not buffered, the kernel copy and readinto use the position of the file itself
+    with open(src, "rb", buffering=0) as source, open(dst, "wb") as target:
+        size = os.fstat(source.fileno()).st_size
+        if not copy_in_kernel(source, target, size, progress, buffer_size):
+            copy_with_buffer(source, target, size, progress, buffer_size)
+    try:
+        shutil.copystat(src, dst)
+    except OSError:
+        # permission bits cannot be set on some shares, the times are kept anyway
+        stat = os.stat(src)
+        os.utime(dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+class Progress:
+    """
+    Bytes copied by all threads, reported in percent when the percent changes but not more often than interval
+    """
+    def __init__(self, total, report, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.report = report
+        self.interval = interval
+        self.done = 0
+        self.percent = -1
+        self.reported_at = 0
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+            percent = min(100, self.done * 100 // self.total) if self.total else 0
+            now = time.monotonic()
+            if percent != self.percent and (percent == 100 or now - self.reported_at >= self.interval):
+                self.percent, self.reported_at = percent, now
+                self.report(percent)
+
+    def finish(self):
+        with self.lock:
+            if self.percent != 100:
+                self.percent = 100
+                self.report(100)
+
+
+def file_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+class CopyEngine(QObject):
+    """
+    Copies lists of files in several threads, the progress in percent is sent by progress_bar_signal
+    """
+    progress_bar_signal = QtCore.pyqtSignal(int)
+
+    def __init__(self, workers=COPY_WORKERS, buffer_size=COPY_BUFFER_SIZE, parent=None):
+        QObject.__init__(self, parent)
+        self.workers = workers
+        self.buffer_size = buffer_size
+
+    def copy_file(self, src, dst, progress):
+        copy_file(src, dst, progress, self.buffer_size)
+
+    def copy_files(self, copy_list):
+        """
+        Copies [source, destination] pairs. Returns the pairs that were not copied
+        """
+        copy_list = list(dict.fromkeys(tuple(x) for x in copy_list))
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            sizes = dict(zip(copy_list, pool.map(lambda x: file_size(x[0]), copy_list)))
+            progress = Progress(sum(sizes.values()), self.progress_bar_signal.emit)
+
+            def copy(pair):
+                try:
+                    self.copy_file(pair[0], pair[1], progress.add)
+                    return None
+                except Exception as message:
+                    logger.error(message)
+                    return pair
+
+            # large files first, so that one of them does not remain alone at the end
+            failed = [x for x in pool.map(copy, sorted(copy_list, key=lambda x: -sizes[x])) if x]
+        progress.finish()
+        return failed
+
+    def copy(self, src, dst):
+        """
+        Copies one file, returns True if it is copied
+        """
+        return not self.copy_files([(src, dst)])
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == '__main__':
+    # run as a script, the modules are imported from the root of the project
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from Asset import Asset
+from Models import Models
+from Utilities.Logging import logger
+from Utilities.Utilities import get_image_size
+
+"""
+The module IconSizes.py fills in the icon sizes of assets added before the sizes were stored
+in the database, and of assets found by the sync or the re-indexer.
+Only the headers of the images are read, many at once, because on the network share
+most of the time is spent waiting for the server
+
+    python Utilities/IconSizes.py U:/AssetStorage/asset_browser
+"""
+
+
+def read_icon_size(asset_path):
+    icon_path = Asset.dir_names(asset_path)["icon"]
+    if not os.path.exists(icon_path):
+        return 0, 0
+    return get_image_size(icon_path)
+
+
+def backfill_icon_sizes(workers=16, batch=500):
+    """
+    Measures the icons of all assets with unknown icon size. Returns the number of measured assets
+    """
+    measured = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            assets = Models.get_unmeasured_icons(batch)
+            if not assets:
+                break
+            sizes = pool.map(lambda x: read_icon_size(x[1]), assets)
+            if not Models.set_icon_sizes([(asset_id, width, height)
+                                          for (asset_id, path), (width, height) in zip(assets, sizes)]):
+                break
+            measured += len(assets)
+    if measured:
+        logger.info(f"Icon sizes of {measured} assets stored in the database")
+    return measured
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Store the icon sizes of the library assets in the database")
+    parser.add_argument("library", help="library folder containing the database")
+    parser.add_argument("--workers", type=int, default=16, help="number of threads reading the share")
+    args = parser.parse_args()
+
+    if not Models.initialize(args.library.replace("\\", "/").rstrip("/"), replica=False):
+        sys.exit(1)
+    print(f"Measured: {backfill_icon_sizes(args.workers)}")
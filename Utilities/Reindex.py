@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+if __name__ == '__main__':
+    # run as a script, the modules are imported from the root of the project
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from Asset import Asset
+from Models import Models
+from Utilities.Logging import logger
+from settings import DATABASE_NAME, DELETED_ASSET_FOLDER, SFX
+
+"""
+The module Reindex.py rebuilds the database of a library from the info files of the asset folders.
+The folders are scanned and the info files are read by many threads, because on the network share
+most of the time is spent waiting for the server. The new database is written next to the old one
+and replaces it, the old one is kept as a backup.
+
+    python Utilities/Reindex.py U:/AssetStorage/asset_browser --dry-run
+"""
+
+
+class ReindexReport:
+    """
+    Differences between the folders of the library and its old database
+    """
+    def __init__(self):
+        self.assets = []  # assets found on disk as dicts for Models.rebuild_database
+        self.unreadable = []  # asset folders without a readable info file
+        self.duplicates = []  # folders of assets whose name is already taken by another folder
+        self.new_ids = []  # assets whose id in the info file is missing or taken, they get a new id
+        self.added = []  # assets on disk that are not in the old database
+        self.missing = []  # assets of the old database that are not on disk
+        self.moved = []  # (old path, new path) of assets found in another folder
+        self.old_database_error = None
+
+    def summary(self):
+        lines = [f"Assets found: {len(self.assets)}",
+                 f"Added: {len(self.added)}, missing: {len(self.missing)}, moved: {len(self.moved)}",
+                 f"Unreadable info files: {len(self.unreadable)}, duplicate names: {len(self.duplicates)}, "
+                 f"new ids: {len(self.new_ids)}"]
+        if self.old_database_error:
+            lines.append(f"Old database could not be read: {self.old_database_error}")
+        return "\n".join(lines)
+
+    def details(self):
+        lines = []
+        for title, paths in (("Unreadable", self.unreadable), ("Duplicate name", self.duplicates),
+                             ("New id", self.new_ids), ("Added", self.added), ("Missing", self.missing)):
+            lines += [f"{title}: {x}" for x in paths]
+        lines += [f"Moved: {old} -> {new}" for old, new in self.moved]
+        return "\n".join(lines)
+
+
+def scan_folder(path):
+    """
+    Returns the asset folders and the other subfolders of the folder
+    """
+    assets, folders = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.is_dir() or entry.name == DELETED_ASSET_FOLDER:
+                continue
+            if entry.name.endswith(SFX):
+                assets.append(path + "/" + entry.name)
+            else:
+                folders.append(path + "/" + entry.name)
+    return assets, folders
+
+
+def read_asset(path):
+    return path, Asset.get_info_file(Asset.dir_names(path)["asset_json"])
+
+
+def find_assets(lib_path, pool, progress=None):
+    """
+    Walks the library, every folder is scanned by a thread of the pool.
+    Returns the futures reading the info files of the found assets
+    """
+    readers = []
+    scans = {pool.submit(scan_folder, lib_path)}
+    while scans:
+        done, scans = wait(scans, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                assets, folders = future.result()
+            except OSError as message:
+                logger.error(message)
+                continue
+            readers += [pool.submit(read_asset, x) for x in assets]
+            scans |= {pool.submit(scan_folder, x) for x in folders}
+        if progress:
+            progress("scan", len(readers), None)
+    return readers
+
+
+def read_old_database(db_path, report):
+    """
+    {path: (id, name)} of the assets in the old database
+    """
+    try:
+        connection = sqlite3.connect(db_path)
+        try:
+            return {path: (asset_id, name) for asset_id, name, path in
+                    connection.execute('SELECT "id", "name", "path" FROM "asset"')}
+        finally:
+            connection.close()
+    except sqlite3.Error as message:
+        report.old_database_error = str(message)
+        return {}
+
+
+def reindex_library(lib_path, workers=32, dry_run=False, progress=None):
+    """
+    Rebuilds the database of the library from the info files. Returns ReindexReport.
+    With dry_run only the differences are reported
+    """
+    lib_path = lib_path.replace("\\", "/").rstrip("/")
+    db_path = lib_path + "/" + DATABASE_NAME
+    report = ReindexReport()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        readers = find_assets(lib_path, pool, progress)
+        records = []
+        for number, future in enumerate(readers, start=1):
+            records.append(future.result())
+            if progress and (number % 500 == 0 or number == len(readers)):
+                progress("read", number, len(readers))
+    old_assets = read_old_database(db_path, report) if os.path.exists(db_path) else {}
+    # of the folders with the same name or id the one known to the database wins,
+    # then the one named after the asset
+    records.sort(key=lambda x: (x[0] not in old_assets,
+                                not x[1] or os.path.basename(x[0]) != str(x[1].get("name")) + SFX, x[0]))
+
+    names, ids = set(), set()
+    for path, data in records:
+        if not data or not data.get("name"):
+            report.unreadable.append(path)
+            continue
+        if data["name"] in names:
+            report.duplicates.append(path)
+            continue
+        names.add(data["name"])
+        asset_id = data.get("asset_id")
+        if not isinstance(asset_id, int) or asset_id in ids:
+            asset_id = None
+        ids.add(asset_id)
+        report.assets.append({"id": asset_id, "name": data["name"], "path": path,
+                              "tags": [x.lower() for x in data.get("tags") or []],
+                              "description": data.get("description")})
+    # ids of the info files are kept, the others continue after the largest one
+    next_id = max([x for x in ids if x] or [0]) + 1
+    for asset in report.assets:
+        if asset["id"] is None:
+            asset["id"] = next_id
+            next_id += 1
+            report.new_ids.append(asset["path"])
+
+    old_paths_by_name = {name: path for path, (asset_id, name) in old_assets.items()}
+    new_paths = {x["path"] for x in report.assets}
+    for asset in report.assets:
+        if asset["path"] in old_assets:
+            continue
+        if asset["name"] in old_paths_by_name and old_paths_by_name[asset["name"]] not in new_paths:
+            report.moved.append((old_paths_by_name[asset["name"]], asset["path"]))
+        else:
+            report.added.append(asset["path"])
+    moved_paths = {old for old, new in report.moved}
+    report.missing = sorted(x for x in old_assets if x not in new_paths and x not in moved_paths)
+
+    if dry_run:
+        return report
+
+    if progress:
+        progress("write", 0, len(report.assets))
+    new_db_path = db_path + ".rebuild"
+    if os.path.exists(new_db_path):
+        os.remove(new_db_path)
+    if not Models.rebuild_database(new_db_path, report.assets):
+        raise RuntimeError("The new database was not written, the library database is not changed")
+    if os.path.exists(db_path):
+        os.replace(db_path, db_path + ".bak")
+    os.replace(new_db_path, db_path)
+    if progress:
+        progress("write", len(report.assets), len(report.assets))
+    logger.info(f"Library {lib_path} re-indexed: {len(report.assets)} assets")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild the library database from the asset folders")
+    parser.add_argument("library", help="library folder containing " + DATABASE_NAME)
+    parser.add_argument("--workers", type=int, default=32, help="number of threads reading the share")
+    parser.add_argument("--dry-run", action="store_true", help="only report differences with the database")
+    parser.add_argument("--details", action="store_true", help="list every difference")
+    args = parser.parse_args()
+
+    # full-text search is available if this SQLite build has FTS5
+    Models.full_text_search = Models.AssetSearch.fts5_installed()
+    start = time.time()
+    result = reindex_library(args.library, args.workers, args.dry_run,
+                             progress=lambda stage, done, total: print(f"\r{stage}: {done}/{total or '?'}  ",
+                                                                       end="", flush=True))
+    print(f"\n{result.summary()}\nTime: {time.time() - start:.1f} s")
+    if args.details:
+        print(result.details())
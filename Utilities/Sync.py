@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from Models import Models
+from Utilities.Logging import logger
+from Utilities.Reindex import scan_folder, read_asset
+
+"""
+The module Sync.py brings the database in line with the folders of the library after
+assets were copied, moved or deleted by hand.
+The modification time of a folder changes when a subfolder is added, removed or renamed in it.
+The times of all folders are kept in the folder_state table, the sync only stats the known
+folders and lists the ones that changed, so an unchanged library costs one stat per folder
+(and a listing of the library root, which changes with every write to the database file next to it)
+"""
+
+
+class SyncReport:
+    def __init__(self):
+        self.scanned = 0  # folders listed by the sync
+        self.added = []  # paths of new assets
+        self.moved = []  # (old path, new path)
+        self.missing = []  # paths of assets whose folder is gone
+        self.found = []  # paths of missing assets that are back
+        self.skipped = []  # new asset folders without an info file or with a name already taken
+
+    def changed(self):
+        return bool(self.added or self.moved or self.missing or self.found)
+
+    def summary(self):
+        return (f"Sync: {self.scanned} folders scanned, {len(self.added)} added, {len(self.moved)} moved, "
+                f"{len(self.missing)} missing, {len(self.found)} found, {len(self.skipped)} skipped")
+
+
+def folder_mtime(path):
+    """
+    Modification time of the folder, None if it does not exist.
+    Other errors are raised, a folder that cannot be read now is not removed
+    """
+    try:
+        return os.stat(path).st_mtime
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def sync_library(lib_path, workers=16):
+    """
+    Adds new asset folders to the database, updates the paths of moved assets
+    and flags assets whose folder is gone. Returns SyncReport, None if the library was not synced
+    """
+    root = lib_path.replace("\\", "/").rstrip("/") + "/"
+    if not os.path.isdir(root):
+        logger.error("Library " + root + " cannot be reached, the sync is skipped")
+        return None
+    try:
+        return sync_folders(root, workers)
+    except Exception as message:
+        logger.error(message)
+        return None
+
+
+def sync_folders(root, workers):
+    """
+    sync_library of the reachable library root, errors of the disk and the database are raised
+    """
+    report = SyncReport()
+    journal = Models.get_folder_states()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        known = list(journal)
+        mtimes = dict(zip(known, pool.map(folder_mtime, known)))
+        removed = [x for x in known if mtimes[x] is None]
+        to_scan = [x for x in known if mtimes[x] is not None and mtimes[x] != journal[x]]
+        if root not in journal:
+            to_scan.append(root)
+
+        # changed folders are listed, new subfolders found in them are listed too
+        folder_states, disk_assets = {}, {}
+        while to_scan:
+            # the time is taken before the listing, a change during the listing is found by the next sync
+            times = list(pool.map(folder_mtime, to_scan))
+            listings = list(pool.map(lambda x: scan_folder(x.rstrip("/")), to_scan))
+            next_scan = []
+            for folder, mtime, (assets, folders) in zip(to_scan, times, listings):
+                folder_states[folder] = mtime
+                disk_assets[folder] = set(assets)
+                next_scan += [x + "/" for x in folders if x + "/" not in journal and x + "/" not in folder_states]
+            report.scanned += len(to_scan)
+            to_scan = next_scan
+
+        db_assets = Models.get_assets_in_folders(list(disk_assets) + removed)
+        db_paths = {path for asset_id, name, path, missing in db_assets}
+        on_disk = set().union(*disk_assets.values())
+        gone = {name: (asset_id, path) for asset_id, name, path, missing in db_assets
+                if path not in on_disk and not missing}
+        found = [(asset_id, path) for asset_id, name, path, missing in db_assets if path in on_disk and missing]
+
+        new_paths = sorted(on_disk - db_paths)
+        new_assets = list(pool.map(read_asset, new_paths))
+
+    # a new folder with the name of a gone or missing asset is the same asset moved
+    names = [data["name"] for path, data in new_assets if data and data.get("name")]
+    missing_elsewhere = Models.get_missing_assets([x for x in names if x not in gone])
+    taken = Models.get_existing_names(names)
+    added, moved = [], []
+    for path, data in new_assets:
+        name = data.get("name") if data else None
+        if name in gone:
+            asset_id, old_path = gone.pop(name)
+            moved.append((asset_id, path))
+            report.moved.append((old_path, path))
+        elif name in missing_elsewhere:
+            asset_id, old_path = missing_elsewhere.pop(name)
+            moved.append((asset_id, path))
+            report.moved.append((old_path, path))
+        elif not name or name in taken:
+            report.skipped.append(path)
+        else:
+            added.append({"name": name, "path": path, "tags": [x.lower() for x in data.get("tags") or []],
+                          "description": data.get("description")})
+            report.added.append(path)
+            taken.add(name)
+    report.missing = [path for asset_id, path in gone.values()]
+    report.found = [path for asset_id, path in found]
+
+    if (removed or report.missing) and not os.path.isdir(root):
+        # the share was lost during the sync, its folders only look removed
+        logger.error("Library " + root + " cannot be reached, the sync is skipped")
+        return None
+    if not Models.apply_sync(added, moved, [asset_id for asset_id, path in gone.values()],
+                      [asset_id for asset_id, path in found], folder_states, removed):
+        return None
+    logger.info(report.summary())
+    return report
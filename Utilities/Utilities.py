@@ -2,38 +2,13 @@ import datetime
 import os
 import re
 import tempfile
-from PyQt5 import QtCore
-from PyQt5.QtCore import QSettings, Qt, QObject
-from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import QSettings, Qt
+from PyQt5.QtGui import QPixmap, QImageReader
 from Utilities.Logging import logger
 from settings import IMAGE_PREVIEW_SUFFIX, DROP_MENU_WIDTH, SFX, ICON_FORMATS_PATTERN, DATABASE_PATH, CLIENT_MODE, \
     CLIENT_DATABASE_PATH
 
 
-class CopyWithProgress(QObject):
-    progress_bar_signal = QtCore.pyqtSignal(int)
-
-    def copy(self, src, dst):
-        try:
-            path_name = os.path.dirname(dst)
-            if not os.path.exists(path_name):
-                os.makedirs(path_name)
-
-            with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
-                buffer = os.stat(src).st_size // 100
-                percent = 0
-                while True:
-                    buf = src_file.read(buffer)
-                    bytes_written = dst_file.write(buf)
-                    percent += 1
-                    self.progress_bar_signal.emit(percent)
-                    # QtWidgets.qApp.processEvents()
-                    if bytes_written < len(buf) or bytes_written == 0:
-                        break
-        except Exception as message:
-            print(message)
-
-
 def get_library_path():
     """
     return library path
@@ -102,14 +77,27 @@ def remove_non_unique_tags(tags_list):
     return out
 
 
+def get_image_size(path):
+    """
+    (width, height) of the image read from the file header without decoding the pixels, (0, 0) if it is unreadable
+    """
+    size = QImageReader(path).size()
+    if not size.isValid():
+        return 0, 0
+    return size.width(), size.height()
+
+
 def get_preview_images(**kwargs):
     gallery_path = kwargs.setdefault("gallery_folder", "")
     info_folder = kwargs.setdefault("info_folder", "")
     out = []
+    # the gallery files stored in the database, the folder is listed if they are not given
+    gallery = kwargs.setdefault("gallery", None)
     try:
-        if os.path.exists(gallery_path):
+        if gallery is not None or os.path.exists(gallery_path):
             # get gallery content and verify it
-            gallery_content = [x for x in os.listdir(gallery_path) if re.search(ICON_FORMATS_PATTERN, x)]
+            names = [os.path.basename(x) for x in gallery] if gallery is not None else os.listdir(gallery_path)
+            gallery_content = [x for x in names if re.search(ICON_FORMATS_PATTERN, x)]
             for file in gallery_content:
                 filename, file_extension = os.path.splitext(file)
                 icon_path = info_folder + "/" + filename + IMAGE_PREVIEW_SUFFIX + file_extension
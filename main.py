@@ -6,6 +6,7 @@ from PyQt5.QtWidgets import QApplication
 
 from Controller.Controller import Controller
 from Models import Models
+from settings import INSTRUMENTATION, INSTRUMENTATION_REPORT, SLOW_QUERY_MS
 
 
 def main():
@@ -13,6 +14,9 @@ def main():
 
     # create a database model
     models = Models
+    if INSTRUMENTATION:
+        from Models import Instrumentation
+        Instrumentation.install(models, INSTRUMENTATION_REPORT, SLOW_QUERY_MS)
 
     # create a controller and pass it a link to the model
     controller = Controller(models)
@@ -21,10 +21,26 @@ CONTENT_FOLDER = 'content'
 GALLERY_FOLDER = 'gallery'
 SFX = '_ast'  # suffix for base asset folders
 DATABASE_NAME = 'database.db'
+INDEX_NAME = 'library.index'  # index file searched by the clients instead of the database
 DELETED_ASSET_FOLDER = 'deleted_assets'
 DATABASE_PATH = 'U:/AssetStorage/asset_browser'
 CLIENT_DATABASE_PATH = 'U:/Asset_Library'
 COMPLEX_SEARCH_SIGNS = ['+', '&', 'and']
+LOCAL_REPLICA = True  # read the database from a local copy, write to the library
+REPLICA_CHECK_INTERVAL = 10  # seconds between checks of the library database for changes
+QUERY_CACHE_SIZE = 64  # number of recent search results kept in memory
+FUZZY_SEARCH = False  # unknown tags in the search are replaced by similar tags
+MULTI_LIBRARY_SEARCH = False  # search the libraries of SEARCH_LIBRARIES together with the current one
+SEARCH_LIBRARIES = [DATABASE_PATH, CLIENT_DATABASE_PATH]
+SYNC_INTERVAL = 300  # seconds between syncs of the database with the library folders, 0 to disable
+POPULAR_TAGS_COUNT = 50  # number of the most used tags shown when the search is empty
+LIBRARY_INDEX = True  # clients search the index file of the library if it is up to date
+SIMILAR_ASSETS_COUNT = 10  # number of assets with similar tags shown in the asset overview
+COPY_WORKERS = 4  # files copied at once to the library and other folders
+COPY_BUFFER_SIZE = 8 * 1024 * 1024  # largest buffer of one copied file, in bytes
+INSTRUMENTATION = False  # measure the Models functions and their SQL, the report is written on exit
+SLOW_QUERY_MS = 100  # the query plan of slower SQL statements is written to the log
+INSTRUMENTATION_REPORT = str(Path(tempfile.gettempdir()) / 'asset_browser_timings.json')
 
 """over"""
 ICON_FORMATS_PATTERN = '.PNG$|.png$|.jpg$|.JPG$'
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from Models import Models
+from Models.LibraryIndex import LibraryIndex, read_content_version, write_index
+from Models.QueryParser import parse_query
+
+# (id, name, path, folder, missing, icon width, icon height, has icon, description, details stored, files mtime)
+ASSETS = [(1, "chair", "/lib/props/chair_ast", "/lib/props/", False, 100, 150, True, "Old wooden chair", True, 5.0),
+          (2, "table", "/lib/props/big/table_ast", "/lib/props/big/", False, 0, 0, None, "Big table", False, None),
+          (7, "robot", "/lib/chars/robot_ast", "/lib/chars/", True, 0, 0, False, "Shiny metal robot", False, None)]
+TAGS = {"wood": 2, "prop": 2, "metal": 1, "unused": 0}
+LINKS = [(1, "wood"), (1, "prop"), (2, "wood"), (2, "prop"), (7, "metal")]
+FILES = [(1, "content", "chair.ma"), (1, "gallery", "chair.png")]
+
+
+class LibraryIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "library.index")
+        write_index(self.path, ASSETS, TAGS, LINKS, FILES, {"/lib/empty/"}, 1234.5, 42)
+        self.index = LibraryIndex(self.path)
+
+    def tearDown(self):
+        # the sections of the index are views of the mapping, it is closed with the last of them
+        del self.index
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def ids(self, result):
+        return [x.id for x in result]
+
+    def test_header(self):
+        self.assertEqual((len(self.index), self.index.database_mtime, self.index.content_version), (3, 1234.5, 42))
+        self.assertEqual(read_content_version(self.path), 42)
+
+    def test_assets(self):
+        chair, table, robot = [self.index.asset(x) for x in range(3)]
+        self.assertEqual((chair.id, chair.name, chair.path, chair.folder), ASSETS[0][:4])
+        self.assertEqual((chair.icon_width, chair.icon_height, chair.has_icon, chair.missing), (100, 150, True, False))
+        self.assertEqual(chair.description, "Old wooden chair")
+        # the icon of the table is not measured yet
+        self.assertIsNone(table.has_icon)
+        self.assertEqual((robot.id, robot.missing, robot.has_icon), (7, True, False))
+
+    def test_find(self):
+        self.assertEqual(self.ids(self.index.find(parse_query("wood"))), [1, 2])
+        self.assertEqual(self.ids(self.index.find(parse_query("metal | prop"))), [1, 2, 7])
+        self.assertEqual(self.ids(self.index.find(parse_query("-wood"))), [7])
+        self.assertEqual(self.ids(self.index.find(parse_query("prop -metal"))), [1, 2])
+        self.assertEqual(self.ids(self.index.find(parse_query("nosuch"))), [])
+
+    def test_find_asset(self):
+        self.assertEqual(self.index.find_asset(id=7), 2)
+        self.assertEqual(self.index.find_asset(name="table"), 1)
+        self.assertEqual(self.index.find_asset(path="/lib/props/chair_ast"), 0)
+        self.assertIsNone(self.index.find_asset(id=3))
+        self.assertIsNone(self.index.find_asset(name="lamp"))
+
+    def test_in_folder(self):
+        self.assertEqual(self.ids(self.index.in_folder("/lib/props")), [1, 2])
+        self.assertEqual(self.ids(self.index.in_folder("/lib/props/big/")), [2])
+        # a folder whose name starts like another one
+        self.assertEqual(self.ids(self.index.in_folder("/lib/pro")), [])
+        self.assertEqual(self.ids(self.index.in_folder("/lib/empty")), [])
+
+    def test_folder_tree(self):
+        self.assertEqual(self.index.folder_tree(), ["/lib/chars/", "/lib/empty/", "/lib/props/", "/lib/props/big/"])
+
+    def test_text_search(self):
+        self.assertEqual(self.ids(self.index.text_search("chair")), [1])
+        # prefixes of words in names, tags and descriptions
+        self.assertEqual(sorted(self.ids(self.index.text_search("woo"))), [1, 2])
+        self.assertEqual(self.ids(self.index.text_search("shiny robot")), [7])
+        self.assertEqual(self.ids(self.index.text_search("shiny chair")), [])
+
+    def test_details(self):
+        details = self.index.details(0)
+        self.assertEqual(details["files"], {"content": ["chair.ma"], "gallery": ["chair.png"]})
+        self.assertEqual(sorted(details["tags"]), ["prop", "wood"])
+        self.assertEqual((details["asset_id"], details["files_mtime"], details["has_icon"]), (1, 5.0, True))
+        # the files of the table were never stored
+        self.assertIsNone(self.index.details(1))
+
+    def test_tags(self):
+        self.assertEqual(dict(self.index.tag_usage()), TAGS)
+        self.assertEqual(self.index.popular_tags(2), [("prop", 2), ("wood", 2)])
+        self.assertEqual(self.index.facets(range(3)), [("prop", 2), ("wood", 2), ("metal", 1)])
+
+
+class PublishedIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.lib = tempfile.mkdtemp().replace("\\", "/")
+        self.assertTrue(Models.initialize(self.lib, replica=False))
+        Models.add_asset_to_db(name="chair", path=self.lib + "/props/chair_ast", tags=["wood"],
+                               description="Old wooden chair")
+        self.index_path = Models.write_library_index()
+
+    def tearDown(self):
+        Models.library_index = None
+        if not Models.data_base.deferred:
+            Models.data_base.close()
+        shutil.rmtree(self.lib, ignore_errors=True)
+
+    def test_the_index_has_the_data_of_the_database(self):
+        Models.data_base.close()
+        self.assertTrue(Models.initialize(self.lib, replica=False, use_index=True))
+        self.assertIsNotNone(Models.library_index)
+        self.assertEqual([x.name for x in Models.find_assets_by_query("wood")], ["chair"])
+        self.assertEqual([x.name for x in Models.search_assets("wooden")], ["chair"])
+
+    def test_the_index_is_up_to_date_until_the_data_changes(self):
+        # a change of the file without a change of the data keeps the index
+        os.utime(self.lib + "/database.db")
+        self.assertIsNotNone(Models.open_library_index(self.lib))
+        Models.add_asset_to_db(name="lamp", path=self.lib + "/props/lamp_ast", tags=["metal"])
+        self.assertIsNone(Models.open_library_index(self.lib))
+
+    def test_the_publishing_side_updates_the_index(self):
+        version = read_content_version(self.index_path)
+        self.assertFalse(Models.update_library_index())
+        Models.add_asset_to_db(name="lamp", path=self.lib + "/props/lamp_ast", tags=["metal"])
+        self.assertEqual(Models.update_library_index(), self.index_path)
+        self.assertGreater(read_content_version(self.index_path), version)
+        self.assertIsNotNone(Models.open_library_index(self.lib))
+
+    def test_clients_do_not_write_the_index(self):
+        Models.data_base.close()
+        self.assertTrue(Models.initialize(self.lib, replica=False, use_index=True))
+        mtime = os.stat(self.index_path).st_mtime_ns
+        self.assertFalse(Models.update_library_index())
+        self.assertFalse(Models.set_asset_details(1, "", []))
+        self.assertEqual(os.stat(self.index_path).st_mtime_ns, mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from Models import Models
+from Models.Migrations import SCHEMA_VERSION
+
+# tables of the first version of the program, before the migrations
+BASELINE_SCHEMA = """
+CREATE TABLE "asset" ("id" INTEGER NOT NULL PRIMARY KEY, "name" VARCHAR(255) NOT NULL,
+                      "path" VARCHAR(255) NOT NULL, "icon" TEXT NOT NULL);
+CREATE TABLE "tag" ("id" INTEGER NOT NULL PRIMARY KEY, "name" VARCHAR(255) NOT NULL, "asset_id" INTEGER NOT NULL,
+                    FOREIGN KEY ("asset_id") REFERENCES "asset" ("id"));
+CREATE INDEX "tag_asset_id" ON "tag" ("asset_id");
+"""
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.lib = tempfile.mkdtemp().replace("\\", "/")
+        connection = sqlite3.connect(self.lib + "/database.db")
+        connection.executescript(BASELINE_SCHEMA)
+        for asset_id, name, folder, tags in [(1, "chair", "props", ["wood", "prop"]),
+                                             (2, "table", "props/big", ["wood", "prop", "prop"]),
+                                             (3, "robot", "chars", ["metal"])]:
+            connection.execute('INSERT INTO "asset" VALUES (?, ?, ?, ?)',
+                               (asset_id, name, f"{self.lib}/{folder}/{name}_ast", ""))
+            for tag in tags:
+                connection.execute('INSERT INTO "tag" ("name", "asset_id") VALUES (?, ?)', (tag, asset_id))
+        # a tag of a deleted asset
+        connection.execute('INSERT INTO "tag" ("name", "asset_id") VALUES (?, ?)', ("lost", 9))
+        connection.commit()
+        connection.close()
+        self.assertTrue(Models.initialize(self.lib, replica=False))
+
+    def tearDown(self):
+        Models.data_base.close()
+        shutil.rmtree(self.lib, ignore_errors=True)
+
+    def usage_counts(self):
+        return dict(Models.Tag.select(Models.Tag.name, Models.Tag.usage_count).tuples())
+
+    def test_schema_version(self):
+        self.assertEqual(Models.data_base.execute_sql("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+
+    def test_assets_keep_their_tags(self):
+        self.assertEqual(sorted(Models.get_asset_tags(1)), ["prop", "wood"])
+        # duplicate tags of an asset are linked once
+        self.assertEqual(sorted(Models.get_asset_tags(2)), ["prop", "wood"])
+        self.assertEqual(Models.get_asset_tags(3), ["metal"])
+
+    def test_folders_are_filled(self):
+        folders = dict(Models.Asset.select(Models.Asset.name, Models.Asset.folder).tuples())
+        self.assertEqual(folders, {"chair": self.lib + "/props/", "table": self.lib + "/props/big/",
+                                   "robot": self.lib + "/chars/"})
+
+    def test_usage_counts_are_computed(self):
+        self.assertEqual(self.usage_counts(), {"wood": 2, "prop": 2, "metal": 1, "lost": 0})
+        self.assertEqual(Models.get_popular_tags(2), [("prop", 2), ("wood", 2)])
+
+    def test_triggers_keep_usage_counts(self):
+        asset_id = Models.add_asset_to_db(name="lamp", path=self.lib + "/props/lamp_ast", tags=["metal", "light"])
+        self.assertEqual(self.usage_counts(), {"wood": 2, "prop": 2, "metal": 2, "lost": 0, "light": 1})
+        Models.edit_db_asset(asset_id=asset_id, tags=["wood"])
+        self.assertEqual(self.usage_counts(), {"wood": 3, "prop": 2, "metal": 1, "lost": 0, "light": 0})
+        Models.delete_asset("chair")
+        self.assertEqual(self.usage_counts(), {"wood": 2, "prop": 1, "metal": 1, "lost": 0, "light": 0})
+
+    def test_migrated_database_opens_again(self):
+        Models.data_base.close()
+        self.assertTrue(Models.initialize(self.lib, replica=False))
+        self.assertEqual(Models.data_base.execute_sql("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        self.assertEqual(self.usage_counts()["wood"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
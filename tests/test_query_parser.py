@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from Models.QueryParser import QuerySyntaxError, parse_query, query_tags, tokenize
+
+
+def tag(name):
+    return "tag", name
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_operators_and_synonyms(self):
+        self.assertEqual(tokenize("Car + truck and wheel or bus not old"),
+                         ["car", "&", "truck", "&", "wheel", "|", "bus", "-", "old"])
+
+    def test_dash_inside_a_name(self):
+        self.assertEqual(tokenize("low-poly -old"), ["low-poly", "-", "old"])
+
+    def test_unknown_characters_are_skipped(self):
+        self.assertEqual(tokenize("car, [truck]"), ["car", "truck"])
+
+
+class ParseQueryTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertIsNone(parse_query(""))
+        self.assertIsNone(parse_query(" + "))
+
+    def test_words_mean_any(self):
+        self.assertEqual(parse_query("car truck"), ("or", tag("car"), tag("truck")))
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertEqual(parse_query("car | truck & wheel"),
+                         ("or", tag("car"), ("and", tag("truck"), tag("wheel"))))
+
+    def test_parentheses(self):
+        self.assertEqual(parse_query("(car | truck) & wheel"),
+                         ("and", ("or", tag("car"), tag("truck")), tag("wheel")))
+
+    def test_exclusion_after_a_word(self):
+        self.assertEqual(parse_query("damaged -lowpoly"), ("and", tag("damaged"), ("not", tag("lowpoly"))))
+
+    def test_leading_exclusion(self):
+        self.assertEqual(parse_query("-lowpoly car"), ("and", ("not", tag("lowpoly")), tag("car")))
+        self.assertEqual(parse_query("-lowpoly car truck"),
+                         ("and", ("not", tag("lowpoly")), ("or", tag("car"), tag("truck"))))
+
+    def test_and_without_groups_means_all(self):
+        self.assertEqual(parse_query("car + truck wheel"),
+                         ("and", ("and", tag("car"), tag("truck")), tag("wheel")))
+
+    def test_and_with_groups_keeps_words_any(self):
+        self.assertEqual(parse_query("car & truck wheel | bus"),
+                         ("or", ("or", ("and", tag("car"), tag("truck")), tag("wheel")), tag("bus")))
+
+    def test_operators_at_the_ends_are_ignored(self):
+        self.assertEqual(parse_query("car truck +"), ("and", tag("car"), tag("truck")))
+        self.assertEqual(parse_query("| car"), tag("car"))
+        self.assertEqual(parse_query("car not"), tag("car"))
+
+    def test_errors(self):
+        for text in ["(car", "car)", "car & | truck", "()", "car & (truck |"]:
+            with self.subTest(text=text):
+                self.assertRaises(QuerySyntaxError, parse_query, text)
+
+
+class QueryTagsTest(unittest.TestCase):
+    def test_excluded_tags_are_left_out(self):
+        self.assertEqual(query_tags(parse_query("car truck -old not (new | car)")), ["car", "truck"])
+
+    def test_double_exclusion(self):
+        self.assertEqual(query_tags(parse_query("- -car")), [])
+        self.assertEqual(query_tags(parse_query("not not car")), ["car"])
+
+
+if __name__ == '__main__':
+    unittest.main()
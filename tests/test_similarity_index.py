@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from Models.SimilarityIndex import SimilarityIndex, rank_similar
+
+
+def rank(tag_sets, asset, limit=10):
+    postings = {}
+    for other, tags in tag_sets.items():
+        for tag in tags:
+            postings.setdefault(tag, set()).add(other)
+    return rank_similar(tag_sets[asset], lambda x: postings.get(x, ()), lambda x: len(tag_sets[x]), asset, limit)
+
+
+class RankSimilarTest(unittest.TestCase):
+    def test_order_by_jaccard_index(self):
+        tag_sets = {0: {"a", "b", "c"}, 1: {"a", "b", "c"}, 2: {"a", "b"}, 3: {"a", "b", "c", "d", "e", "f"},
+                    4: {"a"}, 5: {"a", "x"}, 6: {"z"}}
+        self.assertEqual(rank(tag_sets, 0), [(1, 1.0), (2, 2 / 3), (3, 0.5), (4, 1 / 3), (5, 0.25)])
+
+    def test_more_common_tags_first_among_equally_similar(self):
+        tag_sets = {0: {"a", "b"}, 1: {"a"}, 2: {"a", "b", "c", "d"}, 3: {"b"}}
+        self.assertEqual(rank(tag_sets, 0), [(2, 0.5), (1, 0.5), (3, 0.5)])
+
+    def test_limit(self):
+        tag_sets = {0: {"a", "b"}, 1: {"a"}, 2: {"a", "b"}, 3: {"b", "c"}}
+        self.assertEqual(rank(tag_sets, 0, limit=2), [(2, 1.0), (1, 0.5)])
+
+    def test_asset_without_common_tags(self):
+        self.assertEqual(rank({0: {"a"}, 1: {"b"}}, 0), [])
+
+    def test_same_as_all_pairs(self):
+        generator = random.Random(1)
+        tags = [f"t{x}" for x in range(30)]
+        tag_sets = {x: set(generator.sample(tags, generator.randint(1, 8))) for x in range(300)}
+        for asset in range(0, 300, 7):
+            expected = []
+            for other, other_tags in tag_sets.items():
+                common = len(tag_sets[asset] & other_tags)
+                if other != asset and common:
+                    expected.append((-common / len(tag_sets[asset] | other_tags), -common, other))
+            expected = [(x, -score) for score, common, x in sorted(expected)[:10]]
+            self.assertEqual(rank(tag_sets, asset), expected)
+
+
+class SimilarityIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SimilarityIndex()
+        self.index.build([(1, "a"), (1, "b"), (2, "a"), (2, "b"), (3, "a"), (4, "c")])
+
+    def test_similar(self):
+        self.assertTrue(self.index.built)
+        self.assertEqual(self.index.similar(1), [(2, 1.0), (3, 0.5)])
+        self.assertEqual(self.index.similar(9), [])
+
+    def test_changes(self):
+        self.index.set_tags(3, ["a", "b"])
+        self.index.remove(2)
+        self.assertEqual(self.index.similar(1), [(3, 1.0)])
+        self.assertNotIn(2, self.index.postings["a"])
+        self.index.set_tags(4, [])
+        self.assertNotIn("c", self.index.postings)
+
+    def test_change_during_build(self):
+        index = SimilarityIndex()
+
+        def links():
+            yield 1, "a"
+            # an asset written while the links are read
+            index.set_tags(2, ["a"])
+            yield 3, "a"
+
+        index.build(links())
+        self.assertFalse(index.built)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from Asset import Asset
+from Models import Models
+from Utilities.Sync import sync_library
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.lib = tempfile.mkdtemp().replace("\\", "/")
+        self.assertTrue(Models.initialize(self.lib, replica=False))
+
+    def tearDown(self):
+        Models.data_base.close()
+        shutil.rmtree(self.lib, ignore_errors=True)
+
+    def make_asset(self, folder, name, tags):
+        path = self.lib + "/" + folder + "/" + name + "_ast"
+        for x in ("info_folder", "content_folder", "gallery_folder"):
+            os.makedirs(Asset.dir_names(path)[x])
+        Asset.write_info_file(Asset.dir_names(path)["asset_json"],
+                              {"name": name, "asset_id": None, "tags": tags, "description": name})
+        self.touch(self.lib + "/" + folder)
+        return path
+
+    def touch(self, folder):
+        """
+        Moves the modification time of the folder and of its parents forward,
+        a change in the same tick of the clock of the file system would not be seen
+        """
+        while len(folder) >= len(self.lib):
+            mtime = os.stat(folder).st_mtime + 10
+            os.utime(folder, (mtime, mtime))
+            folder = os.path.dirname(folder)
+
+    def asset(self, name):
+        return Models.Asset.get(Models.Asset.name == name)
+
+    def test_new_assets_are_added(self):
+        chair = self.make_asset("props/wood", "chair", ["wood", "prop"])
+        self.make_asset("chars", "robot", ["metal"])
+        report = sync_library(self.lib)
+        self.assertEqual(sorted(report.added), sorted([chair, self.lib + "/chars/robot_ast"]))
+        self.assertEqual(self.asset("chair").path, chair)
+        self.assertEqual(sorted(Models.get_asset_tags(self.asset("chair").id)), ["prop", "wood"])
+        # every listed folder is in the journal with its modification time, the root changes with the database
+        states = Models.get_folder_states()
+        self.assertIn(self.lib + "/", states)
+        for folder in (self.lib + "/props/", self.lib + "/props/wood/", self.lib + "/chars/"):
+            self.assertEqual(states[folder], os.stat(folder).st_mtime)
+
+    def test_unchanged_folders_are_not_listed(self):
+        self.make_asset("props/wood", "chair", ["wood"])
+        sync_library(self.lib)
+        report = sync_library(self.lib)
+        self.assertFalse(report.changed())
+        # only the root can change, with the files of the database next to it
+        self.assertLessEqual(report.scanned, 1)
+
+    def test_moved_asset_keeps_its_record(self):
+        chair = self.make_asset("props", "chair", ["wood"])
+        sync_library(self.lib)
+        asset_id = self.asset("chair").id
+        os.makedirs(self.lib + "/old")
+        shutil.move(chair, self.lib + "/old/chair_ast")
+        self.touch(self.lib + "/props")
+        self.touch(self.lib + "/old")
+        report = sync_library(self.lib)
+        self.assertEqual(report.moved, [(chair, self.lib + "/old/chair_ast")])
+        self.assertEqual(report.added, [])
+        self.assertEqual((self.asset("chair").id, self.asset("chair").path), (asset_id, self.lib + "/old/chair_ast"))
+
+    def test_missing_asset_is_flagged_and_found(self):
+        chair = self.make_asset("props", "chair", ["wood"])
+        sync_library(self.lib)
+        shutil.move(chair, self.lib + "/chair_ast.bak")
+        self.touch(self.lib + "/props")
+        report = sync_library(self.lib)
+        self.assertEqual(report.missing, [chair])
+        self.assertTrue(self.asset("chair").missing)
+        shutil.move(self.lib + "/chair_ast.bak", chair)
+        self.touch(self.lib + "/props")
+        report = sync_library(self.lib)
+        self.assertEqual(report.found, [chair])
+        self.assertFalse(self.asset("chair").missing)
+
+    def test_removed_folders_leave_the_journal(self):
+        self.make_asset("props/wood", "chair", ["wood"])
+        sync_library(self.lib)
+        shutil.rmtree(self.lib + "/props")
+        self.touch(self.lib)
+        report = sync_library(self.lib)
+        self.assertEqual(report.missing, [self.lib + "/props/wood/chair_ast"])
+        self.assertNotIn(self.lib + "/props/wood/", Models.get_folder_states())
+
+    def test_unreachable_library_is_skipped(self):
+        self.assertIsNone(sync_library(self.lib + "/nowhere"))
+
+
+if __name__ == '__main__':
+    unittest.main()